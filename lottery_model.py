@@ -2,9 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import hashlib
-import itertools
 import heapq
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from math import comb
 
 
 def hash_file_data(filename, HASH=hashlib.sha256) -> str:
@@ -18,23 +21,52 @@ def hash_file_data(filename, HASH=hashlib.sha256) -> str:
         return origin_hash_sum
 
 
-def nonce_filter(origin_hash_sum, difficulty='000F', nonce_pool_size=20, HASH=hashlib.sha256):
+def scan_nonces(origin_hash_sum, start, stop, difficulty, HASH=hashlib.sha256):
+    """按顺序检查[start, stop)区间内的nonce值，返回所有满足难度要求的(hash_sum, nonce)"""
+    found = []
+    for nonce in range(start, stop):
+        s = origin_hash_sum + str(nonce)
+        hash_sum = HASH(s.encode()).hexdigest()
+        if hash_sum < difficulty:
+            found.append((hash_sum, nonce))
+    return found
+
+
+def nonce_filter(origin_hash_sum, difficulty='000F', nonce_pool_size=20, HASH=hashlib.sha256, workers=1,
+                 chunk_size=1 << 16):
     """找到满足难度要求的nonce值，使hash(origin_hash_sum + nonce)小于difficulty"""
-    """需要记录时间"""
+    """workers大于1时把nonce区间切块分给多个进程，但按nonce顺序合并结果，与单进程的结果完全相同"""
     print(f'')
     start_time = datetime.now().strftime('%X')
     print(f'{start_time} 寻找{nonce_pool_size}个满足难度值为{difficulty!r}的Nonce值...')
     nonce_pool = []
     """这里强行要求nonce值为从0开始的自然数，方便验证工作量"""
     nonce = 0
-    while len(nonce_pool) < nonce_pool_size:
-        s = origin_hash_sum + str(nonce)
-        hash_sum = HASH(s.encode()).hexdigest()
-        if hash_sum < difficulty:
-            """使用堆压入方式，则第一个元素就是最小值"""
-            heapq.heappush(nonce_pool, (hash_sum, nonce))
-            print(nonce, end=',')
-        nonce += 1
+    if workers <= 1:
+        while len(nonce_pool) < nonce_pool_size:
+            s = origin_hash_sum + str(nonce)
+            hash_sum = HASH(s.encode()).hexdigest()
+            if hash_sum < difficulty:
+                """使用堆压入方式，则第一个元素就是最小值"""
+                heapq.heappush(nonce_pool, (hash_sum, nonce))
+                print(nonce, end=',')
+            nonce += 1
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            while len(nonce_pool) < nonce_pool_size:
+                while len(pending) < workers * 2:
+                    pending.append(executor.submit(scan_nonces, origin_hash_sum, nonce, nonce + chunk_size,
+                                                   difficulty, HASH))
+                    nonce += chunk_size
+                """总是先取nonce最小的区间，只保留按nonce顺序的前nonce_pool_size个结果"""
+                for hash_sum, nonce_found in pending.popleft().result():
+                    if len(nonce_pool) >= nonce_pool_size:
+                        break
+                    heapq.heappush(nonce_pool, (hash_sum, nonce_found))
+                    print(nonce_found, end=',')
+            for future in pending:
+                future.cancel()
     print('')
     end_time = datetime.now().strftime('%X')
     print(f'{end_time} 其中最小的哈希值对应的Nonce = {nonce_pool[0][1]}, 使:')
@@ -42,6 +74,26 @@ def nonce_filter(origin_hash_sum, difficulty='000F', nonce_pool_size=20, HASH=ha
     return nonce_pool[0]
 
 
+def unrank_combination(index, n, k):
+    """按itertools.combinations的枚举顺序，直接计算从range(n)中选k个元素的第index个组合"""
+    positions = []
+    x = 0
+    for i in range(k):
+        """以x开头的组合共有C(n - x - 1, k - i - 1)个，序号不在其中时跳过这些组合"""
+        while comb(n - x - 1, k - i - 1) <= index:
+            index -= comb(n - x - 1, k - i - 1)
+            x += 1
+        positions.append(x)
+        x += 1
+    return tuple(positions)
+
+
+def rank_combination(positions, n):
+    """unrank_combination的逆运算，返回升序排列的元素下标positions在所有组合中的序号"""
+    k = len(positions)
+    return comb(n, k) - 1 - sum(comb(n - 1 - p, k - i) for i, p in enumerate(positions))
+
+
 def map_lottery_ball(nonce, origin_hash_sum, HASH=hashlib.sha256):
     """把彩票池数据的哈希值和计算出来的nonce值，映射到彩票号码空间"""
     s = str(nonce) + origin_hash_sum
@@ -50,19 +102,19 @@ def map_lottery_ball(nonce, origin_hash_sum, HASH=hashlib.sha256):
     red_balls = int(hash_sum, 16) % 1107568
     """篮球为16个中选一个，blue_ball为开奖的篮球号码"""
     blue_ball = int(hash_sum, 16) % 16
-    lottery_space = range(1107568)
 
-    for i, c in zip(lottery_space, itertools.combinations(RED_BALLS, 6)):
-        if i == red_balls:
-            print('')
-            print(f'开奖结果为：')
-            print(' '.join(c) + "|" + BLUE_BALLS[blue_ball])
+    c = [RED_BALLS[i] for i in unrank_combination(red_balls, len(RED_BALLS), 6)]
+    print('')
+    print(f'开奖结果为：')
+    print(' '.join(c) + "|" + BLUE_BALLS[blue_ball])
 
 
 if __name__ == '__main__':
     """HASH算法和DIFFICULTY值是开奖算法的核心参数"""
     HASH = hashlib.sha256
     DIFFICULTY = '000000F'
+    """并行搜索nonce值使用的进程数，不影响计算结果"""
+    WORKERS = os.cpu_count()
 
     """以福利彩票的双色球为例，玩法为33个红球中选6个，16个篮球中选一个"""
     RED_BALLS = ('01', '02', '03', '04', '05', '06', '07', '08', '09', '10',
@@ -89,7 +141,7 @@ if __name__ == '__main__':
     
     计算满足难度要求的Nonce值，用于计算开奖号码
     """
-    _, nonce = nonce_filter(origin_hash_sum, difficulty=DIFFICULTY, nonce_pool_size=1)
+    _, nonce = nonce_filter(origin_hash_sum, difficulty=DIFFICULTY, nonce_pool_size=1, workers=WORKERS)
 
     """STEP 3
     
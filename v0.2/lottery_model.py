@@ -35,10 +35,9 @@ hash('a1bb968b4a47cbcd5fa8691085dd3eb6ebc75f4b23a0f457472561f9d5853538'+'2275718
 # -*- coding: utf-8 -*-
 
 from datetime import datetime
-from scipy.special import comb
+from math import comb
 import sys
 import hashlib
-import itertools
 import heapq
 
 
@@ -80,6 +79,26 @@ def nonce_filter(origin_hash_sum, difficulty, nonce_pool_size=1, HASH=hashlib.sh
     return nonce_pool[0]
 
 
+def unrank_combination(index, n, k):
+    """按itertools.combinations的枚举顺序，直接计算从range(n)中选k个元素的第index个组合"""
+    positions = []
+    x = 0
+    for i in range(k):
+        """以x开头的组合共有C(n - x - 1, k - i - 1)个，序号不在其中时跳过这些组合"""
+        while comb(n - x - 1, k - i - 1) <= index:
+            index -= comb(n - x - 1, k - i - 1)
+            x += 1
+        positions.append(x)
+        x += 1
+    return tuple(positions)
+
+
+def rank_combination(positions, n):
+    """unrank_combination的逆运算，返回升序排列的元素下标positions在所有组合中的序号"""
+    k = len(positions)
+    return comb(n, k) - 1 - sum(comb(n - 1 - p, k - i) for i, p in enumerate(positions))
+
+
 def map_lottery_ball(nonce, origin_hash_sum, HASH=hashlib.sha256):
     """拼接nonce和彩票池数据的哈希值字符串，进行第二次哈希，并把结果映射到彩票号码空间"""
 
@@ -92,7 +111,7 @@ def map_lottery_ball(nonce, origin_hash_sum, HASH=hashlib.sha256):
                   '11', '12', '13', '14', '15', '16')
     total_selected = 6
     """comb_count为从所有33个红球中选择6个红球的组合数，等于1107568"""
-    comb_count = comb(len(RED_BALLS), total_selected, exact=True)
+    comb_count = comb(len(RED_BALLS), total_selected)
 
     s = str(nonce) + origin_hash_sum
     hash_sum = HASH(s.encode()).hexdigest()
@@ -101,13 +120,9 @@ def map_lottery_ball(nonce, origin_hash_sum, HASH=hashlib.sha256):
     """篮球为16个中选一个，selected_blue_ball为开奖的篮球号码"""
     selected_blue_ball = int(hash_sum, 16) % len(BLUE_BALLS)
 
-    """利用并行迭代的方式找到序号为selected_red_balls的组对应的红球号码"""
-    luck_number = "null"
-    for n, red_balls in zip(range(comb_count), itertools.combinations(RED_BALLS, total_selected)):
-        if n == selected_red_balls:
-            """此时对应的red_balls组合，即是开奖号码"""
-            luck_number = ' '.join(red_balls) + "|" + BLUE_BALLS[selected_blue_ball]
-            break
+    """直接计算序号为selected_red_balls的组合对应的红球号码，不需要逐个枚举"""
+    red_balls = unrank_combination(selected_red_balls, len(RED_BALLS), total_selected)
+    luck_number = ' '.join(RED_BALLS[i] for i in red_balls) + "|" + BLUE_BALLS[selected_blue_ball]
     print('')
     print(f'开奖结果为：')
     print(luck_number)
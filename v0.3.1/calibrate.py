@@ -0,0 +1,151 @@
+"""
+哈希速度测试与难度值校准
+
+每个哈希值满足难度要求的概率为 p = target / 16^64，target由difficulty_target换算。
+找到n个满足要求的nonce值需要检查的nonce个数服从负二项分布，
+期望为 n / p，方差为 n(1 - p) / p^2，所以开奖时长的相对标准差约为 1 / sqrt(n)，与难度值无关。
+
+本模块在本机上测量各哈希算法、各nonce搜索引擎和各进程数下持续计算的哈希速度，
+再根据目标开奖时长换算出难度值，并给出该难度值下开奖时长的期望和标准差。
+
+使用示例，在本机上使开奖时长约为45分钟、标准差不超过10%：
+
+D:\\>python lottery_model.py calibrate -t 45m --tolerance 10
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from contextlib import closing
+import argparse
+import hashlib
+import math
+import os
+import time
+
+from lottery_model import iter_nonce_chunks
+from nonce_engines import ENGINES, difficulty_target
+
+"""测速时使用的难度值，几乎不可能满足，只测量计算速度"""
+BENCHMARK_DIFFICULTY = '000000000000001'
+
+"""测速时每个任务检查的nonce个数"""
+BENCHMARK_CHUNK = 1 << 14
+
+
+def measure_sustained_rate(engine, HASH=hashlib.sha256, workers=1, seconds=3.0):
+    """用与开奖相同的iter_nonce_chunks持续计算约seconds秒，返回每秒计算的哈希次数
+
+    从第一个区间返回后才开始计时，不计入创建进程池的时间。
+    """
+    origin_hash_sum = HASH(b'lottery_model').hexdigest()
+    chunks = iter_nonce_chunks(origin_hash_sum, BENCHMARK_DIFFICULTY, HASH, workers,
+                               chunk_size=BENCHMARK_CHUNK, engine=engine)
+    with closing(chunks):
+        _, first_stop, _ = next(chunks)
+        begin = time.perf_counter()
+        for _, stop, _ in chunks:
+            elapsed = time.perf_counter() - begin
+            if elapsed >= seconds:
+                return (stop - first_stop) / elapsed
+
+
+def qualify_probability(difficulty, digest_size=32):
+    """一个哈希值满足难度要求的概率"""
+    return difficulty_target(difficulty, digest_size) / (1 << (8 * digest_size))
+
+
+def expected_duration(difficulty, nonce_pool_size, rate, digest_size=32):
+    """按每秒rate次哈希计算，找到nonce_pool_size个nonce值所需时长的(期望, 标准差)，单位为秒"""
+    p = qualify_probability(difficulty, digest_size)
+    if p <= 0:
+        return math.inf, math.inf
+    mean = nonce_pool_size / p
+    std = math.sqrt(nonce_pool_size * (1 - p)) / p
+    return mean / rate, std / rate
+
+
+def difficulty_for(seconds, nonce_pool_size, rate, digest_size=32, digits=4):
+    """期望开奖时长为seconds秒的难度值，保留digits位有效的十六进制数字"""
+    width = digest_size * 2
+    target = round(nonce_pool_size * (1 << (8 * digest_size)) / (rate * seconds))
+    if target >= 16 ** width:
+        return 'g'
+    target = max(target, 1)
+    leading = width - len(f'{target:x}')
+    unit = 16 ** max(width - leading - digits, 0)
+    target = max(round(target / unit), 1) * unit
+    if target >= 16 ** width:
+        return 'g'
+    return f'{target:0{width}x}'.rstrip('0')
+
+
+def parse_duration(text):
+    """解析'45m'、'90s'、'2h'形式的时长，不带单位时为秒"""
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if text[-1:] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py calibrate',
+                                     description='测量本机的哈希速度，按目标开奖时长换算难度值')
+    parser.add_argument('-t', dest='target', default='45m', help="目标开奖时长，例如 '45m'、'90s'、'2h'")
+    parser.add_argument('-n', dest='size', type=int, default=10, help='开奖时使用的 -n 参数')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=None,
+                        help='允许的开奖时长标准差（百分比），给出时计算所需的最小 -n')
+    parser.add_argument('--hash', dest='hashes', nargs='+', default=['sha256', 'sha3_256'],
+                        choices=('sha256', 'sha3_256'), help='要测试的哈希算法')
+    parser.add_argument('-e', dest='engines', nargs='+', default=sorted(ENGINES), choices=sorted(ENGINES),
+                        help='要测试的nonce搜索引擎')
+    parser.add_argument('-w', dest='workers', type=int, nargs='+', default=None,
+                        help='要测试的进程数，默认为1、2、4……直到CPU核心数')
+    parser.add_argument('--seconds', dest='seconds', type=float, default=3.0, help='每项测试持续的秒数')
+    parser.add_argument('--use-hash', dest='use_hash', default='sha3_256', choices=('sha256', 'sha3_256'),
+                        help='开奖时使用的哈希算法，lottery_model.py的main使用sha3_256')
+    args = parser.parse_args(argv)
+
+    workers = args.workers
+    if not workers:
+        workers = [1]
+        while workers[-1] * 2 < os.cpu_count():
+            workers.append(workers[-1] * 2)
+        workers = sorted(set(workers + [os.cpu_count()]))
+
+    print(f'{"算法":<10}{"引擎":<8}{"进程数":>6}{"哈希速度":>18}')
+    rates = {}
+    for hash_name in args.hashes:
+        HASH = getattr(hashlib, hash_name)
+        for engine in args.engines:
+            if engine == 'numpy' and hash_name != 'sha256':
+                continue
+            for n_workers in workers:
+                try:
+                    rate = measure_sustained_rate(engine, HASH, n_workers, args.seconds)
+                except ImportError as e:
+                    print(f'{hash_name:<10}{engine:<8}{n_workers:>6}  不可用: {e}')
+                    break
+                rates[hash_name, engine, n_workers] = rate
+                print(f'{hash_name:<10}{engine:<8}{n_workers:>6}{rate:>18,.0f} 次/秒')
+
+    candidates = [(rate, key) for key, rate in rates.items() if key[0] == args.use_hash]
+    if not candidates:
+        print(f'[错误 1] 没有测量{args.use_hash}的速度')
+        return 1
+    rate, (hash_name, engine, n_workers) = max(candidates)
+    seconds = parse_duration(args.target)
+    digest_size = getattr(hashlib, hash_name)().digest_size
+    difficulty = difficulty_for(seconds, args.size, rate, digest_size)
+    mean, std = expected_duration(difficulty, args.size, rate, digest_size)
+
+    print('')
+    print(f'最快的组合：{hash_name} {engine}引擎 {n_workers}个进程，{rate:,.0f} 次/秒')
+    print(f'目标开奖时长{seconds:,.0f}秒，-n {args.size}，建议难度值：-d {difficulty}')
+    print(f'预计开奖时长{mean:,.0f}秒，标准差{std:,.0f}秒（±{std / mean:.1%}）')
+    if args.tolerance:
+        p = qualify_probability(difficulty, digest_size)
+        size = math.ceil((1 - p) / (args.tolerance / 100) ** 2)
+        print(f'要使标准差不超过{args.tolerance:g}%，-n至少为{size}，'
+              f'此时建议难度值为 -d {difficulty_for(seconds, size, rate, digest_size)}')
+    return 0
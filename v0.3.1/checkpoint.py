@@ -0,0 +1,61 @@
+"""
+nonce搜索的断点文件
+
+高难度的开奖计算需要运行数小时，nonce_filter会定时把搜索进度写入一个很小的JSON文件，
+进程崩溃或主机重启后可以从断点继续，既不遗漏也不重复检查任何nonce值：
+
+{"origin_hash_sum": "7ee4...1aff", "difficulty": "0000000F", "hash": "sha3_256",
+ "next_nonce": 156303360, "found": [["00000008907c...04bd", 156229769]]}
+
+next_nonce之前的所有nonce值都已经检查完毕，found按nonce顺序保存其中所有满足难度要求的结果。
+搜索完成后断点文件即被删除。
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+
+class CheckpointMismatch(ValueError):
+    """断点文件记录的开奖参数与本次计算不同"""
+
+
+def save_checkpoint(path, origin_hash_sum, difficulty, hash_name, next_nonce, found):
+    """保存搜索进度，先写临时文件再替换，写入过程中断也不会损坏原有的断点文件"""
+    state = {
+        'origin_hash_sum': origin_hash_sum,
+        'difficulty': difficulty,
+        'hash': hash_name,
+        'next_nonce': next_nonce,
+        'found': [[hash_sum, nonce] for hash_sum, nonce in found],
+    }
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wt') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path, origin_hash_sum, difficulty, hash_name):
+    """读取搜索进度，返回(next_nonce, found)
+
+    断点文件记录的彩票池哈希值、难度值或哈希算法与本次计算不同时抛出CheckpointMismatch，
+    避免把不同开奖的中间结果混在一起。
+    """
+    with open(path, 'rt') as f:
+        state = json.load(f)
+    expected = {'origin_hash_sum': origin_hash_sum, 'difficulty': difficulty, 'hash': hash_name}
+    for key, value in expected.items():
+        if state[key] != value:
+            raise CheckpointMismatch(f'断点文件{path}的{key}为{state[key]!r}，与本次计算的{value!r}不一致')
+    return state['next_nonce'], [(hash_sum, nonce) for hash_sum, nonce in state['found']]
+
+
+def remove_checkpoint(path):
+    """搜索完成后删除断点文件，以免之后用不同的参数--resume时误用"""
+    for name in (path, path + '.tmp'):
+        if os.path.exists(name):
+            os.remove(name)
@@ -0,0 +1,176 @@
+"""
+组合的排序与反排序
+
+序号按itertools.combinations(range(n), k)的枚举顺序（字典序）编号，从0开始。
+unrank_combination直接计算第index个组合，不需要逐个枚举；rank_combination为其逆运算。
+unrank_combinations / rank_combinations为NumPy批量版本，一次处理数百万个序号。
+
+单独运行本文件会与itertools.combinations的枚举结果逐个比对，并测量批量计算的速度：
+
+D:\\>python combinatorics.py
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from functools import lru_cache
+import itertools
+import time
+
+
+@lru_cache(maxsize=None)
+def binomial_table(n):
+    """预先计算的组合数表，table[m][j]为从m个元素中选j个的组合数，0 <= m, j <= n"""
+    table = [[0] * (n + 1) for _ in range(n + 1)]
+    for m in range(n + 1):
+        table[m][0] = 1
+        for j in range(1, m + 1):
+            table[m][j] = table[m - 1][j - 1] + table[m - 1][j]
+    return tuple(tuple(row) for row in table)
+
+
+def binomial(n, k):
+    """从n个元素中选k个的组合数"""
+    if k < 0 or k > n:
+        return 0
+    return binomial_table(n)[n][k]
+
+
+def unrank_combination(index, n, k):
+    """返回从range(n)中选k个元素的所有组合中，序号为index的组合（元素下标的元组）"""
+    table = binomial_table(n)
+    if not 0 <= index < table[n][k]:
+        raise ValueError(f'序号{index}超出范围[0, {table[n][k]})')
+    positions = []
+    x = 0
+    for i in range(k):
+        """以x开头的组合共有C(n - x - 1, k - i - 1)个，序号不在其中时跳过这些组合"""
+        while table[n - x - 1][k - i - 1] <= index:
+            index -= table[n - x - 1][k - i - 1]
+            x += 1
+        positions.append(x)
+        x += 1
+    return tuple(positions)
+
+
+def rank_combination(positions, n):
+    """unrank_combination的逆运算，positions为升序排列的元素下标"""
+    k = len(positions)
+    table = binomial_table(n)
+    rank = table[n][k] - 1
+    for i, p in enumerate(positions):
+        rank -= table[n - 1 - p][k - i]
+    return rank
+
+
+@lru_cache(maxsize=None)
+def _numpy_table(n, k):
+    """binomial_table前k + 1列的NumPy版本，每个(n, k)只转换一次，调用者不应修改返回的数组"""
+    import numpy as np
+
+    table = binomial_table(n)
+    if table[n][min(k, n // 2)] >= 1 << 63:
+        raise ValueError('组合数超出int64范围，请使用unrank_combination逐个计算')
+    return np.array([row[:k + 1] for row in table], dtype=np.int64)
+
+
+def unrank_combinations(indexes, n, k):
+    """unrank_combination的批量版本，返回形状为(len(indexes), k)的int64数组
+
+    把字典序序号换算为降序组合数表示：C(n, k) - 1 - index = sum(C(d_i, k - i))，
+    d_i = n - 1 - positions[i]，逐位用searchsorted在组合数表的一列中查找。
+    """
+    import numpy as np
+
+    table = _numpy_table(n, k)
+    indexes = np.asarray(indexes, dtype=np.int64)
+    if indexes.size and (indexes.min() < 0 or indexes.max() >= table[n, k]):
+        raise ValueError(f'序号超出范围[0, {table[n, k]})')
+    rest = table[n, k] - 1 - indexes
+    positions = np.empty((len(indexes), k), dtype=np.int64)
+    for i in range(k):
+        column = table[:, k - i]
+        """column在k - i之后单调递增，d为满足C(d, k - i) <= rest的最大值"""
+        d = np.searchsorted(column, rest, side='right') - 1
+        rest -= column[d]
+        positions[:, i] = n - 1 - d
+    return positions
+
+
+def rank_combinations(positions, n):
+    """rank_combination的批量版本，positions为形状(m, k)的升序元素下标数组"""
+    import numpy as np
+
+    positions = np.asarray(positions, dtype=np.int64)
+    k = positions.shape[1]
+    table = _numpy_table(n, k)
+    rank = np.full(len(positions), table[n, k] - 1, dtype=np.int64)
+    for i in range(k):
+        rank -= table[n - 1 - positions[:, i], k - i]
+    return rank
+
+
+def residue_weights(m, words=8):
+    """c_i = 2^(32*(words-1-i)) mod m，用于reduce_words"""
+    import numpy as np
+
+    return tuple(np.uint64(pow(2, 32 * (words - 1 - i), m)) for i in range(words))
+
+
+def reduce_words(words, m, weights=None):
+    """words为形状(字数, n)的uint32数组，每列为一个大端表示的大整数（例如哈希值），返回每个大整数 mod m
+
+    预先计算c_i = 2^(32*i) mod m，则 H mod m = (Σ w_i * c_i) mod m，乘积和不超过2^64时每个数只需一次取模。
+    """
+    import numpy as np
+
+    if m * len(words) >= 1 << 32:
+        """乘积之和可能超过2^64，逐字取模"""
+        return divmod_words(words, m)[1]
+    weights = weights or residue_weights(m, len(words))
+    r = words[0] * weights[0]
+    for w, c in zip(words[1:], weights[1:]):
+        r += w * c
+    r %= np.uint64(m)
+    return r
+
+
+def divmod_words(words, m):
+    """reduce_words的长除法版本，m < 2^32，返回(商的各字, 余数)，商的形状与words相同"""
+    import numpy as np
+
+    m = np.uint64(m)
+    quotient = np.empty(words.shape, dtype=np.uint32)
+    r = np.zeros(words.shape[1], dtype=np.uint64)
+    for i, w in enumerate(words):
+        r = (r << np.uint64(32)) | w
+        quotient[i] = r // m
+        r %= m
+    return quotient, r
+
+
+if __name__ == '__main__':
+    import numpy as np
+
+    for n, k in ((33, 6), (16, 1), (35, 5), (12, 2), (8, 0), (8, 8), (10, 3)):
+        expected = list(itertools.combinations(range(n), k))
+        batch = unrank_combinations(np.arange(len(expected)), n, k)
+        for index, c in enumerate(expected):
+            if unrank_combination(index, n, k) != c or rank_combination(c, n) != index:
+                print(f'[错误] C({n}, {k})的第{index}个组合不一致')
+                quit(1)
+        if [tuple(row) for row in batch.tolist()] != expected:
+            print(f'[错误] C({n}, {k})的批量计算结果不一致')
+            quit(1)
+        if (rank_combinations(batch, n) != np.arange(len(expected))).any():
+            print(f'[错误] C({n}, {k})的批量排序结果不一致')
+            quit(1)
+        print(f'C({n}, {k}) = {len(expected)}个组合与itertools.combinations的顺序完全一致')
+
+    indexes = np.random.randint(0, binomial(33, 6), size=5_000_000)
+    begin = time.perf_counter()
+    positions = unrank_combinations(indexes, 33, 6)
+    middle = time.perf_counter()
+    rank_combinations(positions, 33)
+    end = time.perf_counter()
+    print(f'批量反排序 {len(indexes) / (middle - begin):,.0f} 次/秒，批量排序 {len(indexes) / (end - middle):,.0f} 次/秒')
@@ -0,0 +1,304 @@
+"""
+多机分布式nonce搜索
+
+协调者（运行main的机器，使用 --listen 参数）监听一个TCP端口，把nonce值按CHUNK_SIZE切分成区间，
+逐个分配给连接上来的工作者；工作者计算完一个区间后返回其中满足要求的(hash_sum, nonce)，再领取下一个区间。
+工作者断开连接或超过lease秒没有返回结果时，它手上的区间重新分配给其他工作者。
+协调者严格按nonce顺序使用各区间的结果，因此与串行计算的结果完全相同，断点文件和分段搜索记录也照常工作。
+协调者重新计算工作者返回的每个(hash_sum, nonce)，结果不正确时断开该工作者并重新分配区间，
+因此工作者不能伪造满足要求的nonce值。工作者无法解析或计算任务时返回error，协调者重新分配该区间并通知它停止。
+
+信任假设：工作者可能漏报区间内满足要求的nonce值，这样的结果能通过上述检查，却能改变开奖结果
+（结果是按nonce顺序最先找到的n个nonce值中哈希值最小的一个）。协调者按audit的比例随机抽取已完成的区间
+自己重新计算，发现漏报时断开该工作者，并重新分配它完成但尚未使用的全部区间。抽查只能以一定概率发现
+漏报，已经使用的区间无法撤回；不完全信任工作者时把audit设为1（协调者重新计算全部区间，分布式计算失去意义），
+或者在开奖后用分段搜索记录（transcript.py）由验证者独立抽查。
+
+通信协议为每行一个JSON对象：
+
+工作者 -> 协调者  {"type": "hello"}
+协调者 -> 工作者  {"type": "task", "origin_hash_sum": "...", "difficulty": "0003", "hash": "sha3_256",
+                   "start": 0, "stop": 65536}   或   {"type": "stop"}
+工作者 -> 协调者  {"type": "result", "start": 0, "stop": 65536, "found": [["0002...", 10319]]}
+                   或   {"type": "error", "start": 0, "message": "..."}
+
+使用示例，在同一台机器上用3个工作者进程测试：
+
+$ python lottery_model.py lottery_model.data -d 0000F --listen 127.0.0.1:9000 &
+$ for i in 1 2 3; do python lottery_model.py worker 127.0.0.1:9000 & done
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import heapq
+import json
+import random
+import socket
+import threading
+import time
+
+from nonce_engines import ENGINES, scan_nonces
+
+"""工作者超过该秒数没有返回区间的结果，视为失去响应"""
+LEASE_SECONDS = 120
+
+"""最多领先于尚未使用的第一个区间分配的区间数，限制协调者保存的结果"""
+MAX_AHEAD = 1024
+
+"""协调者自己重新计算的已完成区间的比例，用于发现漏报满足要求的nonce值的工作者"""
+AUDIT_FRACTION = 1 / 16
+
+
+def parse_address(text):
+    """解析'host:port'形式的地址"""
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def _send(f, message):
+    f.write(json.dumps(message).encode() + b'\n')
+    f.flush()
+
+
+def _receive(f):
+    """读取一条消息，连接断开时抛出ConnectionError，不是JSON对象时抛出ValueError"""
+    line = f.readline()
+    if not line:
+        raise ConnectionError('连接已断开')
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError(f'消息应为JSON对象: {line[:100]!r}')
+    return message
+
+
+class Coordinator(object):
+    """在address上监听工作者，chunks按nonce顺序产出各区间的结果，用法与iter_nonce_chunks相同"""
+
+    def __init__(self, origin_hash_sum, difficulty, HASH, address, chunk_size, start=0,
+                 lease=LEASE_SECONDS, max_ahead=MAX_AHEAD, audit=AUDIT_FRACTION):
+        self.task = {'type': 'task', 'origin_hash_sum': origin_hash_sum, 'difficulty': difficulty,
+                     'hash': HASH().name}
+        self.HASH = HASH
+        self.chunk_size = chunk_size
+        self.lease = lease
+        self.max_ahead = max_ahead
+        self.audit = audit
+        """抽查的区间不能被工作者预测"""
+        self.random = random.SystemRandom()
+        self.condition = threading.Condition()
+        self.next_start = start
+        self.used = start
+        self.pending = []
+        self.completed = {}
+        """尚未使用的已完成区间由哪个连接计算，发现漏报时重新分配该连接的全部区间"""
+        self.owners = {}
+        self.closed = False
+        self.server = socket.create_server(address)
+        self.address = self.server.getsockname()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, peer = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn, peer), daemon=True).start()
+
+    def _take(self):
+        """领取一个区间：先分配重新排队的区间，再分配新的区间，协调者关闭后返回None"""
+        with self.condition:
+            while True:
+                if self.closed:
+                    return None
+                while self.pending:
+                    start = heapq.heappop(self.pending)
+                    if start not in self.completed and start >= self.used:
+                        return start
+                if self.next_start < self.used + self.max_ahead * self.chunk_size:
+                    start = self.next_start
+                    self.next_start += self.chunk_size
+                    return start
+                self.condition.wait()
+
+    def _complete(self, start, found, owner=None):
+        with self.condition:
+            if start >= self.used:
+                self.completed[start] = found
+                self.owners[start] = owner
+                self.condition.notify_all()
+
+    def _revoke(self, owner):
+        """丢弃owner完成但尚未使用的全部区间并重新排队，返回区间个数"""
+        with self.condition:
+            starts = [start for start, by in self.owners.items() if by is owner and start in self.completed]
+            for start in starts:
+                del self.completed[start]
+                del self.owners[start]
+                heapq.heappush(self.pending, start)
+            self.condition.notify_all()
+            return len(starts)
+
+    def _release(self, start):
+        """工作者失去响应，区间重新排队"""
+        with self.condition:
+            if start not in self.completed and start >= self.used:
+                heapq.heappush(self.pending, start)
+                self.condition.notify_all()
+
+    def _verify(self, start, found):
+        """重新计算工作者返回的每个(hash_sum, nonce)，全部正确时返回结果列表，否则返回None
+
+        nonce必须在区间内且按nonce顺序排列，hash_sum必须是该nonce的哈希值并满足难度要求。
+        """
+        origin_hash_sum, difficulty = self.task['origin_hash_sum'], self.task['difficulty']
+        checked = []
+        last = start - 1
+        for hash_sum, nonce in found:
+            if type(nonce) is not int or not last < nonce < start + self.chunk_size or \
+                    self.HASH((origin_hash_sum + str(nonce)).encode()).hexdigest() != hash_sum or \
+                    not hash_sum < difficulty:
+                return None
+            checked.append((hash_sum, nonce))
+            last = nonce
+        return checked
+
+    def _audited(self, start, found):
+        """按audit的比例抽查区间，协调者自己重新计算，结果与工作者的不同时返回False"""
+        if self.audit <= 0 or self.random.random() >= self.audit:
+            return True
+        expected = scan_nonces('prefix', self.task['origin_hash_sum'], start, start + self.chunk_size,
+                               self.task['difficulty'], self.HASH)
+        return [tuple(item) for item in expected] == found
+
+    def _handle(self, conn, peer=None):
+        held = None
+        owner = object()
+        conn.settimeout(self.lease)
+        try:
+            with conn, conn.makefile('rwb') as f:
+                if _receive(f).get('type') != 'hello':
+                    return
+                while True:
+                    held = self._take()
+                    if held is None:
+                        _send(f, {'type': 'stop'})
+                        return
+                    _send(f, dict(self.task, start=held, stop=held + self.chunk_size))
+                    message = _receive(f)
+                    if message.get('type') == 'error':
+                        print(f'[错误 1] 工作者{peer}无法计算区间[{held}, {held + self.chunk_size}): '
+                              f'{message.get("message")}，重新分配该区间')
+                        _send(f, {'type': 'stop'})
+                        return
+                    if message.get('type') != 'result' or message.get('start') != held:
+                        return
+                    found = self._verify(held, message['found'])
+                    if found is None:
+                        print(f'[错误 1] 工作者{peer}返回的区间[{held}, {held + self.chunk_size})的结果不正确，'
+                              f'断开连接并重新分配该区间')
+                        return
+                    if not self._audited(held, found):
+                        revoked = self._revoke(owner)
+                        print(f'[错误 1] 工作者{peer}漏报了区间[{held}, {held + self.chunk_size})中满足要求的nonce值，'
+                              f'断开连接并重新分配该区间和它完成的其他{revoked}个区间')
+                        return
+                    self._complete(held, found, owner)
+                    held = None
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        finally:
+            if held is not None:
+                self._release(held)
+
+    def chunks(self):
+        """按nonce顺序逐个产出(start, stop, found)"""
+        start = self.used
+        try:
+            while True:
+                with self.condition:
+                    while start not in self.completed:
+                        self.condition.wait()
+                    found = self.completed.pop(start)
+                    self.owners.pop(start, None)
+                    self.used = start + self.chunk_size
+                    self.condition.notify_all()
+                yield start, start + self.chunk_size, found
+                start += self.chunk_size
+        finally:
+            self.close()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.server.close()
+
+
+def iter_distributed_chunks(origin_hash_sum, difficulty, HASH, address, start=0, chunk_size=1 << 16,
+                            lease=LEASE_SECONDS, audit=AUDIT_FRACTION):
+    """iter_nonce_chunks的分布式版本，address为协调者监听的(host, port)，audit为协调者抽查区间的比例"""
+    coordinator = Coordinator(origin_hash_sum, difficulty, HASH, address, chunk_size, start, lease, audit=audit)
+    print(f'协调者监听 {coordinator.address[0]}:{coordinator.address[1]}，等待工作者连接...')
+    return coordinator.chunks()
+
+
+def run_worker(address, engine='prefix', retry=30.0):
+    """连接协调者并反复领取、计算区间，直到协调者通知停止，返回计算的区间数"""
+    deadline = time.monotonic() + retry
+    while True:
+        try:
+            sock = socket.create_connection(address)
+            break
+        except OSError:
+            """协调者可能还没有启动"""
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.5)
+
+    count = 0
+    with sock, sock.makefile('rwb') as f:
+        _send(f, {'type': 'hello'})
+        while True:
+            try:
+                task = _receive(f)
+            except ConnectionError:
+                return count
+            except ValueError as e:
+                """无法解析的消息不能终止工作者，报告给协调者，由协调者决定重新分配还是停止"""
+                print(f'[错误 1] 无法解析协调者的消息: {e}')
+                _send(f, {'type': 'error', 'start': None, 'message': f'无法解析的消息: {e}'})
+                continue
+            if task.get('type') != 'task':
+                return count
+            try:
+                found = scan_nonces(engine, task['origin_hash_sum'], task['start'], task['stop'],
+                                    task['difficulty'], getattr(hashlib, task['hash']))
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                print(f'[错误 1] 无法计算协调者分配的任务: {e!r}')
+                _send(f, {'type': 'error', 'start': task.get('start'), 'message': repr(e)})
+                continue
+            _send(f, {'type': 'result', 'start': task['start'], 'stop': task['stop'], 'found': found})
+            count += 1
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py worker',
+                                     description='作为工作者连接协调者，参与分布式nonce搜索')
+    parser.add_argument(dest='address', help="协调者的地址，例如 '192.168.1.10:9000'")
+    parser.add_argument('-e', dest='engine', default='prefix', choices=sorted(ENGINES),
+                        help='nonce搜索引擎，不影响计算结果')
+    parser.add_argument('--retry', dest='retry', type=float, default=30.0,
+                        help='协调者尚未启动时重试连接的秒数')
+    args = parser.parse_args(argv)
+
+    try:
+        count = run_worker(parse_address(args.address), args.engine, args.retry)
+    except OSError as e:
+        print(f'[错误 2] 无法连接协调者{args.address}: {e}')
+        return 2
+    print(f'协调者已停止，共计算{count}个区间')
+    return 0
@@ -0,0 +1,111 @@
+"""
+批量开奖
+
+draw_games对一个nonce值只计算一次哈希值，得到全部玩法的开奖号码；本模块把大量哈希值整批转换为
+NumPy的uint32数组（每列为一个哈希值的大端字），按各玩法的derive规则向量化地取模、反排序，
+一次调用得到成千上万次模拟开奖的号码，结果与draw_games逐个计算的完全相同。
+
+shared规则的前后区序号都由 H mod lcm(前区组合数, 后区组合数) 决定，每个哈希值只需一次取模；
+split规则用长除法同时得到 H mod 前区组合数 和 H // 前区组合数。
+
+使用示例，用nonce值10319计算全部玩法的开奖号码，以及从nonce值0开始的10000次模拟开奖：
+
+D:\\>python lottery_model.py draw lottery_model.data 10319
+D:\\>python lottery_model.py draw lottery_model.data 0 --count 10000 -g super_lotto -o draws.txt
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import math
+
+import numpy as np
+
+from combinatorics import divmod_words, reduce_words, unrank_combinations
+from games import GAMES, format_ticket, zone_sizes
+
+
+def digest_words(digests):
+    """把长度相同的多个哈希值（bytes）转换为形状(字数, 个数)的uint32数组"""
+    if not digests:
+        return np.zeros((0, 0), dtype=np.uint32)
+    data = np.frombuffer(b''.join(digests), dtype='>u4').reshape(len(digests), -1)
+    return np.ascontiguousarray(data.T.astype(np.uint32))
+
+
+def zone_index_arrays(words, game):
+    """按玩法的derive规则，返回每个哈希值的(前区组合序号数组, 后区组合序号数组)"""
+    front, back = zone_sizes(game)
+    if game.derive == 'split':
+        quotient, front_index = divmod_words(words, front)
+        return front_index, reduce_words(quotient, back)
+    lcm = math.lcm(front, back)
+    if lcm * len(words) < 1 << 32:
+        """H mod front = (H mod lcm) mod front，后区同理"""
+        r = reduce_words(words, lcm)
+        return r % np.uint64(front), r % np.uint64(back)
+    return reduce_words(words, front), reduce_words(words, back)
+
+
+def draw_arrays(words, game):
+    """返回每个哈希值对应的开奖号码：(前区号码数组, 后区号码数组)，号码从1开始，各区内升序排列"""
+    front_index, back_index = zone_index_arrays(words, game)
+    front = unrank_combinations(front_index.astype(np.int64), len(game.front_balls), game.front_selected)
+    back = unrank_combinations(back_index.astype(np.int64), len(game.back_balls), game.back_selected)
+    return front + 1, back + 1
+
+
+def nonce_digests(nonces, origin_hash_sum, HASH=hashlib.sha256):
+    """与draw_games相同，计算每个 str(nonce) + origin_hash_sum 的哈希值"""
+    return [HASH((str(nonce) + origin_hash_sum).encode()).digest() for nonce in nonces]
+
+
+def draw_batch(nonces, origin_hash_sum, games=None, HASH=hashlib.sha256):
+    """对每个nonce值计算一次哈希值，得到各玩法的开奖号码，games默认为全部玩法
+
+    返回玩法名称到(前区号码数组, 后区号码数组)的字典，数组的第i行对应nonces[i]。
+    """
+    words = digest_words(nonce_digests(nonces, origin_hash_sum, HASH))
+    return {game.name: draw_arrays(words, game) for game in (games or GAMES.values())}
+
+
+def cli(argv):
+    from lottery_model import hash_file_data
+
+    parser = argparse.ArgumentParser(prog='lottery_model.py draw',
+                                     description='用一个nonce值计算多种玩法的开奖号码，或批量模拟开奖')
+    parser.add_argument(dest='pool', help='【彩票池】文件')
+    parser.add_argument(dest='nonce', type=int, help='nonce值，--count大于1时为第一个nonce值')
+    parser.add_argument('-g', dest='games', action='append', choices=sorted(GAMES), default=None,
+                        help='彩票玩法，可以重复使用，默认为全部玩法')
+    parser.add_argument('--count', dest='count', type=int, default=1, help='模拟开奖的次数，nonce值依次加1')
+    parser.add_argument('--hash', dest='hash', default='sha3_256', choices=('sha256', 'sha3_256'),
+                        help='哈希算法，与main相同默认为sha3_256')
+    parser.add_argument('-o', dest='output', default=None,
+                        help='把开奖号码写入该文件，每行为玩法、nonce值和开奖号码，以制表符分隔')
+    args = parser.parse_args(argv)
+
+    HASH = getattr(hashlib, args.hash)
+    games = [GAMES[name] for name in dict.fromkeys(args.games or GAMES)]
+    try:
+        origin_hash_sum = hash_file_data(args.pool, HASH)
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    nonces = range(args.nonce, args.nonce + args.count)
+    results = draw_batch(nonces, origin_hash_sum, games, HASH)
+
+    lines = []
+    for game in games:
+        front, back = results[game.name]
+        for nonce, f, b in zip(nonces, front.tolist(), back.tolist()):
+            lines.append(f'{game.name}\t{nonce}\t{format_ticket(f, b, None, game)}')
+    if args.output:
+        with open(args.output, 'wt') as f:
+            f.write('\n'.join(lines) + '\n')
+        print(f'已把{len(games)}种玩法的{args.count}次开奖写入{args.output}')
+    else:
+        print('\n'.join(lines))
+    return 0
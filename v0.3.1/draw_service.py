@@ -0,0 +1,302 @@
+"""
+本地开奖服务
+
+以服务方式运行开奖：基于asyncio的HTTP服务（可以监听TCP端口或Unix套接字），提交【彩票池】文件后，
+计算完哈希值立即返回，nonce搜索在后台线程中进行（线程再使用进程池并行计算），不阻塞事件循环。
+多个开奖可以同时进行，每个开奖的进度事件（已检查的nonce数、找到的nonce值、预计剩余时间和开奖结果）
+以Server-Sent Events的形式推送给任意多个观察者，后加入的观察者先收到此前的全部事件。
+
+接口：
+
+POST /draws                 提交开奖，请求体为JSON：{"pool": "lottery_model.data", "difficulty": "0003",
+                            "n": 10, "game": "double_chromosphere", "hash": "sha3_256", "workers": 4}，
+                            返回 {"id": 1, "hash_sum": "..."}
+GET  /draws                 全部开奖的状态
+GET  /draws/<id>            一次开奖的状态
+GET  /draws/<id>/events     进度事件流
+
+使用示例：
+
+D:\\>python lottery_model.py serve --port 8000
+$ curl -d '{"pool": "lottery_model.data", "difficulty": "0003"}' http://127.0.0.1:8000/draws
+$ curl -N http://127.0.0.1:8000/draws/1/events
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from calibrate import qualify_probability
+from games import GAMES
+from lottery_model import draw_numbers, iter_nonce_chunks
+from nonce_engines import ENGINES, check_engine
+from pool_file import hash_pool
+
+"""两次进度事件之间至少间隔的秒数"""
+PROGRESS_INTERVAL = 0.5
+
+"""同时进行nonce搜索的开奖个数上限，更多的开奖排队等待，不影响新提交的开奖计算哈希值"""
+MAX_SEARCHES = 32
+
+"""开奖结束时的事件类型，之后不再有新事件"""
+TERMINAL_EVENTS = ('result', 'error', 'cancelled')
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class Draw(object):
+    """一次开奖，保存全部事件，并转发给正在观察的各个队列"""
+
+    def __init__(self, draw_id, params):
+        self.id = draw_id
+        self.params = params
+        self.state = 'hashing'
+        self.hash_sum = None
+        self.result = None
+        self.events = []
+        self.watchers = set()
+        self.stop = threading.Event()
+
+    def publish(self, event):
+        """只能在事件循环所在的线程中调用"""
+        event = dict(event, draw=self.id, time=time.time())
+        if event['type'] in TERMINAL_EVENTS:
+            self.state = event['type']
+        if event['type'] == 'result':
+            self.result = event['result']
+        self.events.append(event)
+        for queue in self.watchers:
+            queue.put_nowait(event)
+
+    @property
+    def done(self):
+        return self.state in TERMINAL_EVENTS
+
+    def status(self):
+        return {'id': self.id, 'state': self.state, 'hash_sum': self.hash_sum, 'result': self.result,
+                'params': self.params}
+
+
+def search(draw, origin_hash_sum, emit):
+    """在后台线程中运行的nonce搜索，结果与nonce_filter相同，emit把事件交给事件循环"""
+    params = draw.params
+    HASH = getattr(hashlib, params['hash'])
+    n = params['n']
+    p = qualify_probability(params['difficulty'], HASH().digest_size)
+    found = []
+    begin = reported = time.monotonic()
+    chunks = iter_nonce_chunks(origin_hash_sum, params['difficulty'], HASH, params['workers'],
+                               engine=params['engine'])
+    with closing(chunks):
+        for _, stop, chunk_found in chunks:
+            if draw.stop.is_set():
+                emit({'type': 'cancelled', 'scanned': stop})
+                return
+            for hash_sum, nonce in chunk_found[:n - len(found)]:
+                emit({'type': 'hit', 'nonce': nonce, 'hash_sum': hash_sum, 'hits': len(found) + 1})
+            found.extend(chunk_found)
+            now = time.monotonic()
+            if len(found) >= n or now - reported >= PROGRESS_INTERVAL:
+                rate = stop / (now - begin) if now > begin else 0
+                """剩余nonce个数的期望为(n - 已找到的个数) / p"""
+                remaining = max(n - len(found), 0) / p if p else None
+                emit({'type': 'progress', 'scanned': stop, 'hits': min(len(found), n), 'rate': rate,
+                      'eta': remaining / rate if rate and remaining is not None else None})
+                reported = now
+            if len(found) >= n:
+                break
+
+    hash_sum, nonce = min(found[:n])
+    result = draw_numbers(nonce, origin_hash_sum, GAMES[params['game']], HASH)
+    emit({'type': 'result', 'nonce': nonce, 'hash_sum': hash_sum, 'result': result})
+
+
+class DrawService(object):
+
+    def __init__(self, workers=1, engine='prefix'):
+        self.workers = workers
+        self.engine = engine
+        self.draws = {}
+        """计算哈希值和nonce搜索使用各自的线程池，同时进行的搜索再多，新提交的开奖也能立即得到哈希值"""
+        self.hashing = ThreadPoolExecutor(thread_name_prefix='hashing')
+        self.searching = ThreadPoolExecutor(max_workers=MAX_SEARCHES, thread_name_prefix='searching')
+        """事件循环只保留任务的弱引用，这里保存正在运行的任务，避免搜索中途被回收"""
+        self.tasks = set()
+
+    async def submit(self, request):
+        """计算彩票池的哈希值后返回，nonce搜索在后台继续"""
+        params = {'pool': request['pool'], 'difficulty': str(request.get('difficulty', '00003')),
+                  'n': int(request.get('n', 10)), 'game': request.get('game', 'double_chromosphere'),
+                  'hash': request.get('hash', 'sha3_256'), 'workers': int(request.get('workers', self.workers)),
+                  'engine': request.get('engine', self.engine)}
+        if params['game'] not in GAMES or params['hash'] not in ('sha256', 'sha3_256') or \
+                params['engine'] not in ENGINES or params['n'] < 1:
+            raise ValueError(f'参数不正确: {params}')
+        check_engine(params['engine'], params['hash'])
+        draw = Draw(len(self.draws) + 1, params)
+        self.draws[draw.id] = draw
+
+        loop = asyncio.get_running_loop()
+        try:
+            draw.hash_sum = await loop.run_in_executor(self.hashing, _hash_file, params['pool'], params['hash'])
+        except OSError as e:
+            draw.publish({'type': 'error', 'message': f'文件或路径不存在: {e.filename}'})
+            raise
+        draw.publish({'type': 'hash', 'hash_sum': draw.hash_sum})
+        draw.state = 'searching'
+
+        def emit(event):
+            loop.call_soon_threadsafe(draw.publish, event)
+
+        task = asyncio.ensure_future(self._run(draw, emit))
+        self.tasks.add(task)
+        task.add_done_callback(self._finished)
+        return draw
+
+    async def _run(self, draw, emit):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.searching, search, draw, draw.hash_sum, emit)
+        except Exception as e:
+            print(f'[错误 -1] 第{draw.id}次开奖的nonce搜索失败: {e!r}')
+            emit({'type': 'error', 'message': repr(e)})
+
+    def _finished(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f'[错误 -1] 开奖任务异常结束: {task.exception()!r}')
+
+    def shutdown(self):
+        for draw in self.draws.values():
+            draw.stop.set()
+        self.hashing.shutdown(wait=False)
+        self.searching.shutdown(wait=False)
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, body = await _read_request(reader)
+        except (ValueError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        try:
+            if parts == ['draws'] and method == 'POST':
+                try:
+                    draw = await self.submit(json.loads(body or b'{}'))
+                except (KeyError, ValueError) as e:
+                    return await _respond(writer, 400, {'error': f'请求不正确: {e!r}'})
+                except OSError as e:
+                    return await _respond(writer, 400, {'error': f'文件或路径不存在: {e.filename}'})
+                return await _respond(writer, 201, {'id': draw.id, 'hash_sum': draw.hash_sum})
+            if parts == ['draws'] and method == 'GET':
+                return await _respond(writer, 200, [draw.status() for draw in self.draws.values()])
+            if len(parts) >= 2 and parts[0] == 'draws' and parts[1].isdigit() and int(parts[1]) in self.draws:
+                draw = self.draws[int(parts[1])]
+                if method != 'GET':
+                    return await _respond(writer, 405, {'error': method})
+                if len(parts) == 2:
+                    return await _respond(writer, 200, draw.status())
+                if parts[2:] == ['events']:
+                    return await self._stream(draw, writer)
+            return await _respond(writer, 404, {'error': path})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _stream(self, draw, writer):
+        """先补发此前的事件，再推送新事件，开奖结束后关闭连接"""
+        queue = asyncio.Queue()
+        draw.watchers.add(queue)
+        try:
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                         b'Cache-Control: no-cache\r\nConnection: close\r\n\r\n')
+            history = list(draw.events)
+            for event in history:
+                writer.write(_sse(event))
+            """在第一次await之前根据补发的事件判断是否已结束，等待期间结束的开奖，其最后的事件已在queue中"""
+            finished = bool(history) and history[-1]['type'] in TERMINAL_EVENTS
+            await writer.drain()
+            while not finished:
+                event = await queue.get()
+                writer.write(_sse(event))
+                await writer.drain()
+                finished = event['type'] in TERMINAL_EVENTS
+        finally:
+            draw.watchers.discard(queue)
+
+
+def _hash_file(path, hash_name):
+    with open(path, 'rt') as f:
+        return hash_pool(f, getattr(hashlib, hash_name))
+
+
+def _sse(event):
+    return f'event: {event["type"]}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n'.encode()
+
+
+async def _read_request(reader):
+    """读取一个HTTP请求，返回(方法, 路径, 请求体)"""
+    request_line = (await reader.readline()).decode('latin-1').split()
+    if len(request_line) < 2:
+        raise ValueError('请求行不正确')
+    length = 0
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length) if length else b''
+    return request_line[0].upper(), request_line[1], body
+
+
+async def _respond(writer, status, payload):
+    data = json.dumps(payload, ensure_ascii=False).encode()
+    writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n'
+                 f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode() + data)
+    await writer.drain()
+
+
+async def serve(host='127.0.0.1', port=8000, unix=None, workers=1, engine='prefix'):
+    service = DrawService(workers, engine)
+    if unix:
+        server = await asyncio.start_unix_server(service.handle, path=unix)
+        print(f'开奖服务监听 {unix}')
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+        print(f'开奖服务监听 http://{host}:{port}')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.shutdown()
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py serve',
+                                     description='以本地服务方式运行开奖，推送进度事件，可同时进行多个开奖')
+    parser.add_argument('--host', dest='host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', dest='port', type=int, default=8000, help='监听端口')
+    parser.add_argument('--unix', dest='unix', default=None, help='改为监听Unix套接字')
+    parser.add_argument('-w', dest='workers', type=int, default=os.cpu_count(),
+                        help='每个开奖默认使用的进程数，可以在提交开奖时指定')
+    parser.add_argument('-e', dest='engine', default='prefix', choices=sorted(ENGINES),
+                        help='nonce搜索引擎')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.engine))
+    except KeyboardInterrupt:
+        pass
+    return 0
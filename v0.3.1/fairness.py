@@ -0,0 +1,265 @@
+"""
+开奖号码映射的公平性模拟
+
+开奖号码由256位的哈希值对组合数取模得到（games.map_draw），前区和后区使用同一个哈希值。
+本模块生成大量模拟的哈希值（默认为均匀随机数，也可以用sha256_numpy批量计算真实的SHA-256），
+用draw_batch整批向量化地完成与map_draw相同的运算，在进程池中并行统计，对每种玩法给出：
+
+- 均匀性：前区组合序号、后区组合序号的卡方检验，以及每个号码出现频率的最大偏差（以标准差计）；
+- 取模偏差：2^256不是组合数的整数倍，序号较小的组合多一个原像，给出精确的总变差距离；
+- 前后区的独立性：前区序号对后区组合数取余后与后区序号的列联表卡方检验。derive为shared的玩法，
+  前后区序号都由哈希值对lcm(前区组合数, 后区组合数)的余数决定，只有lcm个(前区, 后区)组合可能开出，
+  其余组合永远不会中一等奖；derive为split的玩法没有这个问题。
+
+使用示例，模拟1亿个哈希值，任何一项检验的p值小于alpha时返回1，可以在每次发布前运行：
+
+D:\\>python lottery_model.py fairness -n 100000000 --json fairness.json
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from combinatorics import unrank_combinations
+from draw_batch import draw_arrays, zone_index_arrays
+from games import GAMES, format_ticket, map_draw, zone_sizes
+
+"""每批模拟的哈希值个数"""
+BATCH_SIZE = 1 << 20
+
+"""哈希值的位数"""
+DIGEST_BITS = 256
+
+"""每个进程每次模拟的哈希值个数"""
+CHUNK_SIZE = BATCH_SIZE * 4
+
+"""每区最多统计的组合数，超过时计数数组占用的内存过多"""
+MAX_COMBINATIONS = 1 << 25
+
+"""独立性列联表每边最多的格数"""
+MAX_TABLE_SIDE = 256
+
+SOURCES = ('random', 'sha256')
+
+
+def chi2_sf(x, df):
+    """卡方分布的上侧概率，使用Wilson-Hilferty近似"""
+    if df <= 0:
+        return 1.0
+    z = ((x / df) ** (1 / 3) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def chi_square(counts, expected=None, df=None):
+    """counts与期望值（默认为均匀分布）的卡方统计量和p值，df默认为counts.size - 1"""
+    counts = np.asarray(counts, dtype=np.float64)
+    if expected is None:
+        expected = np.full(counts.shape, counts.sum() / counts.size)
+    statistic = float(((counts - expected) ** 2 / expected).sum())
+    df = counts.size - 1 if df is None else df
+    return {'statistic': statistic, 'df': df, 'p_value': chi2_sf(statistic, df)}
+
+
+def modulo_bias(m, bits=DIGEST_BITS):
+    """bits位的均匀随机数对m取模的偏差：序号小于2^bits mod m的组合多一个原像"""
+    q, r = divmod(1 << bits, m)
+    """这些组合的概率是其他组合的(q + 1) / q倍，总变差距离 = r * (m - r) / (m * 2^bits)"""
+    distance = r * (m - r) / m
+    return {'modulus': m, 'favoured': r,
+            'excess_log2': -math.log2(q) if r else None,
+            'total_variation_log2': math.log2(distance) - bits if r else None}
+
+
+def digest_words(source, rng, start, count, origin_hash_sum=None):
+    """产生count个哈希值，返回形状(8, count)的uint32数组
+
+    source为'random'时为均匀随机数；为'sha256'时为 origin_hash_sum + str(nonce) 的SHA-256，nonce从start开始。
+    """
+    if source == 'random':
+        return rng.bit_generator.random_raw(count * DIGEST_BITS // 64).view(np.uint32).reshape(DIGEST_BITS // 32,
+                                                                                              count)
+    from sha256_numpy import _split_by_width, prefix_midstate, sha256_nonce_words
+
+    prefix = origin_hash_sum.encode()
+    midstate = prefix_midstate(prefix)
+    parts = [sha256_nonce_words(prefix, np.arange(a, b, dtype=np.uint64), midstate)
+             for a, b in _split_by_width(start, start + count)]
+    return np.concatenate(parts, axis=1)
+
+
+def table_side(game):
+    """列联表的行为前区序号 mod side，列为后区序号 mod side
+
+    side为前后区组合数中较小的一个（不超过MAX_TABLE_SIDE），shared规则下两个组合数的公约数会使列联表中出现空格。
+    """
+    return min(min(zone_sizes(game)), MAX_TABLE_SIDE)
+
+
+def simulate_chunk(source, seed, start, count, game_names, origin_hash_sum=None, batch_size=BATCH_SIZE):
+    """模拟一段哈希值，返回每种玩法的(前区序号计数, 后区序号计数, 列联表计数)"""
+    rng = np.random.Generator(np.random.PCG64(seed))
+    games = [GAMES[name] for name in game_names]
+    counts = {game.name: [np.zeros(size, dtype=np.int64) for size in zone_sizes(game) + (table_side(game) ** 2,)]
+              for game in games}
+
+    for offset in range(0, count, batch_size):
+        words = digest_words(source, rng, start + offset, min(batch_size, count - offset), origin_hash_sum)
+        for game in games:
+            front_index, back_index = zone_index_arrays(words, game)
+            side = np.uint64(table_side(game))
+            front_counts, back_counts, table = counts[game.name]
+            front_counts += np.bincount(front_index, minlength=len(front_counts))
+            back_counts += np.bincount(back_index, minlength=len(back_counts))
+            table += np.bincount(front_index % side * side + back_index % side, minlength=len(table))
+    return counts
+
+
+def ball_frequencies(combination_counts, balls, selected, batch_size=BATCH_SIZE):
+    """由各组合的计数得到每个号码出现的次数"""
+    frequencies = np.zeros(balls, dtype=np.int64)
+    for start in range(0, len(combination_counts), batch_size):
+        indexes = np.arange(start, min(start + batch_size, len(combination_counts)))
+        positions = unrank_combinations(indexes, balls, selected)
+        frequencies += np.bincount(positions.ravel(), weights=np.repeat(combination_counts[indexes], selected),
+                                   minlength=balls).astype(np.int64)
+    return frequencies
+
+
+def _ball_deviation(frequencies, samples, selected):
+    """每个号码的出现次数服从二项分布B(samples, selected / balls)，返回偏离期望最多的号码和偏离的标准差数"""
+    p = selected / len(frequencies)
+    z = (frequencies - samples * p) / math.sqrt(samples * p * (1 - p))
+    worst = int(np.argmax(np.abs(z)))
+    return {'ball': worst + 1, 'z': float(z[worst])}
+
+
+def fairness_report(game, samples, front_counts, back_counts, table):
+    front, back = zone_sizes(game)
+    """shared规则下前后区序号都由 H mod lcm 决定，只有lcm个(前区, 后区)组合可能开出"""
+    reachable = math.lcm(front, back) if game.derive == 'shared' else front * back
+    side = table_side(game)
+    table = table.reshape(side, side)
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / samples
+    return {
+        'game': game.name,
+        'samples': samples,
+        'front_uniformity': chi_square(front_counts),
+        'back_uniformity': chi_square(back_counts),
+        'front_balls': _ball_deviation(ball_frequencies(front_counts, len(game.front_balls), game.front_selected),
+                                       samples, game.front_selected),
+        'back_balls': _ball_deviation(ball_frequencies(back_counts, len(game.back_balls), game.back_selected),
+                                      samples, game.back_selected),
+        'modulo_bias': {'front': modulo_bias(front), 'back': modulo_bias(back)},
+        'independence': dict(chi_square(table, expected, (side - 1) ** 2),
+                             reachable_tickets=reachable, total_tickets=front * back,
+                             empty_cells=int((table == 0).sum()), cells=table.size),
+    }
+
+
+def simulate(samples, game_names=tuple(GAMES), workers=1, source='random', seed=0, origin_hash_sum=None):
+    """在workers个进程中模拟samples个哈希值，返回每种玩法的统计结果"""
+    for name in game_names:
+        if max(zone_sizes(GAMES[name])) > MAX_COMBINATIONS:
+            raise ValueError(f'玩法{name}的组合数超过{MAX_COMBINATIONS}，无法逐个组合统计')
+    if source == 'sha256' and origin_hash_sum is None:
+        origin_hash_sum = hashlib.sha256(b'lottery_model').hexdigest()
+    """每段的大小固定，相同的种子在不同的进程数下结果相同"""
+    chunks = max(1, -(-samples // CHUNK_SIZE))
+    bounds = [samples * i // chunks for i in range(chunks + 1)]
+    seeds = np.random.SeedSequence(seed).generate_state(chunks, dtype=np.uint64).tolist()
+    totals = None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for counts in executor.map(simulate_chunk, [source] * chunks, seeds, bounds[:-1],
+                                   [b - a for a, b in zip(bounds, bounds[1:])], [tuple(game_names)] * chunks,
+                                   [origin_hash_sum] * chunks):
+            if totals is None:
+                totals = counts
+            else:
+                for name in totals:
+                    for total, part in zip(totals[name], counts[name]):
+                        total += part
+    return {name: fairness_report(GAMES[name], samples, *totals[name]) for name in game_names}
+
+
+def cross_check(count=1000, seed=0):
+    """把随机哈希值分别交给games.map_draw和向量化的draw_arrays，返回不一致的个数"""
+    rng = np.random.Generator(np.random.PCG64(seed))
+    words = digest_words('random', rng, 0, count)
+    hash_sums = [''.join(f'{w:08x}' for w in column) for column in words.T.tolist()]
+    mismatches = 0
+    for game in GAMES.values():
+        front, back = draw_arrays(words, game)
+        for hash_sum, f, b in zip(hash_sums, front.tolist(), back.tolist()):
+            mismatches += map_draw(hash_sum, game) != format_ticket(f, b, None, game)
+    return mismatches
+
+
+def failed_checks(report, alpha):
+    """p值小于alpha的检验"""
+    return [name for name in ('front_uniformity', 'back_uniformity', 'independence')
+            if report[name]['p_value'] < alpha]
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py fairness',
+                                     description='用大量模拟的哈希值检验开奖号码映射的均匀性、取模偏差和前后区独立性')
+    parser.add_argument('-n', dest='samples', type=int, default=100_000_000, help='模拟的哈希值个数')
+    parser.add_argument('-g', dest='games', action='append', choices=sorted(GAMES), default=None,
+                        help='彩票玩法，可以重复使用，默认为全部玩法')
+    parser.add_argument('-w', dest='workers', type=int, default=os.cpu_count(),
+                        help='并行模拟的进程数，默认使用全部CPU核心')
+    parser.add_argument('--source', dest='source', default='random', choices=SOURCES,
+                        help="哈希值的来源：'random'为均匀随机数，'sha256'为真实的SHA-256（较慢）")
+    parser.add_argument('--seed', dest='seed', type=int, default=0, help='随机数种子，相同的种子结果相同')
+    parser.add_argument('--alpha', dest='alpha', type=float, default=1e-6, help='判定检验失败的p值')
+    parser.add_argument('--json', dest='json', default=None, help='把完整的统计结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    mismatches = cross_check()
+    if mismatches:
+        print(f'[失败] 向量化的取模运算与map_draw有{mismatches}处不一致')
+        return 1
+    begin = time.perf_counter()
+    try:
+        reports = simulate(args.samples, args.games or tuple(GAMES), args.workers, args.source, args.seed)
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    seconds = time.perf_counter() - begin
+    print(f'模拟{args.samples}个哈希值，用时{seconds:.1f}秒，{args.samples / seconds:,.0f} 个/秒')
+    if args.json:
+        with open(args.json, 'wt') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=1)
+
+    failed = False
+    for name, report in reports.items():
+        print('')
+        print(f'{name}:')
+        for label, key in (('前区组合均匀性', 'front_uniformity'), ('后区组合均匀性', 'back_uniformity'),
+                           ('前后区独立性', 'independence')):
+            test = report[key]
+            print(f'    {label}：卡方 {test["statistic"]:.1f}，自由度 {test["df"]}，p值 {test["p_value"]:.3g}')
+        for label, key in (('前区', 'front_balls'), ('后区', 'back_balls')):
+            print(f'    {label}号码频率偏差最大的是{report[key]["ball"]:02d}号，{report[key]["z"]:+.2f}个标准差')
+        for label, key in (('前区', 'front'), ('后区', 'back')):
+            bias = report['modulo_bias'][key]
+            print(f'    {label}取模偏差：' + (f'总变差距离 2^{bias["total_variation_log2"]:.1f}'
+                                            if bias['favoured'] else '组合数整除2^256，没有偏差'))
+        independence = report['independence']
+        if independence['reachable_tickets'] < independence['total_tickets']:
+            print(f'    前后区使用同一个哈希值，只有{independence["reachable_tickets"]}/{independence["total_tickets"]}'
+                  f'个号码组合可能开出，列联表有{independence["empty_cells"]}/{independence["cells"]}格为空')
+        checks = failed_checks(report, args.alpha)
+        if checks:
+            failed = True
+            print(f'    [失败] p值小于{args.alpha}：{checks}')
+    return 1 if failed else 0
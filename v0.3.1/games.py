@@ -0,0 +1,275 @@
+"""
+彩票玩法
+
+每种玩法分为前区和后区，以双色球为例，前区为33个红球中选6个，后区为16个篮球中选1个。
+彩票池中的一行表示一注彩票，'01 04 15 17 27 30|11 45147094'表示6个红球、1个篮球和票号，
+票号可以省略。
+
+玩法从SPEC_FILE（默认为本目录下的games.json，可以用环境变量LOTTERY_GAMES指定其他文件）读取，
+增加玩法只需在该文件中增加一项：
+
+"double_chromosphere": {"title": "福利彩票双色球", "front": {"balls": 33, "picks": 6},
+                        "back": {"balls": 16, "picks": 1}, "derive": "shared",
+                        "prizes": [{"name": "一等奖", "hits": ["6+1"]}, ...]}
+
+号码为两位数字，每区最多MAX_BALLS个号码（settlement把每区号码编码为uint64位掩码），前区、后区的组合数
+不能超过pool_binary记录中<u4、<u2字段的范围。prizes按奖级从高到低列出每个奖级的名称和命中个数
+'前区+后区'，没有列出的命中个数不中奖；没有prizes的玩法可以开奖，但不能结算。
+derive为由哈希值H得到前后区组合序号的规则：
+- shared：前区序号为 H mod 前区组合数，后区序号为 H mod 后区组合数（双色球、大乐透沿用的规则，
+  两个组合数有公约数时前后区不独立，参见fairness）；
+- split：前区序号为 H mod 前区组合数，后区序号为 (H // 前区组合数) mod 后区组合数，前后区独立。
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+from functools import lru_cache
+import json
+import math
+import os
+
+SPEC_FILE = os.environ.get('LOTTERY_GAMES') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'games.json')
+
+DERIVATIONS = ('shared', 'split')
+
+"""每区的号码个数上限"""
+MAX_BALLS = 64
+
+"""pool_binary记录中前区、后区组合序号字段（<u4、<u2）能表示的组合数上限"""
+MAX_ZONE_COMBINATIONS = (1 << 32, 1 << 16)
+
+Game = namedtuple('Game', 'name front_balls front_selected back_balls back_selected derive title prizes',
+                  defaults=('shared', '', ()))
+
+
+def _zone(spec, name, zone):
+    try:
+        balls, picks = int(spec[zone]['balls']), int(spec[zone]['picks'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f'玩法{name}的{zone}应为{{"balls": 号码个数, "picks": 选号个数}}')
+    if not 1 <= picks <= balls <= MAX_BALLS:
+        raise ValueError(f'玩法{name}的{zone}应满足 1 <= picks <= balls <= {MAX_BALLS}')
+    limit = MAX_ZONE_COMBINATIONS[zone == 'back']
+    if math.comb(balls, picks) > limit:
+        raise ValueError(f'玩法{name}的{zone}组合数{math.comb(balls, picks)}超过{limit}，二进制彩票池无法保存')
+    return tuple(f'{i:02d}' for i in range(1, balls + 1)), picks
+
+
+def _prizes(spec, name, front_selected, back_selected):
+    """返回((奖级名称, ((前区命中个数, 后区命中个数), ...)), ...)，第i项为第i + 1等奖"""
+    prizes = []
+    seen = set()
+    try:
+        for prize in spec.get('prizes', ()):
+            hits = tuple(tuple(int(x) for x in h.split('+')) for h in prize['hits'])
+            prizes.append((str(prize['name']), hits))
+            for h in hits:
+                if len(h) != 2 or not (0 <= h[0] <= front_selected and 0 <= h[1] <= back_selected) or h in seen:
+                    raise ValueError
+                seen.add(h)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise ValueError(f'玩法{name}的prizes应为[{{"name": 奖级名称, "hits": ["前区命中个数+后区命中个数", ...]}}, ...]，'
+                         f'命中个数不能超过选号个数，也不能重复')
+    return tuple(prizes)
+
+
+def load_games(path=SPEC_FILE):
+    """读取玩法定义文件，返回玩法名称到Game的字典，定义不正确时抛出ValueError"""
+    with open(path, 'rt', encoding='utf-8') as f:
+        specs = json.load(f)
+    games = {}
+    for name, spec in specs.items():
+        derive = spec.get('derive', 'shared')
+        if derive not in DERIVATIONS:
+            raise ValueError(f'玩法{name}的derive应为{DERIVATIONS}之一: {derive!r}')
+        front_balls, front_selected = _zone(spec, name, 'front')
+        back_balls, back_selected = _zone(spec, name, 'back')
+        games[name] = Game(name, front_balls, front_selected, back_balls, back_selected, derive,
+                           spec.get('title', ''), _prizes(spec, name, front_selected, back_selected))
+    return games
+
+
+GAMES = load_games()
+
+
+@lru_cache(maxsize=None)
+def zone_sizes(game):
+    """前区、后区的组合数，每种玩法只计算一次"""
+    from combinatorics import binomial
+
+    return binomial(len(game.front_balls), game.front_selected), binomial(len(game.back_balls), game.back_selected)
+
+
+def zone_indexes(value, game):
+    """按玩法的derive规则，由哈希值的整数value得到(前区组合序号, 后区组合序号)"""
+    front, back = zone_sizes(game)
+    if game.derive == 'split':
+        return value % front, value // front % back
+    return value % front, value % back
+
+
+def map_draw(hash_sum, game):
+    """把十六进制的哈希值映射为玩法game的开奖号码，例如'09 17 21 25 26 30|04'"""
+    from combinatorics import unrank_combination
+
+    front_index, back_index = zone_indexes(int(hash_sum, 16), game)
+    front = unrank_combination(front_index, len(game.front_balls), game.front_selected)
+    back = unrank_combination(back_index, len(game.back_balls), game.back_selected)
+    return ' '.join(game.front_balls[i] for i in front) + '|' + ' '.join(game.back_balls[i] for i in back)
+
+
+def parse_ticket(line, game):
+    """解析一注彩票，返回(前区号码, 后区号码, 票号)，号码为从1开始的整数，没有票号时票号为None
+
+    只检查格式、个数和范围，不检查号码是否重复或升序排列。格式不正确时抛出ValueError。
+    """
+    zones = line.split('|')
+    if len(zones) != 2:
+        raise ValueError(f'应使用一个"|"分隔前区和后区: {line!r}')
+    front = zones[0].split()
+    rest = zones[1].split()
+    back, ticket_id = rest[:game.back_selected], rest[game.back_selected:]
+    if len(front) != game.front_selected or len(back) != game.back_selected or len(ticket_id) > 1:
+        raise ValueError(f'{game.name}应为前区{game.front_selected}个号码、'
+                         f'后区{game.back_selected}个号码和可选的票号: {line!r}')
+    if not all(x.isascii() and x.isdigit() for x in front + back + ticket_id):
+        raise ValueError(f'号码和票号只能包含数字: {line!r}')
+    front = tuple(int(x) for x in front)
+    back = tuple(int(x) for x in back)
+    if not all(1 <= x <= len(game.front_balls) for x in front) or \
+            not all(1 <= x <= len(game.back_balls) for x in back):
+        raise ValueError(f'号码超出范围: {line!r}')
+    return front, back, ticket_id[0] if ticket_id else None
+
+
+def format_ticket(front, back, ticket_id, game):
+    """parse_ticket的逆运算，返回标准格式的一注彩票"""
+    line = ' '.join(game.front_balls[x - 1] for x in front) + '|' + \
+        ' '.join(game.back_balls[x - 1] for x in back)
+    if ticket_id is not None:
+        line += ' ' + ticket_id
+    return line
+
+
+def normalize_ticket(line, game):
+    """把一注彩票整理为标准格式：号码补足两位、各区内升序排列、以单个空格分隔
+
+    同一区内有重复号码时抛出ValueError。
+    """
+    front, back, ticket_id = parse_ticket(line, game)
+    if len(set(front)) != len(front) or len(set(back)) != len(back):
+        raise ValueError(f'同一区内有重复号码: {line!r}')
+    return format_ticket(sorted(front), sorted(back), ticket_id, game)
+
+
+def parse_tickets(lines, game):
+    """批量解析多注彩票，返回(前区号码数组, 后区号码数组, 票号列表)
+
+    号码数组为形状(len(lines), 选号个数)的NumPy整数数组，票号列表中没有票号的为None。
+    各行格式一致时整批向量化转换，否则逐行解析，格式不正确时抛出ValueError。
+    """
+    import numpy as np
+
+    f, b = game.front_selected, game.back_selected
+    text = '\n'.join(lines)
+    if not text.isascii():
+        return _parse_tickets_slow(lines, game)
+    data = text.encode()
+    parsed = _parse_fixed_width(data, len(lines), game)
+    if parsed is not None:
+        return parsed
+
+    tokens = data.replace(b'|', b' | ').split()
+    for columns in (f + 1 + b, f + 1 + b + 1):
+        if not lines or len(tokens) != columns * len(lines):
+            continue
+        table = np.array(tokens).reshape(len(lines), columns)
+        """每行只有一个'|'，且正好在前区号码之后"""
+        if not (table[:, f] == b'|').all() or (table == b'|').sum() != len(lines):
+            break
+        numbers = np.delete(table, f, axis=1)
+        if not np.char.isdigit(numbers).all():
+            break
+        front = numbers[:, :f].astype(np.int64)
+        back = numbers[:, f:f + b].astype(np.int64)
+        if front.size and (front.min() < 1 or front.max() > len(game.front_balls)) or \
+                back.size and (back.min() < 1 or back.max() > len(game.back_balls)):
+            break
+        ids = [x.decode() for x in numbers[:, f + b].tolist()] if columns > f + 1 + b else [None] * len(lines)
+        return front, back, ids
+
+    return _parse_tickets_slow(lines, game)
+
+
+def _parse_fixed_width(data, count, game):
+    """标准格式且票号位数相同时，每行长度相同，直接按列取出各个数字"""
+    import numpy as np
+
+    f, b = game.front_selected, game.back_selected
+    if not count or (len(data) + 1) % count:
+        return None
+    width = (len(data) + 1) // count
+    numbers_width = 3 * (f + b)
+    if width < numbers_width or width == numbers_width + 1:
+        return None
+    rows = np.frombuffer(data + b'\n', dtype=np.uint8).reshape(count, width)
+    """每个号码两位数字，其后依次为空格、'|'或行尾/票号前的空格"""
+    separators = [ord(' ')] * (f + b)
+    separators[f - 1] = ord('|')
+    separators[-1] = ord('\n') if width == numbers_width else ord(' ')
+    columns = np.arange(f + b) * 3
+    if (rows[:, columns + 2] != separators).any() or (rows[:, -1] != ord('\n')).any():
+        return None
+    digits = rows[:, np.concatenate([columns, columns + 1])].astype(np.int64) - ord('0')
+    id_digits = rows[:, numbers_width:-1]
+    if (digits < 0).any() or (digits > 9).any() or (id_digits < ord('0')).any() or (id_digits > ord('9')).any():
+        return None
+    numbers = digits[:, :f + b] * 10 + digits[:, f + b:]
+    front, back = numbers[:, :f], numbers[:, f:]
+    if front.min() < 1 or front.max() > len(game.front_balls) or back.min() < 1 or back.max() > len(game.back_balls):
+        return None
+    if width == numbers_width:
+        return front, back, [None] * count
+    ids = np.ascontiguousarray(id_digits).view(f'S{id_digits.shape[1]}').ravel()
+    return front, back, [x.decode() for x in ids.tolist()]
+
+
+def _parse_tickets_slow(lines, game):
+    import numpy as np
+
+    f, b = game.front_selected, game.back_selected
+    parsed = [parse_ticket(line, game) for line in lines]
+    front = np.array([p[0] for p in parsed], dtype=np.int64).reshape(len(lines), f)
+    back = np.array([p[1] for p in parsed], dtype=np.int64).reshape(len(lines), b)
+    return front, back, [p[2] for p in parsed]
+
+
+def ticket_ranks(front, back, game):
+    """批量计算彩票在全部号码组合中的序号：前区组合序号 * 后区组合数 + 后区组合序号
+
+    front、back为parse_tickets返回的号码数组，各区内号码应升序排列且不重复。
+    """
+    from combinatorics import rank_combinations
+
+    return rank_combinations(front - 1, len(game.front_balls)) * zone_sizes(game)[1] + \
+        rank_combinations(back - 1, len(game.back_balls))
+
+
+def ticket_rank(front, back, game):
+    """ticket_ranks的单注版本，front、back为升序排列的号码"""
+    from combinatorics import rank_combination
+
+    return rank_combination([x - 1 for x in front], len(game.front_balls)) * zone_sizes(game)[1] + \
+        rank_combination([x - 1 for x in back], len(game.back_balls))
+
+
+def ticket_from_rank(rank, game):
+    """ticket_ranks的逆运算，返回(前区号码, 后区号码)"""
+    from combinatorics import unrank_combination
+
+    front_rank, back_rank = divmod(rank, zone_sizes(game)[1])
+    front = unrank_combination(front_rank, len(game.front_balls), game.front_selected)
+    back = unrank_combination(back_rank, len(game.back_balls), game.back_selected)
+    return tuple(x + 1 for x in front), tuple(x + 1 for x in back)
@@ -0,0 +1,194 @@
+"""
+顺序哈希链延时函数
+
+nonce_filter的工作量证明耗时波动很大，而且增加硬件就能缩短。哈希链从彩票池的哈希值出发，
+x_0 = bytes.fromhex(origin_hash_sum)，x_(i+1) = HASH(x_i).digest()，顺序计算steps次；
+每一步都依赖上一步的结果，无法并行，耗时只取决于单核速度，可以预先准确估计。
+每interval步记录一个检查点，验证者把相邻检查点之间的各段分给全部CPU核心同时重新计算，
+验证时间约为计算时间除以核心数。最终值x_steps作为nonce值输入原有的双色球/大乐透函数计算开奖号码。
+
+记录文件每行一个JSON对象，第一行为参数，其后每行一个检查点：
+
+{"origin_hash_sum": "7ee4...1aff", "hash": "sha3_256", "steps": 100000000, "interval": 1000000}
+{"step": 0, "value": "7ee4...1aff"}
+{"step": 1000000, "value": "5c0b..."}
+
+使用示例，使计算时长约为45分钟，中断后继续计算（步数沿用记录文件中的值），再用全部CPU核心验证：
+
+D:\\>python lottery_model.py delay run lottery_model.data --duration 45m -o lottery_model.delay
+D:\\>python lottery_model.py delay run lottery_model.data --duration 45m -o lottery_model.delay --resume
+D:\\>python lottery_model.py delay verify lottery_model.delay
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+
+from calibrate import parse_duration
+from games import GAMES
+from lottery_model import draw_numbers, hash_file_data
+
+"""两个检查点之间的默认步数"""
+INTERVAL = 1 << 20
+
+
+def iterate(value, steps, HASH=hashlib.sha256):
+    """从十六进制的value出发顺序计算steps次哈希，返回十六进制的结果"""
+    x = bytes.fromhex(value)
+    for _ in range(steps):
+        x = HASH(x).digest()
+    return x.hex()
+
+
+def chain_rate(HASH=hashlib.sha256, seconds=2.0):
+    """测量本机每秒能顺序计算的哈希次数"""
+    value = HASH(b'lottery_model').hexdigest()
+    steps = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < seconds:
+        value = iterate(value, 1 << 14, HASH)
+        steps += 1 << 14
+    return steps / (time.perf_counter() - begin)
+
+
+def read_chain(path):
+    """读取记录文件，返回(参数, 检查点列表)，检查点为(step, value)"""
+    with open(path, 'rt') as f:
+        header = json.loads(f.readline())
+        checkpoints = [json.loads(line) for line in f if line.strip()]
+    return header, [(c['step'], c['value']) for c in checkpoints]
+
+
+def run_chain(origin_hash_sum, steps, interval=INTERVAL, HASH=hashlib.sha256, path=None, resume=False):
+    """计算哈希链，返回检查点列表，最后一个检查点为最终值
+
+    path为记录文件名，每算完一段就追加一个检查点；resume为True时从文件中最后一个检查点继续。
+    """
+    header = {'origin_hash_sum': origin_hash_sum, 'hash': HASH().name, 'steps': steps, 'interval': interval}
+    checkpoints = [(0, origin_hash_sum)]
+    if resume and path and os.path.exists(path):
+        old_header, checkpoints = read_chain(path)
+        if old_header != header:
+            raise ValueError(f'记录文件{path}的参数{old_header}与本次计算不一致')
+        print(f'从记录文件{path}继续，已计算{checkpoints[-1][0]}步')
+    f = None
+    if path:
+        f = open(path, 'wt')
+        for entry in [header] + [{'step': step, 'value': value} for step, value in checkpoints]:
+            f.write(json.dumps(entry) + '\n')
+        f.flush()
+
+    reported = time.monotonic()
+    try:
+        step, value = checkpoints[-1]
+        while step < steps:
+            count = min(interval, steps - step)
+            value = iterate(value, count, HASH)
+            step += count
+            checkpoints.append((step, value))
+            if f:
+                f.write(json.dumps({'step': step, 'value': value}) + '\n')
+                f.flush()
+            if time.monotonic() - reported >= 10:
+                print(f'{datetime.now().strftime("%X")} 已计算{step}/{steps}步')
+                reported = time.monotonic()
+    finally:
+        if f:
+            f.close()
+    return checkpoints
+
+
+def verify_interval(begin, end, hash_name):
+    """重新计算相邻两个检查点之间的一段，begin、end为(step, value)"""
+    return iterate(begin[1], end[0] - begin[0], getattr(hashlib, hash_name)) == end[1]
+
+
+def verify_chain(header, checkpoints, workers=1, sample=None):
+    """并行验证各段，返回验证失败的段的序号列表；sample为随机抽取验证的段数"""
+    if not checkpoints or checkpoints[0] != (0, header['origin_hash_sum']) or \
+            checkpoints[-1][0] != header['steps'] or \
+            any(b[0] <= a[0] for a, b in zip(checkpoints, checkpoints[1:])):
+        return [-1]
+    indexes = list(range(len(checkpoints) - 1))
+    if sample is not None and sample < len(indexes):
+        indexes = sorted(random.sample(indexes, sample))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(verify_interval, [checkpoints[i] for i in indexes],
+                               [checkpoints[i + 1] for i in indexes], [header['hash']] * len(indexes))
+        return [i for i, ok in zip(indexes, results) if not ok]
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py delay',
+                                     description='用顺序哈希链代替nonce搜索，耗时可预测，可以并行验证')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='计算哈希链和开奖号码')
+    run.add_argument(dest='pool', help='【彩票池】文件')
+    run.add_argument('-t', dest='steps', type=int, default=None, help='哈希链的步数')
+    run.add_argument('--duration', dest='duration', default=None,
+                     help="按本机速度换算步数的目标时长，例如 '45m'，与 -t 二选一")
+    run.add_argument('-k', dest='interval', type=int, default=None,
+                     help=f'两个检查点之间的步数，默认为{INTERVAL}，继续计算时默认沿用记录文件中的值')
+    run.add_argument('-o', dest='output', default=None, help='记录文件名，默认为【彩票池】文件名加上.delay')
+    run.add_argument('--resume', dest='resume', action='store_true',
+                     help='从记录文件的最后一个检查点继续，步数和检查点间隔沿用记录文件中的值')
+    run.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES), help='彩票玩法')
+
+    verify = commands.add_parser('verify', help='并行验证记录文件中的各段')
+    verify.add_argument(dest='chain', help='记录文件')
+    verify.add_argument('-w', dest='workers', type=int, default=os.cpu_count(),
+                        help='并行验证的进程数，默认使用全部CPU核心')
+    verify.add_argument('--sample', dest='sample', type=int, default=None, help='随机抽取若干段验证')
+    verify.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES), help='彩票玩法')
+    args = parser.parse_args(argv)
+
+    """与main相同，使用sha3_256"""
+    HASH = hashlib.sha3_256
+    try:
+        if args.command == 'run':
+            origin_hash_sum = hash_file_data(args.pool, HASH)
+            path = args.output or args.pool + '.delay'
+            steps, interval = args.steps, args.interval
+            if args.resume and os.path.exists(path):
+                """按--duration重新测速换算的步数几乎不可能与原来的相同，继续计算时沿用记录文件中的参数"""
+                header, _ = read_chain(path)
+                steps = header['steps'] if steps is None else steps
+                interval = header['interval'] if interval is None else interval
+            if steps is None:
+                rate = chain_rate(HASH)
+                steps = int(rate * parse_duration(args.duration or '45m'))
+                print(f'本机顺序哈希速度{rate:,.0f} 次/秒，步数为{steps}')
+            print('')
+            print(f'{datetime.now().strftime("%X")} 计算{steps}步哈希链...')
+            checkpoints = run_chain(origin_hash_sum, steps, interval or INTERVAL, HASH, path, args.resume)
+            print(f'{datetime.now().strftime("%X")} 最终值为{checkpoints[-1][1]}')
+            print('')
+            print('开奖结果为：')
+            print(draw_numbers(checkpoints[-1][1], origin_hash_sum, GAMES[args.game], HASH))
+        else:
+            header, checkpoints = read_chain(args.chain)
+            print(f'彩票池哈希值：{header["origin_hash_sum"]}  步数：{header["steps"]}  检查点：{len(checkpoints)}个')
+            failed = verify_chain(header, checkpoints, args.workers, args.sample)
+            if failed:
+                print(f'[失败] 第{failed}段验证失败' if failed != [-1] else '[失败] 检查点不完整或顺序不正确')
+                return 1
+            checked = len(checkpoints) - 1 if args.sample is None else min(args.sample, len(checkpoints) - 1)
+            print(f'验证了{checked}段，全部通过，开奖结果为：')
+            print(draw_numbers(checkpoints[-1][1], header['origin_hash_sum'], GAMES[args.game],
+                               getattr(hashlib, header['hash'])))
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    return 0
@@ -0,0 +1,235 @@
+"""
+销售期间增量生成彩票池
+
+build-pool在截止销售后才开始排序和计算哈希值，彩票池越大，公布数据指纹就越晚。
+本模块在销售期间随到随处理：每批销售记录整理为标准格式、排序后保存为一个有序段（run），
+并记录该段的彩票数和摘要；段按大小分级，两个同级的段立即合并为上一级，段的个数最多约为log2(批次数)。
+截止销售时只需把剩余的少量有序段归并一遍，同时计算彩票池的哈希值，结果与hash_file_data对输出文件的
+计算结果完全相同。各段的摘要就是该段内容按彩票池规则计算的哈希值，写入段文件时记下其大小和修改时间，
+截止时文件未改动的段不再重新计算摘要，每个字节只哈希一次；只剩一个有序段时，它的摘要就是彩票池的哈希值。
+截止后不再接受新的销售记录，没有任何彩票时拒绝截止。
+
+状态保存在工作目录的manifest.json中，销售系统可以在不同进程中分多次调用：
+
+D:\\>python lottery_model.py ingest sales.d add batch_0001.log batch_0002.log
+D:\\>python lottery_model.py ingest sales.d status
+D:\\>python lottery_model.py ingest sales.d close -o lottery_model.data
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+
+from games import GAMES, normalize_ticket
+from pool_builder import WRITE_LINES, _read_run, _write_batch, _write_run
+
+MANIFEST = 'manifest.json'
+
+
+class PoolIngest(object):
+    """工作目录directory中的增量彩票池，各有序段记录在manifest.json中"""
+
+    def __init__(self, directory, game_name='double_chromosphere', HASH=hashlib.sha256, create=True):
+        """create为False时工作目录必须已经存在，否则抛出FileNotFoundError"""
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST)
+        if not create and not os.path.exists(self.path):
+            raise FileNotFoundError(2, '文件或路径不存在', self.path)
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path, 'rt') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'game': game_name, 'hash': HASH().name, 'batches': 0, 'runs': []}
+        self.game = GAMES[self.manifest['game']]
+        self.HASH = getattr(hashlib, self.manifest['hash'])
+
+    def _save(self):
+        """先写临时文件再替换，中途退出时manifest.json仍是上一次的完整状态"""
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wt') as f:
+            json.dump(self.manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _run_digest(self, lines):
+        h = self.HASH()
+        for i, line in enumerate(lines):
+            h.update((('\n' if i else '') + line).encode())
+        return h.hexdigest()
+
+    def _stamp(self, run):
+        """记下段文件的大小和修改时间，之后用来判断段文件是否被改动"""
+        st = os.stat(os.path.join(self.directory, run['path']))
+        run['size'], run['mtime_ns'] = st.st_size, st.st_mtime_ns
+        return run
+
+    def _unchanged(self, run):
+        """段文件的大小和修改时间与记录的相同时，不必重新计算摘要"""
+        try:
+            st = os.stat(os.path.join(self.directory, run['path']))
+        except FileNotFoundError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (run.get('size'), run.get('mtime_ns'))
+
+    def add(self, lines, source='<batch>'):
+        """加入一批销售记录，整理、排序后保存为一个有序段并合并同级的段，返回该批的彩票数"""
+        if self.manifest.get('closed'):
+            raise ValueError(f'{self.directory}已经截止销售，不能再加入销售记录')
+        tickets = []
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                tickets.append(normalize_ticket(line.strip(), self.game))
+            except ValueError as e:
+                raise ValueError(f'{source} 第{line_no}行: {e}') from None
+        if not tickets:
+            return 0
+        path = _write_run(tickets, self.directory)
+        self.manifest['runs'].append(self._stamp({'path': os.path.basename(path), 'count': len(tickets),
+                                                  'digest': self._run_digest(tickets), 'level': 0}))
+        self.manifest['batches'] += 1
+        self._save()
+        self._compact()
+        return len(tickets)
+
+    def _compact(self):
+        """保存合并结果后才删除旧段，中途退出时不会丢失彩票"""
+        runs = self.manifest['runs']
+        while len(runs) >= 2 and runs[-1]['level'] == runs[-2]['level']:
+            left, right = runs[-2:]
+            runs[-2:] = [self._merge(left, right)]
+            self._save()
+            os.remove(os.path.join(self.directory, left['path']))
+            os.remove(os.path.join(self.directory, right['path']))
+
+    def _merge(self, left, right):
+        """归并两个有序段，归并时核对两段的摘要并计算新段的摘要"""
+        fd, path = tempfile.mkstemp(suffix='.run', dir=self.directory)
+        h = self.HASH()
+        with open(fd, 'wt', newline='\n') as f:
+            for i, line in enumerate(heapq.merge(self._read_checked(left), self._read_checked(right))):
+                f.write(line + '\n')
+                h.update((('\n' if i else '') + line).encode())
+        return self._stamp({'path': os.path.basename(path), 'count': left['count'] + right['count'],
+                            'digest': h.hexdigest(), 'level': left['level'] + 1})
+
+    def _read_checked(self, run, verify=True):
+        """逐行读取有序段，读完时核对彩票数和摘要，段文件被改动时抛出ValueError
+
+        verify为False时只核对彩票数，用于段文件未改动（见_unchanged）的情况。
+        """
+        h = self.HASH() if verify else None
+        count = 0
+        for line in _read_run(os.path.join(self.directory, run['path'])):
+            if h:
+                h.update((('\n' if count else '') + line).encode())
+            count += 1
+            yield line
+        if count != run['count'] or (h and h.hexdigest() != run['digest']):
+            raise ValueError(f'有序段{run["path"]}与记录的彩票数或摘要不一致')
+
+    def status(self):
+        """返回(批次数, 彩票数, 各段摘要)，各段摘要可以在销售期间随时公布"""
+        runs = self.manifest['runs']
+        return self.manifest['batches'], sum(run['count'] for run in runs), [run['digest'] for run in runs]
+
+    def close(self, output):
+        """截止销售，把全部有序段归并为以'\\r'分隔的彩票池文件，返回(彩票数, 彩票池的哈希值)
+
+        截止后manifest.json记录彩票数和哈希值，之后add和close都抛出ValueError。
+        """
+        runs = self.manifest['runs']
+        if self.manifest.get('closed'):
+            raise ValueError(f'{self.directory}已经截止销售，彩票池的哈希值为{self.manifest["hash_sum"]}')
+        if not runs:
+            raise ValueError(f'{self.directory}中没有任何彩票，不能生成空的彩票池')
+        if len(runs) == 1 and self._unchanged(runs[0]):
+            count, hash_sum = self._copy_run(runs[0], output)
+        else:
+            count, hash_sum = self._merge_all(runs, output)
+        self.manifest.update(closed=True, count=count, hash_sum=hash_sum)
+        self._save()
+        return count, hash_sum
+
+    def _copy_run(self, run, output):
+        """只有一个未改动的段时，它的摘要就是彩票池的哈希值，只需把换行符换成'\\r'"""
+        with open(os.path.join(self.directory, run['path']), 'rb') as src, open(output, 'wb') as dst:
+            while True:
+                data = src.read(1 << 20)
+                if not data:
+                    break
+                dst.write(data.replace(b'\n', b'\r'))
+            """去掉最后一行末尾的换行符"""
+            dst.truncate(run['size'] - 1)
+        return run['count'], run['digest']
+
+    def _merge_all(self, runs, output):
+        """归并全部有序段并计算彩票池的哈希值，只对改动过的段重新计算摘要"""
+        h = self.HASH()
+        count = 0
+        with open(output, 'wt', newline='') as f:
+            batch = []
+            for line in heapq.merge(*(self._read_checked(run, not self._unchanged(run)) for run in runs)):
+                batch.append(line)
+                if len(batch) >= WRITE_LINES:
+                    _write_batch(f, h, batch, not count)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                _write_batch(f, h, batch, not count)
+                count += len(batch)
+        return count, h.hexdigest()
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py ingest',
+                                     description='在销售期间增量整理、排序销售记录，截止时立即生成【彩票池】文件和哈希值')
+    parser.add_argument(dest='directory', help='工作目录，保存有序段和manifest.json')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='加入销售记录批次')
+    add.add_argument(dest='batches', nargs='+', help='销售记录批次文件，每行一注彩票')
+    add.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES),
+                     help='彩票玩法，仅在工作目录第一次使用时生效')
+    add.add_argument('--hash', dest='hash', default='sha3_256', choices=('sha256', 'sha3_256'),
+                     help='计算哈希值的算法，仅在工作目录第一次使用时生效')
+
+    commands.add_parser('status', help='显示已加入的批次数、彩票数和各有序段的摘要')
+
+    close = commands.add_parser('close', help='截止销售，生成【彩票池】文件')
+    close.add_argument('-o', dest='output', default='lottery_model.data', help='输出的【彩票池】文件名')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'add':
+            ingest = PoolIngest(args.directory, args.game, getattr(hashlib, args.hash))
+            for path in args.batches:
+                with open(path, 'rt') as f:
+                    print(f'{path}: {ingest.add(f, path)}注')
+        elif args.command == 'status':
+            batches, count, digests = PoolIngest(args.directory, create=False).status()
+            print(f'批次数：{batches}  彩票数：{count}  有序段：{len(digests)}个')
+            for digest in digests:
+                print(digest)
+        else:
+            count, hash_sum = PoolIngest(args.directory, create=False).close(args.output)
+            print('文件名：', args.output)
+            print('彩票数：', count)
+            print('哈希值：', hash_sum)
+            print(f'立即公证和公开该哈希值，并提供{args.output}文件的下载')
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    return 0
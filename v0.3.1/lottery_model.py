@@ -39,43 +39,167 @@ hash('7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'+'1562297
 # !/usr/bin/python3
 # -*- coding: utf-8 -*-
 
+import sys
+
+if __name__ == '__main__' and sys.argv[1:2] == ['verify']:
+    """verify子命令不需要多进程、NumPy等模块，在导入它们之前分派，保持verify.py的冷启动时间"""
+    from verify import cli
+    quit(cli(sys.argv[2:]))
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, nullcontext
 from datetime import datetime
-from scipy.special import comb
 import argparse
 import hashlib
-import itertools
+import importlib
 import heapq
+import os
+import time
+
+from checkpoint import CheckpointMismatch, load_checkpoint, remove_checkpoint, save_checkpoint
+from combinatorics import binomial, rank_combination, unrank_combination
+from distributed import iter_distributed_chunks, parse_address
+from games import GAMES, map_draw
+from nonce_engines import ENGINES, check_engine, scan_nonces
+from pool_file import hash_pool
+from result_cache import ResultCache
+from telemetry import FORMATS, Telemetry
+from transcript import open_transcript, write_segment
+
+"""并行计算时每个任务检查的nonce个数"""
+CHUNK_SIZE = 1 << 16
 
 
 def hash_file_data(filename, HASH=hashlib.sha256):
     """打开文件数据，返回其hash值"""
     with open(filename, 'rt') as f:
         print('文件名：', filename)
-        """读取文件并截除头尾空字符"""
-        lines = str.strip(f.read())
-        hash_sum = HASH(lines.encode()).hexdigest()
+        """逐块读取文件并截除头尾空字符，结果与HASH(str.strip(f.read()).encode())完全相同，
+        但内存占用不随文件增大"""
+        hash_sum = hash_pool(f, HASH)
         print('哈希值：', hash_sum)
         print(f'立即公证和公开该哈希值，并提供{filename}文件的下载')
         return hash_sum
 
 
-def nonce_filter(origin_hash_sum, difficulty, nonce_pool_size, HASH=hashlib.sha256):
-    """找到满足难度要求的nonce值，使hash(origin_hash_sum + nonce)小于difficulty"""
+def iter_nonce_chunks(origin_hash_sum, difficulty, HASH=hashlib.sha256, workers=1,
+                      start=0, chunk_size=CHUNK_SIZE, engine='prefix'):
+    """从start开始把nonce值切分成长度为chunk_size的区间，按nonce顺序逐个产出(start, stop, found)
+
+    workers大于1时，各区间分发到进程池并行计算，但仍然严格按nonce顺序产出，
+    因此调用者看到的结果与串行计算完全相同。engine为nonce_engines中的引擎名称，不影响计算结果。
+    """
+    if workers <= 1:
+        while True:
+            stop = start + chunk_size
+            yield start, stop, scan_nonces(engine, origin_hash_sum, start, stop, difficulty, HASH)
+            start = stop
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            while True:
+                """保持每个进程都有排队的任务，避免等待最慢的区间时CPU空闲"""
+                while len(pending) < workers * 2:
+                    stop = start + chunk_size
+                    future = executor.submit(scan_nonces, engine, origin_hash_sum, start, stop, difficulty, HASH)
+                    pending.append((start, stop, future))
+                    start = stop
+                chunk_start, chunk_stop, future = pending.popleft()
+                yield chunk_start, chunk_stop, future.result()
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+
+
+def _search(origin_hash_sum, difficulty, nonce_pool_size, HASH, workers, engine,
+            checkpoint, resume, checkpoint_interval, transcript, chunk_size, telemetry=None, quiet=False,
+            listen=None):
+    """nonce_filter的搜索过程，返回按nonce顺序找到的满足要求的(hash_sum, nonce)"""
+    """为了方便结果可验证，这里强行要求nonce值为从0开始的自然数"""
+    start = 0
+    found = []
+    if resume and checkpoint and os.path.exists(checkpoint):
+        start, found = load_checkpoint(checkpoint, origin_hash_sum, difficulty, HASH().name)
+        print(f'从断点文件{checkpoint}继续，已检查{start}个nonce值，找到{len(found)}个满足要求的值')
+        for hash_sum, nonce in found[:nonce_pool_size]:
+            print(hash_sum, nonce)
+    elif resume:
+        print(f'断点文件{checkpoint}不存在，从nonce = 0开始计算')
+
+    saved_at = time.monotonic()
+    if listen:
+        chunks = iter_distributed_chunks(origin_hash_sum, difficulty, HASH, listen, start, chunk_size)
+    else:
+        chunks = iter_nonce_chunks(origin_hash_sum, difficulty, HASH, workers, start, chunk_size, engine)
+    record = nullcontext()
+    if transcript:
+        record = open_transcript(transcript, origin_hash_sum, difficulty, HASH, chunk_size, start)
+    """quiet为True时搜索循环中没有任何I/O：不定时保存断点文件，数据段在搜索完成后一次写入记录文件"""
+    segments = []
+    with closing(chunks), record:
+        """先检查是否已经找到足够的nonce值，再取下一个区间，不多计算也不多记录任何区间"""
+        while len(found) < nonce_pool_size:
+            chunk_start, chunk_stop, chunk_found = next(chunks)
+            if not quiet:
+                for hash_sum, nonce in chunk_found[:nonce_pool_size - len(found)]:
+                    print(hash_sum, nonce)
+            if telemetry:
+                telemetry.sample(chunk_stop - chunk_start, len(chunk_found), flush=not quiet)
+            """断点文件要求区间内的结果完整，所以全部保存，最后只取按nonce顺序的前nonce_pool_size个"""
+            found.extend(chunk_found)
+            if transcript and quiet:
+                segments.append((chunk_start, chunk_stop, chunk_found))
+            elif transcript:
+                write_segment(record, chunk_start, chunk_stop, chunk_found, HASH)
+            if checkpoint and not quiet and time.monotonic() - saved_at >= checkpoint_interval:
+                save_checkpoint(checkpoint, origin_hash_sum, difficulty, HASH().name, chunk_stop, found)
+                saved_at = time.monotonic()
+        for segment in segments:
+            write_segment(record, *segment, HASH)
+
+    if checkpoint:
+        remove_checkpoint(checkpoint)
+    return found
+
+
+def nonce_filter(origin_hash_sum, difficulty, nonce_pool_size, HASH=hashlib.sha256, workers=1, engine='prefix',
+                 checkpoint=None, resume=False, checkpoint_interval=60, transcript=None, chunk_size=CHUNK_SIZE,
+                 cache=None, telemetry=None, quiet=False, listen=None):
+    """找到满足难度要求的nonce值，使hash(origin_hash_sum + nonce)小于difficulty
+
+    workers大于1时使用多进程并行搜索，结果与串行搜索完全相同：
+    都是按nonce顺序最先找到的nonce_pool_size个nonce值中，哈希值最小的那一个。
+    checkpoint为断点文件名，搜索进度每隔checkpoint_interval秒写入一次，搜索完成后删除该文件；
+    resume为True时从该文件记录的进度继续搜索，结果与不中断的计算相同，
+    该文件记录的开奖参数与本次计算不同时抛出checkpoint.CheckpointMismatch。
+    transcript为分段搜索记录文件名，每chunk_size个nonce值记录为一段，供验证者任选数据段验证。
+    cache为result_cache.ResultCache，能从缓存得出结果时不再搜索，否则搜索完成后保存到缓存。
+    telemetry为telemetry.Telemetry，记录搜索速度等遥测数据；quiet为True时搜索循环中没有任何I/O：
+    不逐个输出找到的nonce值，不定时保存断点文件，分段搜索记录和遥测数据在搜索完成后写入。
+    listen为(host, port)时作为协调者把各区间分配给连接上来的工作者计算（见distributed.py），忽略workers和engine。
+    """
     start_time = datetime.now().strftime('%X')
     print('')
     print(f'{start_time} 寻找{nonce_pool_size}个满足难度值为{difficulty!r}的Nonce值...')
-    """为了方便结果可验证，这里强行要求nonce值为从0开始的自然数"""
-    nonce = 0
-    nonce_pool = []
-    while len(nonce_pool) < nonce_pool_size:
-        """以下部分仅用于原理演示，实际工作的程序应采用并行计算并作大幅优化"""
-        s = origin_hash_sum + str(nonce)
-        hash_sum = HASH(s.encode()).hexdigest()
-        """difficulty值越小，难度越高，随着难度的增加，找到合适的nonce值的时间呈指数增加"""
-        if hash_sum < difficulty:
-            heapq.heappush(nonce_pool, (hash_sum, nonce))
+    cached = cache.lookup(origin_hash_sum, difficulty, HASH().name, nonce_pool_size) if cache else None
+    if cached is not None:
+        print(f'从缓存{cache.path}得出结果，不再搜索')
+        for hash_sum, nonce in cached[:0 if quiet else nonce_pool_size]:
             print(hash_sum, nonce)
-        nonce += 1
+        found = cached
+    else:
+        with telemetry.stage('search') if telemetry else nullcontext():
+            found = _search(origin_hash_sum, difficulty, nonce_pool_size, HASH, workers, engine,
+                            checkpoint, resume, checkpoint_interval, transcript, chunk_size, telemetry, quiet,
+                            listen)
+        if cache:
+            cache.store(origin_hash_sum, difficulty, HASH().name, nonce_pool_size, found)
+
+    nonce_pool = []
+    for hash_sum, nonce in found[:nonce_pool_size]:
+        heapq.heappush(nonce_pool, (hash_sum, nonce))
     print('')
     end_time = datetime.now().strftime('%X')
     print(f'{end_time} 找到最小的哈希值对应的Nonce = {nonce_pool[0][1]}, 使:')
@@ -86,69 +210,64 @@ def nonce_filter(origin_hash_sum, difficulty, nonce_pool_size, HASH=hashlib.sha2
 
 
 def map_luck_number(hash_sum, balls, total_selected):
-    """把传入的hash_sum映射到开奖号码"""
+    """把传入的hash_sum映射到一个区的开奖号码，与games.map_draw对单个区的计算相同"""
 
-    comb_count = comb(len(balls), total_selected, exact=True)
+    comb_count = binomial(len(balls), total_selected)
     selected_balls = int(hash_sum, 16) % comb_count
 
-    luck_number = "null"
-    for n, comb_balls in zip(range(comb_count), itertools.combinations(balls, total_selected)):
-        if n == selected_balls:
-            """此时对应的comb_balls组合，即是开奖号码"""
-            luck_number = ' '.join(comb_balls)
-            break
+    """按itertools.combinations的枚举顺序，直接计算序号为selected_balls的组合，即是开奖号码"""
+    comb_balls = unrank_combination(selected_balls, len(balls), total_selected)
+    luck_number = ' '.join(balls[i] for i in comb_balls)
     return luck_number
 
 
-def the_double_chromosphere(nonce, origin_hash_sum, HASH=hashlib.sha256):
-    """福利彩票的双色球为玩法为33个红球中选6个，16个篮球中选一个"""
-    RED_BALLS = ('01', '02', '03', '04', '05', '06', '07', '08', '09', '10',
-                 '11', '12', '13', '14', '15', '16', '17', '18', '19', '20',
-                 '21', '22', '23', '24', '25', '26', '27', '28', '29', '30',
-                 '31', '32', '33')
-    BLUE_BALLS = ('01', '02', '03', '04', '05', '06', '07', '08', '09', '10',
-                  '11', '12', '13', '14', '15', '16')
+def rank_luck_number(luck_number, balls):
+    """map_luck_number的逆运算，返回号码组合（例如'09 17 21 25 26 30'）在所有组合中的序号"""
+    positions = sorted(balls.index(ball) for ball in luck_number.split())
+    return rank_combination(positions, len(balls))
+
+
+def draw_numbers(nonce, origin_hash_sum, game, HASH=hashlib.sha256):
+    """利用nonce值和彩票池的哈希值计算games中玩法game的开奖号码，不输出任何内容"""
+    return draw_games(nonce, origin_hash_sum, [game], HASH)[game.name]
 
-    red_balls_selected = 6
-    blue_balls_selected = 1
 
+def draw_games(nonce, origin_hash_sum, games=None, HASH=hashlib.sha256):
+    """只计算一次哈希值，按各玩法的derive规则得到每种玩法的开奖号码，games默认为全部玩法
+
+    返回玩法名称到开奖号码的字典。
+    """
     s = str(nonce) + origin_hash_sum
     hash_sum = HASH(s.encode()).hexdigest()
+    return {game.name: map_draw(hash_sum, game) for game in (games or GAMES.values())}
+
 
-    luck_number = map_luck_number(hash_sum, balls=RED_BALLS, total_selected=red_balls_selected)
-    luck_number2 = map_luck_number(hash_sum, balls=BLUE_BALLS, total_selected=blue_balls_selected)
+def the_double_chromosphere(nonce, origin_hash_sum, HASH=hashlib.sha256):
+    """福利彩票的双色球为玩法为33个红球中选6个，16个篮球中选一个"""
+    result = draw_numbers(nonce, origin_hash_sum, GAMES['double_chromosphere'], HASH)
 
     print('')
     print(f'开奖结果为：')
-    print(luck_number + '|' + luck_number2)
+    print(result)
+    return result
 
 
 def super_lotto(nonce, origin_hash_sum, HASH=hashlib.sha256):
     """体彩超级大乐透，玩法为前区35选5，后区12选2"""
-    front_zone =('01', '02', '03', '04', '05', '06', '07', '08', '09', '10',
-                 '11', '12', '13', '14', '15', '16', '17', '18', '19', '20',
-                 '21', '22', '23', '24', '25', '26', '27', '28', '29', '30',
-                 '31', '32', '33', '34', '35')
-
-    back_zone = ('01', '02', '03', '04', '05', '06', '07', '08', '09', '10',
-                 '11', '12')
-
-    front_zone_selected = 5
-    back_zone_selected = 2
-
-    s = str(nonce) + origin_hash_sum
-    hash_sum = HASH(s.encode()).hexdigest()
-
-    luck_number = map_luck_number(hash_sum, balls=front_zone, total_selected=front_zone_selected)
-    luck_number2 = map_luck_number(hash_sum, balls=back_zone, total_selected=back_zone_selected)
+    result = draw_numbers(nonce, origin_hash_sum, GAMES['super_lotto'], HASH)
 
     print('')
     print(f'开奖结果为：')
-    print(luck_number + '|' + luck_number2)
+    print(result)
+    return result
 
 
-def main(file_name, DIFFICULTY:str, n:int):
-    sha256 = hashlib.sha3_256
+def main(file_name, DIFFICULTY:str, n:int, workers:int=1, engine:str='prefix',
+         checkpoint:str=None, resume:bool=False, transcript:str=None, cache:str=None,
+         metrics:str=None, metrics_format:str='jsonl', quiet:bool=False, listen:str=None,
+         games:list=('double_chromosphere',), hash_name:str='sha3_256'):
+    sha256 = getattr(hashlib, hash_name)
+    telemetry = Telemetry(metrics, metrics_format) if metrics else None
 
     try:
         """STEP 1
@@ -156,33 +275,68 @@ def main(file_name, DIFFICULTY:str, n:int):
         彩票池数据是以'\r'分隔的彩票号码，以双色球为例，
         '01 04 15 17 27 30|11'表示6个红球和一个篮球。
         """
-        file_hash_sum = hash_file_data(file_name, HASH=sha256)
+        with telemetry.stage('fingerprint') if telemetry else nullcontext():
+            file_hash_sum = hash_file_data(file_name, HASH=sha256)
 
         """STEP 2
         计算满足难度要求的Nonce值，用于计算开奖号码
         """
-        _, nonce = nonce_filter(file_hash_sum, difficulty=DIFFICULTY,
-                                nonce_pool_size=n, HASH=sha256)
+        with ResultCache(cache) if cache else nullcontext() as result_cache:
+            _, nonce = nonce_filter(file_hash_sum, difficulty=DIFFICULTY,
+                                    nonce_pool_size=n, HASH=sha256, workers=workers, engine=engine,
+                                    checkpoint=checkpoint, resume=resume, transcript=transcript,
+                                    cache=result_cache, telemetry=telemetry, quiet=quiet,
+                                    listen=parse_address(listen) if listen else None)
 
         """STEP 3
         利用nonce值和彩票池的哈希值origin_hash_sum作为输入，计算开奖号码。
         """
 
-        """福彩双色球"""
-        the_double_chromosphere(nonce, file_hash_sum, HASH=sha256)
-
-        """体彩超级大乐透"""
-        # super_lotto(nonce, file_hash_sum, HASH=sha256)
+        with telemetry.stage('mapping') if telemetry else nullcontext():
+            results = draw_games(nonce, file_hash_sum, [GAMES[name] for name in games], HASH=sha256)
+            print('')
+            print(f'开奖结果为：')
+            for name, result in results.items():
+                print(result if len(results) == 1 else f'{GAMES[name].title or name}：{result}')
 
     except FileNotFoundError:
         print(f'[错误 2] 文件或路径不存在: {file_name}')
         quit(2)
+    except CheckpointMismatch as e:
+        print(f'[错误 1] 开奖参数与断点文件不一致: {e}，请使用相同的参数或删除该断点文件')
+        quit(1)
     except Exception as e:
         print(f'[错误 -1] 未知错误{e}')
         quit(-1)
 
 
+"""子命令及实现子命令的模块，子命令之后的参数由该模块的cli函数解析"""
+COMMANDS = {
+    'verify-segments': 'transcript',
+    'build-pool': 'pool_builder',
+    'convert-pool': 'pool_binary',
+    'settle': 'settlement',
+    'merkle': 'merkle',
+    'ingest': 'ingest',
+    'calibrate': 'calibrate',
+    'verify-batch': 'verify_batch',
+    'serve': 'draw_service',
+    'worker': 'distributed',
+    'delay': 'hash_chain',
+    'validate-pool': 'pool_validator',
+    'pool-stats': 'pool_stats',
+    'pool-index': 'pool_index',
+    'fairness': 'fairness',
+    'draw': 'draw_batch',
+    'verify': 'verify',
+}
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        command = importlib.import_module(COMMANDS[sys.argv[1]])
+        quit(command.cli(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(description='根据【彩票池】原始数据计算开奖号码')
     parser.add_argument(dest='filename', nargs='?',
                         default='lottery_model.data',
@@ -196,9 +350,68 @@ if __name__ == '__main__':
                         default=10,
                         help='表示找到n个满足difficulty条件的值')
 
-    args = parser.parse_args()
+    parser.add_argument('-w', dest='workers',
+                        default=os.cpu_count(),
+                        help='并行计算的进程数，默认使用全部CPU核心，结果与单进程计算相同')
+
+    parser.add_argument('-e', dest='engine',
+                        default='prefix', choices=sorted(ENGINES),
+                        help='nonce搜索引擎，不影响计算结果，simple为原理演示用的原始算法，'
+                             'numpy只支持sha256且比prefix慢，用于交叉验证')
+
+    parser.add_argument('--hash', dest='hash',
+                        default='sha3_256', choices=('sha256', 'sha3_256'),
+                        help='哈希算法，是开奖算法的核心参数，默认为sha3_256')
+
+    parser.add_argument('--checkpoint', dest='checkpoint',
+                        default=None,
+                        help='断点文件名，指定后每分钟保存一次搜索进度，搜索完成后删除')
 
-    main(args.filename, args.difficulty, int(args.size))
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        help='从断点文件记录的进度继续计算，结果与不中断的计算相同，'
+                             '没有指定--checkpoint时断点文件名为【彩票池】文件名加上.checkpoint')
+
+    parser.add_argument('--transcript', dest='transcript',
+                        default=None,
+                        help='输出分段搜索记录的文件名，可用 verify-segments 子命令任选数据段验证')
+
+    parser.add_argument('--cache', dest='cache',
+                        default=None,
+                        help='开奖结果缓存的SQLite数据库文件名，相同或可以推出结果的参数不再重新搜索')
+
+    parser.add_argument('--metrics', dest='metrics',
+                        default=None,
+                        help='遥测数据文件名，记录哈希速度、满足要求的比例和各阶段耗时')
+
+    parser.add_argument('--metrics-format', dest='metrics_format',
+                        default='jsonl', choices=FORMATS,
+                        help='遥测数据格式，jsonl每个快照追加一行，prometheus每次覆盖为最新的数值')
+
+    parser.add_argument('-q', dest='quiet', action='store_true',
+                        help='搜索循环中没有任何I/O：不逐个输出找到的nonce值，不定时保存断点文件，'
+                             '分段搜索记录和遥测数据在搜索完成后写入')
+
+    parser.add_argument('--listen', dest='listen',
+                        default=None,
+                        help="作为协调者监听 'host:port'，由 worker 子命令启动的工作者计算，结果与单机计算相同")
+
+    parser.add_argument('-g', dest='games',
+                        action='append', choices=sorted(GAMES) + ['all'], default=None,
+                        help="彩票玩法，可以重复使用，'all'为games.json中的全部玩法，默认为双色球")
+
+    args = parser.parse_args()
+    games = args.games or ['double_chromosphere']
+    try:
+        check_engine(args.engine, args.hash)
+    except ValueError as e:
+        parser.error(str(e))
+
+    """断点文件需要用--checkpoint开启，只使用--resume时从默认的断点文件继续"""
+    checkpoint = args.checkpoint or (args.filename + '.checkpoint' if args.resume else None)
+    main(args.filename, args.difficulty, int(args.size), int(args.workers), args.engine,
+         checkpoint, args.resume, args.transcript, args.cache,
+         args.metrics, args.metrics_format, args.quiet, args.listen,
+         list(GAMES) if 'all' in games else list(dict.fromkeys(games)), args.hash)
 
 
 
@@ -0,0 +1,245 @@
+"""
+彩票池的Merkle树承诺与包含证明
+
+hash_file_data把整个彩票池承诺为一个哈希值，购彩者要确认自己的彩票在彩票池中，只能下载并重新计算整个文件。
+本模块在彩票池各行之上构建Merkle树，与原有哈希值一起公证和公开树根。之后任何一注彩票都可以生成
+只有log2(n)个哈希值的包含证明，购彩者用几KB的数据和几十次哈希计算即可核对自己的彩票。
+
+叶子节点为HASH(b'\\x00' + 行)，内部节点为HASH(b'\\x01' + 左 + 右)，前缀区分两类节点，
+防止把内部节点伪装成彩票。某一层节点数为奇数时，最后一个节点原样升到上一层。
+叶子节点在进程池中并行计算，整棵树按层依次保存在树文件中，生成证明时只需读取路径上的节点。
+
+使用示例：
+
+D:\\>python lottery_model.py merkle build lottery_model.data
+D:\\>python lottery_model.py merkle prove lottery_model.data "01 04 15 17 27 30|11 45147094" -o proof.json
+D:\\>python lottery_model.py merkle verify proof.json -r 3c5e...9a7d
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+
+from pool_file import iter_pool_lines
+
+MAGIC = b'LOTMERK1'
+HEADER_SIZE = 4096
+
+"""并行计算叶子节点时每个任务的行数"""
+LEAF_BATCH = 1 << 16
+
+"""计算内部节点时每次读取的节点数，必须为偶数"""
+NODE_BATCH = 1 << 16
+
+
+def leaf_hash(line, HASH=hashlib.sha256):
+    return HASH(b'\x00' + line.encode()).digest()
+
+
+def node_hash(left, right, HASH=hashlib.sha256):
+    return HASH(b'\x01' + left + right).digest()
+
+
+def hash_leaves(lines, HASH=hashlib.sha256):
+    """计算一批叶子节点，返回连接在一起的摘要"""
+    return b''.join(leaf_hash(line, HASH) for line in lines)
+
+
+def level_sizes(count):
+    """各层的节点数，从叶子节点到树根"""
+    sizes = [count] if count else []
+    while sizes and sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+def _iter_line_batches(path):
+    with open(path, 'rt') as f:
+        batch = []
+        for line in iter_pool_lines(f):
+            batch.append(line)
+            if len(batch) >= LEAF_BATCH:
+                yield batch
+                batch = []
+        if batch and batch != ['']:
+            yield batch
+
+
+def _iter_leaf_blocks(path, HASH, workers):
+    """按行的顺序产出各批叶子节点，workers大于1时在进程池中并行计算"""
+    if workers <= 1:
+        for batch in _iter_line_batches(path):
+            yield hash_leaves(batch, HASH)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in _iter_line_batches(path):
+            pending.append(executor.submit(hash_leaves, batch, HASH))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _write_header(f, header):
+    f.seek(0)
+    f.write((MAGIC + json.dumps(header).encode()).ljust(HEADER_SIZE, b' '))
+
+
+def read_header(tree_path):
+    with open(tree_path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{tree_path}不是Merkle树文件')
+    return json.loads(data[len(MAGIC):].decode())
+
+
+def build_tree(pool_path, tree_path, HASH=hashlib.sha256, workers=1):
+    """为彩票池文件构建Merkle树并保存到tree_path，返回文件头，其中root为树根
+
+    内存中只保留一批叶子节点或NODE_BATCH个内部节点，彩票池再大也不需要一次读入内存。
+    """
+    size = HASH().digest_size
+    header = {'hash': HASH().name, 'count': 0, 'root': HASH(b'').hexdigest()}
+    with open(tree_path, 'w+b') as f:
+        _write_header(f, header)
+        for block in _iter_leaf_blocks(pool_path, HASH, workers):
+            f.write(block)
+            header['count'] += len(block) // size
+
+        read_at = HEADER_SIZE
+        for count in level_sizes(header['count'])[:-1]:
+            write_at = read_at + count * size
+            for i in range(0, count, NODE_BATCH):
+                f.seek(read_at + i * size)
+                data = f.read(min(NODE_BATCH, count - i) * size)
+                nodes = [data[j:j + size] for j in range(0, len(data), size)]
+                parents = [node_hash(nodes[j], nodes[j + 1], HASH) if j + 1 < len(nodes) else nodes[j]
+                           for j in range(0, len(nodes), 2)]
+                f.seek(write_at + i // 2 * size)
+                f.write(b''.join(parents))
+            read_at = write_at
+
+        if header['count']:
+            f.seek(read_at)
+            header['root'] = f.read(size).hex()
+        _write_header(f, header)
+    return header
+
+
+def make_proof(tree_path, index, line):
+    """生成第index行（从0开始）彩票line的包含证明，证明中的path为从叶子到树根路径上的兄弟节点"""
+    header = read_header(tree_path)
+    HASH = getattr(hashlib, header['hash'])
+    size = HASH().digest_size
+    if not 0 <= index < header['count']:
+        raise ValueError(f'行号{index}超出范围[0, {header["count"]})')
+    path = []
+    offset = HEADER_SIZE
+    with open(tree_path, 'rb') as f:
+        f.seek(offset + index * size)
+        if f.read(size) != leaf_hash(line, HASH):
+            raise ValueError(f'第{index}行与彩票{line!r}不一致')
+        position = index
+        for count in level_sizes(header['count'])[:-1]:
+            if position ^ 1 < count:
+                f.seek(offset + (position ^ 1) * size)
+                path.append(f.read(size).hex())
+            offset += count * size
+            position >>= 1
+    return {'hash': header['hash'], 'count': header['count'], 'index': index,
+            'ticket': line, 'path': path, 'root': header['root']}
+
+
+def verify_proof(proof, root=None):
+    """核对包含证明，root为公开的树根，省略时使用证明中的树根"""
+    HASH = getattr(hashlib, proof['hash'])
+    node = leaf_hash(proof['ticket'], HASH)
+    path = [bytes.fromhex(x) for x in proof['path']]
+    position = proof['index']
+    if not 0 <= position < proof['count']:
+        return False
+    for count in level_sizes(proof['count'])[:-1]:
+        if position ^ 1 < count:
+            if not path:
+                return False
+            sibling = path.pop(0)
+            node = node_hash(sibling, node, HASH) if position & 1 else node_hash(node, sibling, HASH)
+        position >>= 1
+    return not path and node.hex() == (root or proof['root'])
+
+
+def find_ticket(pool_path, ticket):
+    """在彩票池中查找彩票，ticket为整行或票号，返回(行号, 整行)，找不到时返回None"""
+    with open(pool_path, 'rt') as f:
+        for index, line in enumerate(iter_pool_lines(f)):
+            if line == ticket or line.rsplit(' ', 1)[-1] == ticket and '|' not in ticket:
+                return index, line
+    return None
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py merkle',
+                                     description='构建【彩票池】的Merkle树，生成和核对单注彩票的包含证明')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='构建Merkle树，输出树根')
+    build.add_argument(dest='pool', help='【彩票池】文件')
+    build.add_argument('-o', dest='tree', default=None, help='Merkle树文件名，默认为【彩票池】文件名加上.merkle')
+    build.add_argument('-w', dest='workers', type=int, default=os.cpu_count(),
+                       help='并行计算叶子节点的进程数，默认使用全部CPU核心')
+    build.add_argument('--hash', dest='hash', default='sha3_256', choices=('sha256', 'sha3_256'),
+                       help='哈希算法')
+
+    prove = commands.add_parser('prove', help='生成一注彩票的包含证明')
+    prove.add_argument(dest='pool', help='【彩票池】文件')
+    prove.add_argument(dest='ticket', help='彩票的整行内容或票号')
+    prove.add_argument('-t', dest='tree', default=None, help='Merkle树文件名，默认为【彩票池】文件名加上.merkle')
+    prove.add_argument('-o', dest='output', default=None, help='证明文件名，默认输出到屏幕')
+
+    verify = commands.add_parser('verify', help='核对包含证明')
+    verify.add_argument(dest='proof', help='证明文件')
+    verify.add_argument('-r', dest='root', default=None, help='公开的树根，省略时只核对证明本身是否自洽')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'build':
+            header = build_tree(args.pool, args.tree or args.pool + '.merkle', getattr(hashlib, args.hash),
+                                args.workers)
+            print('彩票数：', header['count'])
+            print('树根：', header['root'])
+            print('立即公证和公开该树根，并提供Merkle树文件用于生成包含证明')
+        elif args.command == 'prove':
+            found = find_ticket(args.pool, args.ticket)
+            if found is None:
+                print(f'[错误 1] 彩票池中没有彩票: {args.ticket!r}')
+                return 1
+            proof = json.dumps(make_proof(args.tree or args.pool + '.merkle', *found), indent=1)
+            if args.output:
+                with open(args.output, 'wt') as f:
+                    f.write(proof + '\n')
+            else:
+                print(proof)
+        else:
+            with open(args.proof, 'rt') as f:
+                proof = json.load(f)
+            if not verify_proof(proof, args.root):
+                print(f'[失败] 彩票{proof["ticket"]!r}的包含证明不成立')
+                return 1
+            if args.root is None:
+                print(f'证明自洽，请核对树根{proof["root"]}与公开的树根是否相同')
+            print(f'彩票{proof["ticket"]!r}在彩票池第{proof["index"] + 1}行，包含证明成立')
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    return 0
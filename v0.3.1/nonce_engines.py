@@ -0,0 +1,144 @@
+"""
+nonce搜索引擎
+
+每个引擎都是一个函数 engine(origin_hash_sum, start, stop, difficulty, HASH)，
+按nonce顺序检查[start, stop)区间，返回所有满足 hash(origin_hash_sum + str(nonce)) < difficulty
+的(hash_sum, nonce)。不同引擎的结果完全相同，只是速度不同，tests/test_nonce_engines.py逐个比对各引擎的结果。
+
+单独运行本文件可以比较各引擎在本机上的计算速度：
+
+D:\\>python nonce_engines.py
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import time
+
+HEX_DIGITS = '0123456789abcdef'
+
+"""prefix引擎每批生成的nonce字节串个数"""
+BATCH_SIZE = 4096
+
+"""只支持部分哈希算法的引擎，其它引擎支持hashlib中的所有算法"""
+ENGINE_HASHES = {'numpy': ('sha256',)}
+
+
+def difficulty_target(difficulty, digest_size=32):
+    """把difficulty字符串换算为整数上界target
+
+    对于十六进制小写的哈希值hash_sum，hash_sum < difficulty 当且仅当 int(hash_sum, 16) < target。
+    difficulty按字符串比较，所以其中的非小写十六进制字符（例如'0000000F'中的'F'）也要按ASCII顺序换算。
+    """
+    width = digest_size * 2
+    target = 0
+    for i, c in enumerate(difficulty[:width]):
+        below = sum(1 for d in HEX_DIGITS if d < c)
+        target += below * 16 ** (width - 1 - i)
+        if c not in HEX_DIGITS:
+            """哈希值不可能出现这个字符，后面的字符不再影响比较结果"""
+            return target
+    if len(difficulty) > width:
+        """哈希值等于difficulty的前缀时，较短的哈希值更小"""
+        target += 1
+    return target
+
+
+def scan_simple(origin_hash_sum, start, stop, difficulty, HASH=hashlib.sha256):
+    """原理演示用的引擎：每个nonce都重新拼接字符串、计算哈希并比较十六进制字符串"""
+    found = []
+    for nonce in range(start, stop):
+        s = origin_hash_sum + str(nonce)
+        hash_sum = HASH(s.encode()).hexdigest()
+        """difficulty值越小，难度越高，随着难度的增加，找到合适的nonce值的时间呈指数增加"""
+        if hash_sum < difficulty:
+            found.append((hash_sum, nonce))
+    return found
+
+
+def scan_prefix(origin_hash_sum, start, stop, difficulty, HASH=hashlib.sha256):
+    """预先计算前缀的引擎
+
+    origin_hash_sum只哈希一次，每个nonce复制该哈希状态后再追加nonce；
+    nonce字节串按批生成，哈希结果直接以字节串与预先换算好的target比较。
+    """
+    prefix = HASH(origin_hash_sum.encode())
+    digest_size = prefix.digest_size
+    target = difficulty_target(difficulty, digest_size)
+    if target <= 0:
+        return []
+
+    found = []
+    copy = prefix.copy
+    if target >= 1 << (8 * digest_size):
+        """所有哈希值都满足要求"""
+        target_bytes = None
+    else:
+        target_bytes = target.to_bytes(digest_size, 'big')
+
+    for batch_start in range(start, stop, BATCH_SIZE):
+        batch = range(batch_start, min(batch_start + BATCH_SIZE, stop))
+        nonce_bytes = ' '.join(map(str, batch)).encode().split()
+        for nonce, b in zip(batch, nonce_bytes):
+            h = copy()
+            h.update(b)
+            digest = h.digest()
+            """等长的字节串按大端整数比较"""
+            if target_bytes is None or digest < target_bytes:
+                found.append((digest.hex(), nonce))
+    return found
+
+
+def scan_numpy(origin_hash_sum, start, stop, difficulty, HASH=hashlib.sha256):
+    """NumPy批量计算SHA-256的引擎，只支持sha256，需要安装NumPy，使用时才导入
+
+    在CPython上比prefix引擎慢（hashlib本身是C实现），主要用作与hashlib相互独立的SHA-256实现。
+    """
+    import sha256_numpy
+    return sha256_numpy.scan_numpy(origin_hash_sum, start, stop, difficulty, HASH)
+
+
+ENGINES = {
+    'simple': scan_simple,
+    'prefix': scan_prefix,
+    'numpy': scan_numpy,
+}
+
+
+def check_engine(engine, hash_name):
+    """engine不支持哈希算法hash_name时抛出ValueError，用于在开始搜索之前报告参数错误"""
+    if hash_name not in ENGINE_HASHES.get(engine, (hash_name,)):
+        raise ValueError(f'{engine}引擎只支持{"、".join(ENGINE_HASHES[engine])}，不支持{hash_name}')
+
+
+def scan_nonces(engine, origin_hash_sum, start, stop, difficulty, HASH=hashlib.sha256):
+    """使用名为engine的引擎检查[start, stop)区间，可以直接提交给进程池"""
+    return ENGINES[engine](origin_hash_sum, start, stop, difficulty, HASH)
+
+
+def measure_hash_rate(engine, HASH=hashlib.sha256, seconds=2.0, chunk_size=1 << 14):
+    """在本机上持续运行engine约seconds秒，返回每秒计算的哈希次数"""
+    origin_hash_sum = HASH(b'lottery_model').hexdigest()
+    scan = ENGINES[engine]
+    start = 0
+    begin = time.perf_counter()
+    while True:
+        """使用几乎不可能满足的难度值，只测量计算速度"""
+        scan(origin_hash_sum, start, start + chunk_size, '000000000000001', HASH)
+        start += chunk_size
+        elapsed = time.perf_counter() - begin
+        if elapsed >= seconds:
+            return start / elapsed
+
+
+if __name__ == '__main__':
+    for hash_name in ('sha256', 'sha3_256'):
+        HASH = getattr(hashlib, hash_name)
+        baseline = None
+        for name in ENGINES:
+            if name == 'numpy' and hash_name != 'sha256':
+                continue
+            rate = measure_hash_rate(name, HASH)
+            baseline = baseline or rate
+            print(f'{hash_name:<10} {name:<8} {rate:>14,.0f} 次/秒  x{rate / baseline:.2f}')
@@ -0,0 +1,203 @@
+"""
+二进制彩票池文件
+
+文本格式的每注彩票约占30字节，每次使用都要重新解析。二进制格式的每注彩票是一条定长记录：
+前区号码组合的序号、后区号码组合的序号和票号，保存为可以直接内存映射的NumPy结构化数组。
+序号即combinatorics.rank_combination的结果，与games.map_draw使用相同的组合顺序。
+
+文件开头是HEADER_SIZE字节的文件头：MAGIC之后为JSON格式的玩法、票号位数、彩票数和彩票池哈希值，
+其后紧接着全部记录。彩票池的哈希值仍然按文本格式定义，与文本格式互相转换时逐行核对，
+保证转换无损，转换回的文本与原文件的hash_file_data结果完全相同。
+
+使用示例：
+
+D:\\>python lottery_model.py convert-pool lottery_model.data lottery_model.pool
+D:\\>python lottery_model.py convert-pool lottery_model.pool lottery_model.txt
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from combinatorics import rank_combinations, unrank_combinations
+from games import GAMES, format_ticket, parse_ticket
+from pool_file import iter_pool_lines
+
+MAGIC = b'LOTPOOL1'
+HEADER_SIZE = 4096
+
+RECORD_DTYPE = np.dtype([('front', '<u4'), ('back', '<u2'), ('id', '<u8')])
+
+"""每次转换的彩票数"""
+BATCH_LINES = 1 << 18
+
+
+def open_binary_pool(path):
+    """打开二进制彩票池文件，返回(文件头, 内存映射的记录数组)"""
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{path}不是二进制彩票池文件')
+    header = json.loads(data[len(MAGIC):].decode())
+    if header['count'] == 0:
+        return header, np.zeros(0, dtype=RECORD_DTYPE)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(header['count'],))
+    return header, records
+
+
+def is_binary_pool(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _write_header(f, header):
+    data = MAGIC + json.dumps(header).encode()
+    f.seek(0)
+    f.write(data.ljust(HEADER_SIZE, b' '))
+
+
+def _encode_batch(lines, game):
+    """把一批标准格式的彩票转换为记录，转换不能还原为原文时抛出ValueError"""
+    fronts, backs, ids = [], [], []
+    for line in lines:
+        front, back, ticket_id = parse_ticket(line, game)
+        fronts.append([x - 1 for x in front])
+        backs.append([x - 1 for x in back])
+        ids.append(ticket_id)
+    records = np.empty(len(lines), dtype=RECORD_DTYPE)
+    records['front'] = rank_combinations(np.array(fronts).reshape(len(lines), game.front_selected),
+                                         len(game.front_balls))
+    records['back'] = rank_combinations(np.array(backs).reshape(len(lines), game.back_selected),
+                                        len(game.back_balls))
+    records['id'] = [int(ticket_id) if ticket_id is not None else 0 for ticket_id in ids]
+    return records, ids
+
+
+def _decode_batch(records, game, header):
+    fronts = unrank_combinations(records['front'].astype(np.int64), len(game.front_balls), game.front_selected)
+    backs = unrank_combinations(records['back'].astype(np.int64), len(game.back_balls), game.back_selected)
+    lines = []
+    for front, back, value in zip(fronts.tolist(), backs.tolist(), records['id'].tolist()):
+        ticket_id = str(value).zfill(header['id_width']) if header['has_ids'] else None
+        lines.append(format_ticket([x + 1 for x in front], [x + 1 for x in back], ticket_id, game))
+    return lines
+
+
+def text_to_binary(text_path, binary_path, game_name='double_chromosphere', HASH=hashlib.sha256):
+    """把文本格式的彩票池转换为二进制格式，返回文件头
+
+    每行必须是标准格式；要么都有票号，要么都没有；票号位数都相同，或者都不以0开头。
+    否则无法无损还原，抛出ValueError。
+    """
+    game = GAMES[game_name]
+    header = {'game': game_name, 'has_ids': False, 'id_width': 0, 'count': 0,
+              'hash': HASH().name, 'hash_sum': None}
+    id_lengths = set()
+    h = HASH()
+    try:
+        _text_to_binary(text_path, binary_path, game, header, id_lengths, h)
+    except ValueError:
+        """无法无损转换时不保留不完整的二进制文件"""
+        os.remove(binary_path)
+        raise
+    return header
+
+
+def _text_to_binary(text_path, binary_path, game, header, id_lengths, h):
+    with open(text_path, 'rt') as src, open(binary_path, 'wb') as dst:
+        _write_header(dst, header)
+        batch = []
+        for line in iter_pool_lines(src):
+            batch.append(line)
+            if len(batch) >= BATCH_LINES:
+                _convert_batch(batch, game, header, id_lengths, dst, h)
+                batch = []
+        if batch and batch != ['']:
+            _convert_batch(batch, game, header, id_lengths, dst, h)
+
+        if len(id_lengths) > 1 and header['id_width']:
+            raise ValueError('票号位数不一致且有以0开头的票号，无法无损转换')
+        if len(id_lengths) == 1:
+            """位数都相同的票号按固定位数补0还原"""
+            header['id_width'] = id_lengths.pop()
+        header['hash_sum'] = h.hexdigest()
+        _write_header(dst, header)
+
+
+def _convert_batch(lines, game, header, id_lengths, dst, h):
+    records, ids = _encode_batch(lines, game)
+    if not header['count']:
+        header['has_ids'] = ids[0] is not None
+    decoded = _decode_batch(records, game, {'has_ids': False, 'id_width': 0})
+    for line, ticket_id, back in zip(lines, ids, decoded):
+        if (ticket_id is not None) != header['has_ids']:
+            raise ValueError(f'部分彩票没有票号，无法无损转换: {line!r}')
+        if ticket_id is not None:
+            if len(ticket_id) > 19:
+                raise ValueError(f'票号超过19位，无法无损转换: {line!r}')
+            id_lengths.add(len(ticket_id))
+            if len(ticket_id) > 1 and ticket_id[0] == '0':
+                """出现以0开头的票号时，只能按固定位数还原"""
+                header['id_width'] = len(ticket_id)
+            back += ' ' + ticket_id
+        if line != back:
+            raise ValueError(f'不是标准格式，无法无损转换: {line!r}，应为{back!r}')
+    h.update((('\n' if header['count'] else '') + '\n'.join(lines)).encode())
+    header['count'] += len(lines)
+    dst.write(records.tobytes())
+
+
+def iter_binary_lines(binary_path):
+    """按文本格式逐行产出二进制彩票池中的彩票"""
+    header, records = open_binary_pool(binary_path)
+    game = GAMES[header['game']]
+    for start in range(0, len(records), BATCH_LINES):
+        yield from _decode_batch(np.asarray(records[start:start + BATCH_LINES]), game, header)
+
+
+def binary_to_text(binary_path, text_path):
+    """把二进制彩票池转换回以'\\r'分隔的文本格式，返回转换结果的哈希值，应与文件头中的哈希值相同"""
+    header, _ = open_binary_pool(binary_path)
+    h = getattr(hashlib, header['hash'])()
+    with open(text_path, 'wt', newline='') as f:
+        for i, line in enumerate(iter_binary_lines(binary_path)):
+            f.write(('\r' if i else '') + line)
+            h.update((('\n' if i else '') + line).encode())
+    return h.hexdigest()
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py convert-pool',
+                                     description='在文本格式和二进制格式的【彩票池】文件之间无损转换')
+    parser.add_argument(dest='source', help='源文件，根据文件内容自动判断格式')
+    parser.add_argument(dest='target', help='目标文件')
+    parser.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES),
+                        help='彩票玩法，仅在转换为二进制格式时使用')
+    parser.add_argument('--hash', dest='hash', default='sha3_256', choices=('sha256', 'sha3_256'),
+                        help='计算彩票池哈希值的算法，仅在转换为二进制格式时使用')
+    args = parser.parse_args(argv)
+
+    try:
+        if is_binary_pool(args.source):
+            header, _ = open_binary_pool(args.source)
+            hash_sum = binary_to_text(args.source, args.target)
+            if hash_sum != header['hash_sum']:
+                print(f'[错误 1] 转换结果的哈希值{hash_sum}与文件头中的{header["hash_sum"]}不一致')
+                return 1
+        else:
+            header = text_to_binary(args.source, args.target, args.game, getattr(hashlib, args.hash))
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    print(f'彩票数：{header["count"]}  玩法：{header["game"]}')
+    print(f'哈希值：{header["hash_sum"]}')
+    return 0
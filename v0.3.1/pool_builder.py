@@ -0,0 +1,155 @@
+"""
+生成彩票池（Step1）
+
+把销售系统输出的未排序分片文件整理成标准格式、排序并合并为彩票池文件。分片可以大于内存：
+各分片在进程池中并行读取，每run_lines行排序后写入一个临时文件，最后多路归并为彩票池文件，
+归并的同时计算彩票池的哈希值，合并完成即可立即公证和公开，结果与hash_file_data完全相同。
+
+使用示例：
+
+D:\\>python lottery_model.py build-pool sales_01.log sales_02.log -o lottery_model.data
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import heapq
+import os
+import tempfile
+
+from games import GAMES, normalize_ticket
+
+"""每个临时文件中排序的行数，决定了排序时占用的内存"""
+RUN_LINES = 1_000_000
+
+"""一次最多同时归并的临时文件个数，超过时分多轮归并"""
+MAX_FAN_IN = 256
+
+"""归并时每次写入的行数"""
+WRITE_LINES = 10_000
+
+
+def _write_run(lines, temp_dir):
+    lines.sort()
+    fd, path = tempfile.mkstemp(suffix='.run', dir=temp_dir)
+    with open(fd, 'wt', newline='\n') as f:
+        for line in lines:
+            f.write(line + '\n')
+    return path
+
+
+def _read_run(path):
+    with open(path, 'rt', newline='\n') as f:
+        for line in f:
+            yield line[:-1]
+
+
+def sort_shard(path, game_name, temp_dir, run_lines=RUN_LINES):
+    """读取一个分片，逐行整理为标准格式，每run_lines行排序后写入一个临时文件，返回(临时文件列表, 行数)"""
+    game = GAMES[game_name]
+    runs = []
+    lines = []
+    count = 0
+    with open(path, 'rt') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                lines.append(normalize_ticket(line.strip(), game))
+            except ValueError as e:
+                raise ValueError(f'{path} 第{line_no}行: {e}') from None
+            count += 1
+            if len(lines) >= run_lines:
+                runs.append(_write_run(lines, temp_dir))
+                lines = []
+    if lines:
+        runs.append(_write_run(lines, temp_dir))
+    return runs, count
+
+
+def _merge_to_run(runs, temp_dir):
+    fd, path = tempfile.mkstemp(suffix='.run', dir=temp_dir)
+    with open(fd, 'wt', newline='\n') as f:
+        for line in heapq.merge(*(_read_run(run) for run in runs)):
+            f.write(line + '\n')
+    for run in runs:
+        os.remove(run)
+    return path
+
+
+def _write_batch(f, h, batch, first):
+    f.write(('' if first else '\r') + '\r'.join(batch))
+    h.update((('' if first else '\n') + '\n'.join(batch)).encode())
+
+
+def merge_runs(runs, output, HASH=hashlib.sha256, temp_dir=None):
+    """多路归并已排序的临时文件，写出以'\\r'分隔的彩票池文件，返回彩票池的哈希值
+
+    彩票池文件按文本方式读取时'\\r'被转换为'\\n'，所以哈希值按'\\n'分隔的内容计算，
+    与hash_file_data(output)的结果相同。
+    """
+    while len(runs) > MAX_FAN_IN:
+        runs = [_merge_to_run(runs[i:i + MAX_FAN_IN], temp_dir) for i in range(0, len(runs), MAX_FAN_IN)]
+
+    h = HASH()
+    with open(output, 'wt', newline='') as f:
+        batch = []
+        first = True
+        for line in heapq.merge(*(_read_run(run) for run in runs)):
+            batch.append(line)
+            if len(batch) >= WRITE_LINES:
+                _write_batch(f, h, batch, first)
+                batch = []
+                first = False
+        if batch:
+            _write_batch(f, h, batch, first)
+    return h.hexdigest()
+
+
+def build_pool(shards, output, game_name='double_chromosphere', HASH=hashlib.sha256, workers=1,
+               run_lines=RUN_LINES, temp_dir=None):
+    """把未排序的分片文件合并为彩票池文件output，返回(彩票数, 彩票池的哈希值)"""
+    with tempfile.TemporaryDirectory(dir=temp_dir or os.path.dirname(os.path.abspath(output))) as run_dir:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(sort_shard, shards, [game_name] * len(shards),
+                                        [run_dir] * len(shards), [run_lines] * len(shards)))
+        runs = [run for shard_runs, _ in results for run in shard_runs]
+        count = sum(count for _, count in results)
+        hash_sum = merge_runs(runs, output, HASH, run_dir)
+    return count, hash_sum
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py build-pool',
+                                     description='把未排序的销售记录分片整理、排序并合并为【彩票池】文件')
+    parser.add_argument(dest='shards', nargs='+', help='销售记录分片文件，每行一注彩票')
+    parser.add_argument('-o', dest='output', default='lottery_model.data', help='输出的【彩票池】文件名')
+    parser.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES),
+                        help='彩票玩法')
+    parser.add_argument('-w', dest='workers', type=int, default=os.cpu_count(),
+                        help='并行排序的进程数，默认使用全部CPU核心')
+    parser.add_argument('--run-lines', dest='run_lines', type=int, default=RUN_LINES,
+                        help='每个临时文件排序的行数，决定排序占用的内存')
+    parser.add_argument('--hash', dest='hash', default='sha3_256', choices=('sha256', 'sha3_256'),
+                        help='计算彩票池哈希值的算法')
+    parser.add_argument('--temp-dir', dest='temp_dir', default=None,
+                        help='存放临时文件的目录，默认与输出文件相同')
+    args = parser.parse_args(argv)
+
+    try:
+        count, hash_sum = build_pool(args.shards, args.output, args.game, getattr(hashlib, args.hash),
+                                     args.workers, args.run_lines, args.temp_dir)
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    print('文件名：', args.output)
+    print('彩票数：', count)
+    print('哈希值：', hash_sum)
+    print(f'立即公证和公开该哈希值，并提供{args.output}文件的下载')
+    return 0
@@ -0,0 +1,61 @@
+"""
+彩票池文件的读取
+
+彩票池文件以'\r'分隔彩票号码，按文本方式打开时各种换行符都被转换为'\n'。
+彩票池的数据指纹定义为 HASH(str.strip(f.read()).encode())，本模块提供与之完全一致、
+但只占用固定内存的逐块读取方式，文件再大也不需要一次读入内存。
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+"""每次读取的字符数"""
+CHUNK_CHARS = 1 << 20
+
+
+def iter_stripped_text(f, chunk_size=CHUNK_CHARS):
+    """逐块读取文本文件f，依次产出的字符串连接起来等于str.strip(f.read())
+
+    开头的空白字符直接丢弃；每块末尾的空白字符暂存起来，直到后面出现非空白字符时才产出，
+    文件结束时仍未产出的空白字符就是需要截除的末尾空白字符。
+    内存中只保留一个块和一段连续的空白字符。
+    """
+    pending = ''
+    started = False
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        body = chunk.rstrip()
+        if body:
+            if pending:
+                yield pending
+            yield body
+            pending = chunk[len(body):]
+        else:
+            pending += chunk
+
+
+def iter_pool_lines(f, chunk_size=CHUNK_CHARS):
+    """逐行产出彩票池的内容，即str.strip(f.read()).split('\\n')中的各行，不含换行符"""
+    rest = ''
+    for text in iter_stripped_text(f, chunk_size):
+        lines = (rest + text).split('\n')
+        rest = lines.pop()
+        yield from lines
+    yield rest
+
+
+def hash_pool(f, HASH=hashlib.sha256, chunk_size=CHUNK_CHARS):
+    """计算已按文本方式打开的彩票池文件f的数据指纹，即HASH(str.strip(f.read()).encode()).hexdigest()"""
+    h = HASH()
+    for text in iter_stripped_text(f, chunk_size):
+        h.update(text.encode())
+    return h.hexdigest()
@@ -0,0 +1,387 @@
+"""
+彩票池索引
+
+查询某个票号或某注号码是否在彩票池中，原本需要从头到尾扫描彩票池文件。索引文件（默认为彩票池文件名加上.idx）
+为每个彩票池建立一次，包含两组按键排序的数组：票号 -> 该行在彩票池文件中的字节偏移，
+号码组合的序号（games.ticket_ranks） -> 字节偏移。数组直接保存在文件中，打开索引时内存映射，
+查询只需在数组上searchsorted再读取对应的行，单个查询为微秒级；大批量查询整批向量化searchsorted。
+
+索引文件开头是HEADER_SIZE字节的文件头：MAGIC之后为JSON格式的玩法、已建立索引的彩票池字节数和这部分内容的SHA-256，
+其后依次为各个数组。彩票池只在末尾追加了新行时（已建立索引的部分没有变化），只解析新增的行并合并到原有的数组中。
+
+票号按数值排序，不超过19位的票号直接保存数值，更长的（或含有非数字字符的）票号保存其SHA-256的前8字节；
+票号的位数单独保存，'0012'和'12'是不同的票号。查询结果都会读取对应的行再次核对。
+
+使用示例：
+
+D:\\>python lottery_model.py pool-index build lottery_model.data
+D:\\>python lottery_model.py pool-index lookup lottery_model.data --id 45147094
+D:\\>python lottery_model.py pool-index lookup lottery_model.data --ticket "05 12 15 16 25 26|07"
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from games import GAMES, parse_ticket, parse_tickets, ticket_rank, ticket_ranks
+from pool_binary import is_binary_pool
+
+MAGIC = b'LOTIDX01'
+HEADER_SIZE = 4096
+
+"""每次读取和解析的字节数"""
+BLOCK_BYTES = 16 << 20
+
+"""超过该位数的票号无法用uint64表示，改为保存其哈希值"""
+MAX_ID_DIGITS = 19
+
+LINE_BREAK = re.compile(r'\r\n|\r|\n')
+
+"""各个数组在文件中的顺序和类型"""
+ARRAYS = (('id_keys', '<u8', 'ids'), ('id_offsets', '<u8', 'ids'), ('id_widths', 'u1', 'ids'),
+          ('ranks', '<i8', 'tickets'), ('rank_offsets', '<u8', 'tickets'))
+
+
+def id_key(ticket_id):
+    """单个票号的(键, 位数)"""
+    if len(ticket_id) <= MAX_ID_DIGITS and ticket_id.isascii() and ticket_id.isdigit():
+        return int(ticket_id), len(ticket_id)
+    return int.from_bytes(hashlib.sha256(ticket_id.encode()).digest()[:8], 'little'), min(len(ticket_id), 255)
+
+
+def id_keys(ids):
+    """把票号字符串转换为(键, 位数)两个数组"""
+    ids = np.array(ids, dtype=str)
+    widths = np.char.str_len(ids)
+    short = (widths <= MAX_ID_DIGITS) & np.char.isdigit(ids)
+    keys = np.zeros(len(ids), dtype=np.uint64)
+    keys[short] = ids[short].astype(np.uint64)
+    for i in np.flatnonzero(~short).tolist():
+        keys[i] = id_key(str(ids[i]))[0]
+    return keys, np.minimum(widths, 255).astype(np.uint8)
+
+
+def _layout(header):
+    """各个数组在索引文件中的(名称, 类型, 字节偏移, 长度)，每个数组的起点按8字节对齐"""
+    offset = HEADER_SIZE
+    layout = []
+    for name, dtype, count in ARRAYS:
+        layout.append((name, dtype, offset, header[count]))
+        offset += -(-np.dtype(dtype).itemsize * header[count] // 8) * 8
+    return layout
+
+
+def read_index(path):
+    """读取索引文件，返回(文件头, 各数组的字典)，数组为内存映射"""
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{path}不是彩票池索引文件')
+    header = json.loads(data[len(MAGIC):].decode())
+    arrays = {}
+    for name, dtype, offset, count in _layout(header):
+        """np.asarray去掉memmap子类，逐个访问元素更快，数据仍然是内存映射的"""
+        arrays[name] = np.asarray(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))) \
+            if count else np.zeros(0, dtype=dtype)
+    return header, arrays
+
+
+def _write_index(path, header, arrays):
+    """写入临时文件后替换原文件，写入过程中中断不会损坏原有的索引"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write((MAGIC + json.dumps(header).encode()).ljust(HEADER_SIZE, b' '))
+        for name, dtype, offset, count in _layout(header):
+            f.seek(offset)
+            f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        f.truncate(_layout(header)[-1][2] + np.dtype(ARRAYS[-1][1]).itemsize * header['tickets'])
+    os.replace(tmp, path)
+
+
+def _parse_block(data, base, game):
+    """解析一段完整的行，base为data在彩票池文件中的字节偏移，返回(组合序号, 票号, 各行的字节偏移)"""
+    array = np.frombuffer(data, dtype=np.uint8)
+    following = np.append(array[1:], 0)
+    """'\\r\\n'、'\\r'和'\\n'都是行尾，每个行尾之后是下一行的开头"""
+    ends = np.flatnonzero((array == ord('\n')) | (array == ord('\r')) & (following != ord('\n'))) + 1
+    starts = np.concatenate([[0], ends])
+    try:
+        lines = LINE_BREAK.split(data.decode('ascii'))
+    except UnicodeDecodeError:
+        raise ValueError(f'彩票池中字节偏移{base}之后有非ASCII字符')
+    keep = [i for i, line in enumerate(lines) if line and not line.isspace()]
+    lines = [lines[i] for i in keep]
+    offsets = starts[keep].astype(np.uint64) + np.uint64(base)
+    if not lines:
+        return np.zeros(0, dtype=np.int64), [], offsets
+
+    front, back, ids = parse_tickets(lines, game)
+    front = np.sort(front, axis=1)
+    back = np.sort(back, axis=1)
+    valid = (np.diff(front, axis=1) > 0).all(axis=1) & (np.diff(back, axis=1) > 0).all(axis=1)
+    if not valid.all():
+        i = int(np.argmin(valid))
+        raise ValueError(f'彩票池字节偏移{int(offsets[i])}处的彩票同一区内有重复号码: {lines[i]!r}')
+    return ticket_ranks(front, back, game), ids, offsets
+
+
+def _scan(f, start, hashed, h, game):
+    """从字节偏移start开始解析彩票池到文件末尾，同时把hashed之后的内容加入哈希值h
+
+    返回(组合序号, 组合的偏移, 票号键, 票号位数, 票号的偏移, 最后一行的偏移)，各数组按键排序。
+    """
+    ranks, rank_offsets, ids, id_offsets = [], [], [], []
+    f.seek(start)
+    position = start
+    base = start
+    carry = b''
+    last_line = start
+    while True:
+        block = f.read(BLOCK_BYTES)
+        h.update(block[max(hashed - position, 0):])
+        position += len(block)
+        data = carry + block
+        if block:
+            """只解析到最后一个行尾，剩余部分留给下一块"""
+            cut = max(data.rfind(b'\r'), data.rfind(b'\n'))
+            if cut < 0:
+                carry = data
+                continue
+            data, carry = data[:cut], data[cut:]
+        block_ranks, block_ids, offsets = _parse_block(data, base, game)
+        base += len(data)
+        if len(offsets):
+            last_line = int(offsets[-1])
+        ranks.append(block_ranks)
+        rank_offsets.append(offsets)
+        has_id = [i for i, x in enumerate(block_ids) if x is not None]
+        ids.extend(block_ids[i] for i in has_id)
+        id_offsets.append(offsets[has_id])
+        if not block:
+            break
+
+    ranks = np.concatenate(ranks)
+    rank_offsets = np.concatenate(rank_offsets)
+    keys, widths = id_keys(ids)
+    id_offsets = np.concatenate(id_offsets)
+    """偏移是递增的，稳定排序后键相同的各行仍按偏移排列"""
+    order = np.argsort(ranks, kind='stable')
+    id_order = np.argsort(keys, kind='stable')
+    return ranks[order], rank_offsets[order], keys[id_order], widths[id_order], id_offsets[id_order], last_line
+
+
+def _merge(old_keys, new_keys, old_columns, new_columns):
+    """合并两组按键排序的数组，键相同时old在前，返回合并后的键和各列"""
+    positions = np.searchsorted(old_keys, new_keys, side='right') + np.arange(len(new_keys))
+    is_old = np.ones(len(old_keys) + len(new_keys), dtype=bool)
+    is_old[positions] = False
+    merged = []
+    for old, new in zip([old_keys] + old_columns, [new_keys] + new_columns):
+        column = np.empty(len(is_old), dtype=new.dtype)
+        column[is_old] = old
+        column[positions] = new
+        merged.append(column)
+    return merged
+
+
+def _digest_prefix(f, size):
+    """彩票池文件前size字节的SHA-256对象"""
+    h = hashlib.sha256()
+    f.seek(0)
+    remaining = size
+    while remaining > 0:
+        block = f.read(min(BLOCK_BYTES, remaining))
+        if not block:
+            break
+        h.update(block)
+        remaining -= len(block)
+    return h
+
+
+def build_index(pool_path, index_path=None, game_name='double_chromosphere', rebuild=False):
+    """建立或更新彩票池的索引，返回(文件头, 更新方式)，更新方式为'full'、'incremental'或'current'"""
+    index_path = index_path or pool_path + '.idx'
+    if is_binary_pool(pool_path):
+        raise ValueError(f'{pool_path}是二进制彩票池，可以按记录序号直接定位，不需要建立索引')
+    game = GAMES[game_name]
+    size = os.path.getsize(pool_path)
+    old = None
+    if not rebuild and os.path.exists(index_path):
+        try:
+            old = read_index(index_path)
+        except ValueError:
+            old = None
+        if old and (old[0]['game'] != game_name or old[0]['pool_size'] > size):
+            old = None
+
+    with open(pool_path, 'rb') as f:
+        if old:
+            old_header, old_arrays = old
+            h = _digest_prefix(f, old_header['pool_size'])
+            if h.hexdigest() != old_header['pool_digest']:
+                old = None
+            elif old_header['pool_size'] == size:
+                return old_header, 'current'
+
+        if old:
+            """最后一行可能没有行尾，追加的内容可能接在这一行之后，因此从最后一行重新解析"""
+            start, hashed = old_header['last_line'], old_header['pool_size']
+        else:
+            start, hashed, h = 0, 0, hashlib.sha256()
+        ranks, rank_offsets, keys, widths, id_offsets, last_line = _scan(f, start, hashed, h, game)
+
+    if old:
+        keep = np.asarray(old_arrays['rank_offsets']) < start
+        ranks, rank_offsets = _merge(np.asarray(old_arrays['ranks'])[keep], ranks,
+                                     [np.asarray(old_arrays['rank_offsets'])[keep]], [rank_offsets])
+        keep = np.asarray(old_arrays['id_offsets']) < start
+        keys, id_offsets, widths = _merge(np.asarray(old_arrays['id_keys'])[keep], keys,
+                                          [np.asarray(old_arrays['id_offsets'])[keep],
+                                           np.asarray(old_arrays['id_widths'])[keep]], [id_offsets, widths])
+        del old_arrays
+
+    header = {'game': game_name, 'pool_size': size, 'pool_digest': h.hexdigest(), 'last_line': last_line,
+              'ids': len(keys), 'tickets': len(ranks)}
+    _write_index(index_path, header, {'id_keys': keys, 'id_offsets': id_offsets, 'id_widths': widths,
+                                      'ranks': ranks, 'rank_offsets': rank_offsets})
+    return header, 'incremental' if old else 'full'
+
+
+def _expand(left, right):
+    """把每个查询的[left, right)区间展开，返回(查询序号, 数组下标)"""
+    counts = right - left
+    queries = np.repeat(np.arange(len(left)), counts)
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(left, counts)
+    return queries, positions
+
+
+class PoolIndex(object):
+    """打开彩票池和它的索引，彩票池的大小与建立索引时不同时抛出ValueError"""
+
+    def __init__(self, pool_path, index_path=None):
+        self.header, self.arrays = read_index(index_path or pool_path + '.idx')
+        if os.path.getsize(pool_path) != self.header['pool_size']:
+            raise ValueError(f'{pool_path}在建立索引之后有变化，请先运行 pool-index build 更新索引')
+        self.game = GAMES[self.header['game']]
+        self.pool = open(pool_path, 'rb')
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_line(self, offset):
+        """读取字节偏移offset处的一行"""
+        self.pool.seek(offset)
+        data = b''
+        while True:
+            block = self.pool.read(256)
+            data += block
+            end = min((i for i in (data.find(b'\r'), data.find(b'\n')) if i >= 0), default=-1)
+            if end >= 0:
+                return data[:end].decode()
+            if not block:
+                return data.decode().rstrip()
+
+    def offsets_for_ids(self, ids):
+        """批量查询票号，返回(查询序号, 字节偏移)两个数组，同一票号可能有多行"""
+        keys, widths = id_keys(ids)
+        left = np.searchsorted(self.arrays['id_keys'], keys, side='left')
+        right = np.searchsorted(self.arrays['id_keys'], keys, side='right')
+        queries, positions = _expand(left, right)
+        match = self.arrays['id_widths'][positions] == widths[queries]
+        return queries[match], self.arrays['id_offsets'][positions[match]]
+
+    def offsets_for_ranks(self, ranks):
+        """批量查询号码组合的序号，返回(查询序号, 字节偏移)两个数组"""
+        ranks = np.asarray(ranks, dtype=np.int64)
+        left = np.searchsorted(self.arrays['ranks'], ranks, side='left')
+        right = np.searchsorted(self.arrays['ranks'], ranks, side='right')
+        queries, positions = _expand(left, right)
+        return queries, self.arrays['rank_offsets'][positions]
+
+    def find_id(self, ticket_id):
+        """返回票号为ticket_id的各行"""
+        key, width = id_key(ticket_id)
+        keys = self.arrays['id_keys']
+        left = int(np.searchsorted(keys, np.uint64(key), side='left'))
+        right = int(np.searchsorted(keys, np.uint64(key), side='right'))
+        lines = [self.read_line(int(self.arrays['id_offsets'][i])) for i in range(left, right)
+                 if self.arrays['id_widths'][i] == width]
+        """超过MAX_ID_DIGITS位的票号保存的是哈希值，读取原文核对"""
+        return [line for line in lines if parse_ticket(line, self.game)[2] == ticket_id]
+
+    def find_ticket(self, ticket):
+        """返回与ticket号码相同的各行（忽略票号和号码顺序）"""
+        front, back, _ = parse_ticket(ticket, self.game)
+        if len(set(front)) != len(front) or len(set(back)) != len(back):
+            return []
+        rank = ticket_rank(sorted(front), sorted(back), self.game)
+        left = int(np.searchsorted(self.arrays['ranks'], rank, side='left'))
+        right = int(np.searchsorted(self.arrays['ranks'], rank, side='right'))
+        return [self.read_line(int(offset)) for offset in self.arrays['rank_offsets'][left:right]]
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py pool-index',
+                                     description='为【彩票池】建立按票号和按号码组合查询的索引')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='建立索引，彩票池只追加了新行时增量更新')
+    build.add_argument(dest='pool', help='【彩票池】文件')
+    build.add_argument('-o', dest='index', default=None, help='索引文件名，默认为【彩票池】文件名加上.idx')
+    build.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES), help='彩票玩法')
+    build.add_argument('--rebuild', dest='rebuild', action='store_true', help='忽略原有的索引，重新建立')
+
+    lookup = commands.add_parser('lookup', help='按票号或号码查询彩票')
+    lookup.add_argument(dest='pool', help='【彩票池】文件')
+    lookup.add_argument('-i', dest='index', default=None, help='索引文件名，默认为【彩票池】文件名加上.idx')
+    lookup.add_argument('--id', dest='ids', action='append', default=[], help='票号，可以重复使用')
+    lookup.add_argument('--ticket', dest='tickets', action='append', default=[],
+                        help="号码，例如 '05 12 15 16 25 26|07'，可以重复使用")
+    lookup.add_argument('--ids-file', dest='ids_file', default=None, help='批量查询的票号文件，每行一个票号')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'build':
+            header, mode = build_index(args.pool, args.index, args.game, args.rebuild)
+            print({'full': '已建立索引', 'incremental': '已增量更新索引', 'current': '索引已是最新'}[mode] +
+                  f'：{header["tickets"]}注彩票，其中{header["ids"]}注有票号')
+            return 0
+
+        with PoolIndex(args.pool, args.index) as index:
+            for ticket_id in args.ids:
+                lines = index.find_id(ticket_id)
+                print(f'票号{ticket_id}：' + ('、'.join(lines) if lines else '不在彩票池中'))
+            for ticket in args.tickets:
+                lines = index.find_ticket(ticket)
+                print(f'号码{ticket}：' + ('、'.join(lines) if lines else '不在彩票池中'))
+            if args.ids_file:
+                with open(args.ids_file, 'rt') as f:
+                    ids = [line.strip() for line in f if line.strip()]
+                queries, offsets = index.offsets_for_ids(ids)
+                found = np.zeros(len(ids), dtype=bool)
+                for query, offset in zip(queries.tolist(), offsets.tolist()):
+                    line = index.read_line(offset)
+                    if parse_ticket(line, index.game)[2] == ids[query]:
+                        found[query] = True
+                        print(f'{ids[query]}\t{line}')
+                print(f'共查询{len(ids)}个票号，{int(found.sum())}个在彩票池中')
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    return 0
@@ -0,0 +1,302 @@
+"""
+彩票池统计分析
+
+一次顺序读取彩票池，逐批向量化统计：
+- 前区、后区每个号码被选中的次数；
+- 重复的号码组合：每注彩票的前区和后区组合序号合成一个整体序号，在长度为全部组合数的计数数组中累加，
+  计数数组的大小只取决于玩法（双色球约1772万个组合，占用71MB），与彩票池大小无关；
+  全部组合数超过MAX_DENSE_COMBINATIONS的玩法不使用计数数组，整体序号按同样的方式分桶写入临时文件，
+  最后逐个临时文件排序计数，内存占用为彩票池中组合序号的1/buckets；
+- 每个组合的赔付风险：开出某个组合时一等奖的注数就是该组合的计数，给出计数最多的组合和计数的分布；
+- 重复的票号：票号按哈希值分到若干个临时文件中，每个临时文件只包含全部票号的一部分，
+  最后逐个临时文件排序找出重复的票号，内存占用为全部票号的1/buckets。
+
+文本格式和二进制格式（convert-pool）的彩票池都可以分析。
+
+使用示例：
+
+D:\\>python lottery_model.py pool-stats lottery_model.data --top 10 --json stats.json
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from combinatorics import binomial, unrank_combinations
+from games import GAMES, format_ticket, parse_tickets, ticket_from_rank, ticket_ranks
+from pool_binary import is_binary_pool, open_binary_pool
+from pool_file import iter_pool_lines
+from pool_index import MAX_ID_DIGITS, id_keys
+
+"""每批分析的彩票数"""
+BATCH_LINES = 1 << 18
+
+"""全部组合数不超过该值时使用计数数组（uint32，最多占用128MB），否则分桶计数"""
+MAX_DENSE_COMBINATIONS = 1 << 25
+
+"""临时文件中每条票号记录：票号的数值、票号位数、整体组合序号和行号"""
+ID_DTYPE = np.dtype([('id', '<u8'), ('width', 'u1'), ('combo', '<i8'), ('line', '<u8')])
+
+_POWERS_OF_10 = np.array([10 ** i for i in range(1, 20)], dtype=np.uint64)
+
+
+def _id_records(ids, combos, first_line):
+    """把一批文本票号转换为ID_DTYPE记录，没有票号的彩票不产生记录"""
+    keep = [i for i, x in enumerate(ids) if x is not None]
+    records = np.empty(len(keep), dtype=ID_DTYPE)
+    records['id'], records['width'] = id_keys([ids[i] for i in keep])
+    records['combo'] = combos[keep]
+    records['line'] = first_line + np.array(keep, dtype=np.uint64) + 1
+    return records
+
+
+def _iter_batches(path, game_name):
+    """逐批产出(前区号码数组, 后区号码数组, 票号记录)，返回值的票号记录可能为空"""
+    game = GAMES[game_name]
+    if is_binary_pool(path):
+        header, records = open_binary_pool(path)
+        game = GAMES[header['game']]
+        for start in range(0, len(records), BATCH_LINES):
+            batch = np.asarray(records[start:start + BATCH_LINES])
+            front = unrank_combinations(batch['front'].astype(np.int64), len(game.front_balls), game.front_selected)
+            back = unrank_combinations(batch['back'].astype(np.int64), len(game.back_balls), game.back_selected)
+            ids = None
+            if header['has_ids']:
+                ids = np.empty(len(batch), dtype=ID_DTYPE)
+                ids['id'] = batch['id']
+                ids['width'] = header['id_width'] or \
+                    np.searchsorted(_POWERS_OF_10, batch['id'], side='right') + 1
+                ids['line'] = np.arange(start + 1, start + len(batch) + 1, dtype=np.uint64)
+            yield game, front + 1, back + 1, ids
+        return
+
+    with open(path, 'rt') as f:
+        batch = []
+        line_no = 0
+        for line in iter_pool_lines(f):
+            batch.append(line)
+            if len(batch) >= BATCH_LINES:
+                yield (game,) + _parse_batch(batch, game, line_no)
+                line_no += len(batch)
+                batch = []
+        if batch and batch != ['']:
+            yield (game,) + _parse_batch(batch, game, line_no)
+
+
+def _parse_batch(lines, game, first_line):
+    front, back, ids = parse_tickets(lines, game)
+    ids = ids if any(x is not None for x in ids) else None
+    return front, back, (ids, first_line)
+
+
+def _write_buckets(bucket_files, records, bucket):
+    """把records按bucket中的桶号分别追加到各个临时文件"""
+    order = np.argsort(bucket, kind='stable')
+    bounds = np.searchsorted(bucket[order], np.arange(len(bucket_files) + 1))
+    for i, f in enumerate(bucket_files):
+        if bounds[i + 1] > bounds[i]:
+            f.write(records[order[bounds[i]:bounds[i + 1]]].tobytes())
+
+
+def analyze_pool(path, game_name='double_chromosphere', top=10, buckets=64, temp_dir=None,
+                 max_dense=MAX_DENSE_COMBINATIONS):
+    """统计分析彩票池文件，返回可以直接输出为JSON的统计结果
+
+    全部组合数超过max_dense时分桶计数，结果与使用计数数组完全相同。
+    """
+    game = combinations = counts = None
+    with tempfile.TemporaryDirectory(dir=temp_dir) as bucket_dir:
+        bucket_files = [open(os.path.join(bucket_dir, f'{i}.ids'), 'wb') for i in range(buckets)]
+        combo_files = []
+        try:
+            for game, front, back, ids in _iter_batches(path, game_name):
+                if combinations is None:
+                    front_balls, back_balls = len(game.front_balls), len(game.back_balls)
+                    combinations = binomial(front_balls, game.front_selected) * \
+                        binomial(back_balls, game.back_selected)
+                    if combinations <= max_dense:
+                        counts = np.zeros(combinations, dtype=np.uint32)
+                    else:
+                        combo_files = [open(os.path.join(bucket_dir, f'{i}.combos'), 'wb') for i in range(buckets)]
+                    front_frequency = np.zeros(front_balls + 1, dtype=np.int64)
+                    back_frequency = np.zeros(back_balls + 1, dtype=np.int64)
+                    lines = invalid = 0
+
+                front_frequency += np.bincount(front.ravel(), minlength=front_balls + 1)
+                back_frequency += np.bincount(back.ravel(), minlength=back_balls + 1)
+
+                """号码按升序排列后才能计算组合序号，同一区内有重复号码的彩票不计入组合统计"""
+                front = np.sort(front, axis=1)
+                back = np.sort(back, axis=1)
+                valid = (np.diff(front, axis=1) > 0).all(axis=1) & (np.diff(back, axis=1) > 0).all(axis=1)
+                invalid += int((~valid).sum())
+                combos = np.full(len(front), -1, dtype=np.int64)
+                combos[valid] = ticket_ranks(front[valid], back[valid], game)
+                if counts is not None:
+                    keys, key_counts = np.unique(combos[valid], return_counts=True)
+                    counts[keys] += key_counts.astype(np.uint32)
+                else:
+                    _write_buckets(combo_files, combos[valid], combos[valid] % buckets)
+
+                if isinstance(ids, tuple):
+                    ids = _id_records(ids[0], combos, ids[1]) if ids[0] is not None else None
+                elif ids is not None:
+                    ids['combo'] = combos
+                if ids is not None and len(ids):
+                    """按票号的哈希值分桶，相同的票号一定在同一个桶中"""
+                    bucket = (ids['id'] * np.uint64(0x9E3779B97F4A7C15) + ids['width']) % np.uint64(buckets)
+                    _write_buckets(bucket_files, ids, bucket)
+                lines += len(front)
+        finally:
+            for f in bucket_files + combo_files:
+                f.close()
+
+        if combinations is None:
+            return {'lines': 0}
+        if counts is not None:
+            keys = np.flatnonzero(counts)
+            combo_counts = _count_combinations([(keys, counts[keys])], top)
+        else:
+            combo_counts = _count_combinations(_iter_bucket_counts(bucket_dir, buckets), top)
+        duplicate_ids = _find_duplicate_ids(bucket_dir, buckets, top, game)
+
+    return _report(game, lines, invalid, front_frequency, back_frequency, combinations, combo_counts,
+                   duplicate_ids)
+
+
+def _iter_bucket_counts(bucket_dir, buckets):
+    """逐个临时文件产出(组合序号, 注数)，同一组合序号一定在同一个临时文件中"""
+    for i in range(buckets):
+        combos = np.fromfile(os.path.join(bucket_dir, f'{i}.combos'), dtype=np.int64)
+        if len(combos):
+            yield np.unique(combos, return_counts=True)
+
+
+def _count_combinations(groups, top):
+    """汇总各组(组合序号, 注数)，每组内的组合序号互不相同，只统计注数大于0的组合"""
+    multiplicity = np.zeros(1, dtype=np.int64)
+    covered = duplicated = extra = max_count = 0
+    best = []
+    for keys, key_counts in groups:
+        key_counts = key_counts.astype(np.int64)
+        found = np.bincount(key_counts)
+        if len(found) > len(multiplicity):
+            found[:len(multiplicity)] += multiplicity
+            multiplicity = found
+        else:
+            multiplicity[:len(found)] += found
+        covered += len(keys)
+        duplicated += int((key_counts > 1).sum())
+        extra += int((key_counts[key_counts > 1] - 1).sum())
+        max_count = max(max_count, int(key_counts.max(initial=0)))
+        """注数相同时序号大的在前，与对计数数组做稳定排序再反转的顺序相同"""
+        order = np.lexsort((keys, key_counts))[::-1][:top]
+        best += zip(key_counts[order].tolist(), keys[order].tolist())
+    best = sorted(best, reverse=True)[:top]
+    return {'covered': covered, 'duplicated': duplicated, 'extra': extra, 'max': max_count,
+            'multiplicity': multiplicity, 'top': [(key, count) for count, key in best]}
+
+
+def _ticket(combo, game):
+    return format_ticket(*ticket_from_rank(combo, game), None, game)
+
+
+def _find_duplicate_ids(bucket_dir, buckets, top, game):
+    count = 0
+    tickets = 0
+    conflicts = 0
+    examples = []
+    for i in range(buckets):
+        records = np.fromfile(os.path.join(bucket_dir, f'{i}.ids'), dtype=ID_DTYPE)
+        if not len(records):
+            continue
+        records = records[np.lexsort((records['line'], records['width'], records['id']))]
+        same = (records['id'][1:] == records['id'][:-1]) & (records['width'][1:] == records['width'][:-1])
+        starts = np.flatnonzero(np.concatenate([[True], ~same]))
+        sizes = np.diff(np.append(starts, len(records)))
+        for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+            group = records[start:start + size]
+            count += 1
+            tickets += size
+            """同一票号对应不同的号码组合，比重复购买同一注彩票更可疑"""
+            if len(np.unique(group['combo'])) > 1:
+                conflicts += 1
+            if len(examples) < top:
+                value, width = int(group['id'][0]), int(group['width'][0])
+                examples.append({'id': str(value).zfill(width) if width <= MAX_ID_DIGITS else f'#{value:x}',
+                                 'lines': group['line'].tolist(),
+                                 'tickets': [_ticket(int(c), game) if c >= 0 else None for c in group['combo']]})
+    return {'ids': count, 'tickets': tickets, 'conflicting_ids': conflicts, 'examples': examples}
+
+
+def _report(game, lines, invalid, front_frequency, back_frequency, combinations, combo_counts, duplicate_ids):
+    multiplicity = combo_counts['multiplicity']
+    return {
+        'game': game.name,
+        'lines': lines,
+        'invalid': invalid,
+        'front_frequency': dict(zip(game.front_balls, front_frequency[1:].tolist())),
+        'back_frequency': dict(zip(game.back_balls, back_frequency[1:].tolist())),
+        'duplicate_combinations': {'combinations': combo_counts['duplicated'],
+                                   'extra_tickets': combo_counts['extra']},
+        'liability': {
+            'combinations': combinations,
+            'covered': combo_counts['covered'],
+            'expected_jackpot_winners': (lines - invalid) / combinations,
+            'max_jackpot_winners': combo_counts['max'],
+            'multiplicity': {str(k): int(v) for k, v in enumerate(multiplicity.tolist()) if v and k},
+            'top': [{'ticket': _ticket(c, game), 'count': count} for c, count in combo_counts['top']],
+        },
+        'duplicate_ids': duplicate_ids,
+    }
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py pool-stats',
+                                     description='统计【彩票池】的号码频率、重复组合、重复票号和各组合的赔付风险')
+    parser.add_argument(dest='pool', help='【彩票池】文件，文本格式或二进制格式')
+    parser.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES),
+                        help='彩票玩法，二进制格式的彩票池使用文件头中的玩法')
+    parser.add_argument('--top', dest='top', type=int, default=10, help='列出的组合和重复票号的个数')
+    parser.add_argument('--buckets', dest='buckets', type=int, default=64,
+                        help='查找重复票号的临时文件个数，越多占用内存越少')
+    parser.add_argument('--temp-dir', dest='temp_dir', default=None, help='存放临时文件的目录')
+    parser.add_argument('--json', dest='json', default=None, help='把完整的统计结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    try:
+        stats = analyze_pool(args.pool, args.game, args.top, args.buckets, args.temp_dir)
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    if args.json:
+        with open(args.json, 'wt') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=1)
+    if not stats['lines']:
+        print('彩票池为空')
+        return 0
+
+    print(f'彩票数：{stats["lines"]}  同一区内有重复号码：{stats["invalid"]}')
+    print('前区号码频率：' + ' '.join(f'{k}:{v}' for k, v in stats['front_frequency'].items()))
+    print('后区号码频率：' + ' '.join(f'{k}:{v}' for k, v in stats['back_frequency'].items()))
+    duplicates = stats['duplicate_combinations']
+    print(f'重复的号码组合：{duplicates["combinations"]}个，多出{duplicates["extra_tickets"]}注')
+    liability = stats['liability']
+    print(f'覆盖{liability["covered"]}/{liability["combinations"]}个组合，'
+          f'开出任一组合时一等奖平均{liability["expected_jackpot_winners"]:.4f}注，最多{liability["max_jackpot_winners"]}注')
+    for item in liability['top']:
+        print(f'    {item["ticket"]}  {item["count"]}注')
+    ids = stats['duplicate_ids']
+    print(f'重复的票号：{ids["ids"]}个，涉及{ids["tickets"]}注彩票，其中{ids["conflicting_ids"]}个票号对应不同的号码')
+    for item in ids['examples']:
+        print(f'    {item["id"]}  第{item["lines"]}行  {item["tickets"]}')
+    return 0
@@ -0,0 +1,242 @@
+"""
+彩票池文件校验
+
+计算哈希值之前逐行检查彩票池：号码个数、范围、两位数字、各区内升序且不重复、单个空格分隔，
+任何一行不是标准格式都会悄悄改变数据指纹。文件按字节切分为若干段，段的边界对齐到行首，
+各段在进程池中并行校验；同一段中长度相同的行整批转换为NumPy数组，按列检查分隔符、数字、范围和顺序，
+只有未通过整批检查的行才逐行解析以给出具体的错误说明。错误报告包含行号和该行在文件中的字节偏移。
+
+文件开头和末尾的空白字符不计入彩票池（与hash_file_data的str.strip一致），中间的空行是错误。
+
+使用示例：
+
+D:\\>python lottery_model.py validate-pool lottery_model.data -g double_chromosphere
+D:\\>python lottery_model.py validate-pool sales.log --normalize lottery_model.data
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from games import GAMES, format_ticket, parse_ticket
+from pool_builder import build_pool
+
+"""每段的字节数"""
+CHUNK_BYTES = 16 << 20
+
+"""每段最多记录的错误数"""
+MAX_ERRORS = 100
+
+"""str.strip截除的ASCII空白字符"""
+WHITESPACE = bytes(c for c in range(128) if chr(c).isspace())
+
+LINE_BREAK = re.compile(rb'\r\n|\r|\n')
+
+
+def validate_line(line, game):
+    """逐行校验，返回错误说明，标准格式的行返回None"""
+    if not line:
+        return '空行'
+    try:
+        front, back, ticket_id = parse_ticket(line, game)
+    except ValueError as e:
+        return str(e)
+    for zone in (front, back):
+        if len(set(zone)) != len(zone):
+            return f'同一区内有重复号码: {line!r}'
+        if list(zone) != sorted(zone):
+            return f'号码没有按升序排列: {line!r}'
+    if format_ticket(front, back, ticket_id, game) != line:
+        return f'不是标准格式（号码应为两位数字，以单个空格分隔）: {line!r}'
+    return None
+
+
+def _check_rows(rows, game):
+    """整批检查长度相同的各行，rows为形状(行数, 行长)的uint8数组，返回各行是否为标准格式"""
+    f, b = game.front_selected, game.back_selected
+    width = rows.shape[1]
+    numbers_width = 3 * (f + b) - 1
+    if width < numbers_width or width == numbers_width + 1:
+        return np.zeros(len(rows), dtype=bool)
+    columns = np.arange(f + b) * 3
+    separators = [ord(' ')] * (f + b - 1)
+    separators[f - 1] = ord('|')
+    if width > numbers_width:
+        """票号前的空格"""
+        separators.append(ord(' '))
+        separator_columns = columns + 2
+    else:
+        separator_columns = columns[:-1] + 2
+    ok = (rows[:, separator_columns] == separators).all(axis=1)
+
+    digits = rows[:, np.concatenate([columns, columns + 1, np.arange(numbers_width + 1, width)])]
+    ok &= ((digits >= ord('0')) & (digits <= ord('9'))).all(axis=1)
+
+    numbers = (rows[:, columns].astype(np.int16) - ord('0')) * 10 + rows[:, columns + 1] - ord('0')
+    front, back = numbers[:, :f], numbers[:, f:]
+    ok &= ((front >= 1) & (front <= len(game.front_balls))).all(axis=1)
+    ok &= ((back >= 1) & (back <= len(game.back_balls))).all(axis=1)
+    """严格升序即不重复且有序"""
+    ok &= (np.diff(front, axis=1) > 0).all(axis=1) & (np.diff(back, axis=1) > 0).all(axis=1)
+    return ok
+
+
+def validate_chunk(path, start, stop, game_name, max_errors=MAX_ERRORS):
+    """校验文件中[start, stop)字节范围内的各行，返回(行数, 错误数, 错误列表)
+
+    错误列表的每一项为(段内行序号, 字节偏移, 说明)，最多max_errors项。
+    """
+    game = GAMES[game_name]
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(stop - start)
+    lines = LINE_BREAK.split(data)
+    offsets = [start]
+    for m in LINE_BREAK.finditer(data):
+        offsets.append(start + m.end())
+    if data[-1:] in (b'\r', b'\n'):
+        """除最后一段外，各段都以换行符结尾"""
+        lines.pop()
+        offsets.pop()
+
+    bad = []
+    groups = {}
+    for i, line in enumerate(lines):
+        groups.setdefault(len(line), []).append(i)
+    for width, indexes in groups.items():
+        if width:
+            rows = np.frombuffer(b''.join(lines[i] for i in indexes), dtype=np.uint8).reshape(len(indexes), width)
+            ok = _check_rows(rows, game)
+            bad.extend(i for i, row_ok in zip(indexes, ok.tolist()) if not row_ok)
+        else:
+            bad.extend(indexes)
+    bad.sort()
+
+    errors = []
+    count = 0
+    for i in bad:
+        try:
+            line = lines[i].decode('ascii')
+        except UnicodeDecodeError:
+            message = f'包含非ASCII字符: {lines[i]!r}'
+        else:
+            message = validate_line(line, game)
+        if message is None:
+            continue
+        count += 1
+        if len(errors) < max_errors:
+            errors.append((i, offsets[i], message))
+    return len(lines), count, errors
+
+
+def _content_range(f, size):
+    """彩票池内容（截除头尾空白字符之后）在文件中的字节范围"""
+    begin = 0
+    while begin < size:
+        f.seek(begin)
+        block = f.read(1 << 16)
+        stripped = block.lstrip(WHITESPACE)
+        begin += len(block) - len(stripped)
+        if stripped:
+            break
+    end = size
+    while end > begin:
+        f.seek(max(end - (1 << 16), begin))
+        block = f.read(end - max(end - (1 << 16), begin))
+        stripped = block.rstrip(WHITESPACE)
+        end -= len(block) - len(stripped)
+        if stripped:
+            break
+    return begin, end
+
+
+def split_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """把彩票池内容切分为字节范围，每个边界都在某一行的行首"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        begin, end = _content_range(f, size)
+        bounds = [begin]
+        position = begin + chunk_bytes
+        while position < end:
+            f.seek(position)
+            block = f.read(1 << 16)
+            m = LINE_BREAK.search(block)
+            while m is None and block:
+                position += len(block)
+                block = f.read(1 << 16)
+                m = LINE_BREAK.search(block)
+            if m is None:
+                break
+            if m.group() == b'\r' and m.end() == len(block) and f.read(1) == b'\n':
+                """'\\r\\n'恰好被块的结尾分开"""
+                position += 1
+            position += m.end()
+            if position >= end:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+            position += chunk_bytes
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:])) if end > begin else []
+
+
+def validate_pool(path, game_name='double_chromosphere', workers=1, chunk_bytes=CHUNK_BYTES, max_errors=MAX_ERRORS):
+    """并行校验彩票池文件，返回(行数, 错误数, 错误列表)，错误列表的每一项为(行号, 字节偏移, 说明)"""
+    chunks = split_chunks(path, chunk_bytes)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(validate_chunk, [path] * len(chunks), [start for start, _ in chunks],
+                               [stop for _, stop in chunks], [game_name] * len(chunks),
+                               [max_errors] * len(chunks))
+        total = 0
+        count = 0
+        errors = []
+        for lines, chunk_count, chunk_errors in results:
+            for i, offset, message in chunk_errors:
+                if len(errors) < max_errors:
+                    errors.append((total + i + 1, offset, message))
+            total += lines
+            count += chunk_count
+    return total, count, errors
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py validate-pool',
+                                     description='并行校验【彩票池】文件的每一行是否为标准格式')
+    parser.add_argument(dest='pool', help='【彩票池】文件')
+    parser.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES), help='彩票玩法')
+    parser.add_argument('-w', dest='workers', type=int, default=os.cpu_count(),
+                        help='并行校验的进程数，默认使用全部CPU核心')
+    parser.add_argument('--max-errors', dest='max_errors', type=int, default=MAX_ERRORS, help='最多显示的错误数')
+    parser.add_argument('--normalize', dest='normalize', default=None,
+                        help='把各行整理为标准格式并排序，写入该文件（同build-pool）')
+    parser.add_argument('--hash', dest='hash', default='sha3_256', choices=('sha256', 'sha3_256'),
+                        help='整理后计算哈希值的算法')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.normalize:
+            count, hash_sum = build_pool([args.pool], args.normalize, args.game, getattr(hashlib, args.hash),
+                                         args.workers)
+            print(f'已整理{count}注彩票，写入{args.normalize}，哈希值：{hash_sum}')
+            return 0
+        lines, count, errors = validate_pool(args.pool, args.game, args.workers, max_errors=args.max_errors)
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    for line_no, offset, message in errors:
+        print(f'第{line_no}行（字节偏移{offset}）: {message}')
+    if count:
+        print(f'共{lines}行，{count}行不是{args.game}的标准格式')
+        return 1
+    print(f'共{lines}行，全部为{args.game}的标准格式')
+    return 0
@@ -0,0 +1,105 @@
+"""
+开奖结果缓存
+
+开奖结果完全由(彩票池哈希值, 难度值, 哈希算法, n)决定，同样的参数重新运行main不必再花几个小时搜索nonce值。
+本模块把每次搜索按nonce顺序找到的前n个满足要求的(hash_sum, nonce)和哈希值最小的nonce值
+保存在SQLite数据库中，总大小超过上限时淘汰最久未使用的记录。开奖号码不缓存：由nonce值直接反排序得到号码
+只需几微秒，而games.json中的玩法定义可能改变，缓存的号码反而可能过期。
+
+已缓存的搜索检查了从0到最后一个nonce值的全部nonce值，所以也能回答更小的n：取前n个即可；
+以及更难（更小）的难度值：满足更难难度值的nonce值必然在缓存的列表中，按新难度值筛选后仍有至少n个即可。
+更容易的难度值无法从缓存推出：缓存中没有只满足更容易难度值的nonce值。
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+import time
+
+from nonce_engines import difficulty_target
+
+"""缓存的默认大小上限（字节）"""
+MAX_BYTES = 64 << 20
+
+"""缓存格式的版本，打开版本不同的旧缓存时清空重建"""
+SCHEMA_VERSION = 2
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    origin_hash_sum TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    nonce_pool_size INTEGER NOT NULL,
+    found TEXT NOT NULL,
+    winner INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (origin_hash_sum, difficulty, hash, nonce_pool_size)
+)
+'''
+
+
+class ResultCache(object):
+    """保存在path中的开奖结果缓存，max_bytes为缓存记录的总大小上限"""
+
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        with self.db:
+            if self.db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                self.db.execute('DROP TABLE IF EXISTS runs')
+                self.db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self.db.execute(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, origin_hash_sum, difficulty, hash_name, nonce_pool_size):
+        """返回按nonce顺序的前nonce_pool_size个满足要求的(hash_sum, nonce)，缓存无法回答时返回None"""
+        rows = self.db.execute('SELECT difficulty, nonce_pool_size, found FROM runs '
+                               'WHERE origin_hash_sum = ? AND hash = ?', (origin_hash_sum, hash_name)).fetchall()
+        target = difficulty_target(difficulty)
+        for cached_difficulty, cached_size, found in rows:
+            if difficulty_target(cached_difficulty) < target:
+                continue
+            """哈希值小于更难的难度值的nonce值，一定也小于缓存的难度值"""
+            found = [(hash_sum, nonce) for hash_sum, nonce in json.loads(found) if hash_sum < difficulty]
+            if len(found) < nonce_pool_size:
+                continue
+            with self.db:
+                self.db.execute('UPDATE runs SET last_used = ? WHERE origin_hash_sum = ? AND difficulty = ? '
+                                'AND hash = ? AND nonce_pool_size = ?',
+                                (time.time(), origin_hash_sum, cached_difficulty, hash_name, cached_size))
+            return found[:nonce_pool_size]
+        return None
+
+    def store(self, origin_hash_sum, difficulty, hash_name, nonce_pool_size, found):
+        """保存一次搜索按nonce顺序找到的前nonce_pool_size个(hash_sum, nonce)，并淘汰最久未使用的记录"""
+        found = [list(x) for x in found[:nonce_pool_size]]
+        winner = min(found)[1]
+        found_json = json.dumps(found)
+        size = len(found_json) + len(origin_hash_sum) + len(difficulty) + 64
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (origin_hash_sum, difficulty, hash_name, nonce_pool_size, found_json, winner,
+                             size, time.time()))
+            self._evict()
+
+    def _evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM runs').fetchone()[0]
+        rows = self.db.execute('SELECT rowid, size FROM runs ORDER BY last_used').fetchall()
+        for rowid, size in rows[:-1]:
+            """至少保留刚保存的一条记录"""
+            if total <= self.max_bytes:
+                break
+            self.db.execute('DELETE FROM runs WHERE rowid = ?', (rowid,))
+            total -= size
@@ -0,0 +1,166 @@
+"""
+兑奖结算
+
+开奖号码公布后，统计彩票池中每个奖级的中奖注数并列出中奖彩票。每注彩票的前区和后区号码各编码为
+一个位掩码（号码x对应第x - 1位），与开奖号码的位掩码按位与之后计算置位个数即为命中个数，
+整批彩票一次向量化计算。彩票池逐批读取，文件大于内存时也只占用一批彩票的内存，
+文本格式和二进制格式（convert-pool）的彩票池都可以结算。
+
+使用示例：
+
+D:\\>python lottery_model.py settle lottery_model.data -r "09 17 21 25 26 30|13" --winners winners.txt
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import argparse
+
+import numpy as np
+
+from combinatorics import unrank_combinations
+from games import GAMES, SPEC_FILE, parse_ticket, parse_tickets
+from pool_binary import _decode_batch, is_binary_pool, open_binary_pool
+from pool_file import iter_pool_lines
+
+"""每批结算的彩票数"""
+BATCH_LINES = 1 << 18
+
+"""没有np.bitwise_count时按字节查表计算置位个数"""
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def tier_table(game):
+    """形状为(前区选号个数 + 1, 后区选号个数 + 1)的数组，table[前区命中个数, 后区命中个数]为奖级
+
+    奖级来自玩法定义中的prizes，从1开始，0为未中奖；玩法没有定义奖级时抛出ValueError。
+    """
+    if not game.prizes:
+        raise ValueError(f'玩法{game.name}没有定义奖级（{SPEC_FILE}中的prizes），无法结算')
+    table = np.zeros((game.front_selected + 1, game.back_selected + 1), dtype=np.uint8)
+    for tier, (_, hits) in enumerate(game.prizes, 1):
+        for front_hits, back_hits in hits:
+            table[front_hits, back_hits] = tier
+    return table
+
+
+def tier_names(game):
+    """各奖级的名称，第i项为第i + 1等奖"""
+    return [name for name, _ in game.prizes]
+
+
+def number_masks(numbers):
+    """把形状(m, k)、从1开始的号码数组编码为m个uint64位掩码"""
+    bits = np.left_shift(np.uint64(1), np.asarray(numbers, dtype=np.uint64) - np.uint64(1))
+    return np.bitwise_or.reduce(bits, axis=1) if bits.shape[1] else np.zeros(len(bits), dtype=np.uint64)
+
+
+def popcount(masks):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks)
+    return _BYTE_POPCOUNT[masks.view(np.uint8)].reshape(len(masks), 8).sum(axis=1)
+
+
+def settle_batch(front, back, draw_front, draw_back, table):
+    """计算一批彩票的奖级，front、back为号码数组，draw_front、draw_back为开奖号码的位掩码"""
+    front_hits = popcount(number_masks(front) & np.uint64(draw_front))
+    back_hits = popcount(number_masks(back) & np.uint64(draw_back))
+    return table[front_hits, back_hits]
+
+
+def parse_draw(result, game):
+    """解析'09 17 21 25 26 30|13'形式的开奖号码，返回前区和后区的位掩码"""
+    front, back, ticket_id = parse_ticket(result, game)
+    if ticket_id is not None or len(set(front)) != len(front) or len(set(back)) != len(back):
+        raise ValueError(f'开奖号码不正确: {result!r}')
+    return sum(1 << (x - 1) for x in front), sum(1 << (x - 1) for x in back)
+
+
+def _text_batches(path, game):
+    """逐批产出(前区号码数组, 后区号码数组, 各行彩票)"""
+    with open(path, 'rt') as f:
+        batch = []
+        for line in iter_pool_lines(f):
+            batch.append(line)
+            if len(batch) >= BATCH_LINES:
+                yield parse_tickets(batch, game)[:2] + (batch,)
+                batch = []
+        if batch and batch != ['']:
+            yield parse_tickets(batch, game)[:2] + (batch,)
+
+
+def _binary_batches(records, game, header):
+    """逐批产出(前区号码数组, 后区号码数组, 记录)，中奖彩票再由记录还原为文本"""
+    for start in range(0, len(records), BATCH_LINES):
+        batch = np.asarray(records[start:start + BATCH_LINES])
+        front = unrank_combinations(batch['front'].astype(np.int64), len(game.front_balls), game.front_selected)
+        back = unrank_combinations(batch['back'].astype(np.int64), len(game.back_balls), game.back_selected)
+        yield front + 1, back + 1, batch
+
+
+def settle_pool(path, result, game_name='double_chromosphere', winners=None):
+    """结算彩票池文件path，返回各奖级的中奖注数列表，第i项为第i + 1等奖
+
+    winners为已打开的文本文件时，逐行写入每注中奖彩票的行号、奖级和彩票（含票号）。
+    二进制格式的彩票池使用文件头中的玩法，忽略game_name。
+    """
+    if is_binary_pool(path):
+        header, records = open_binary_pool(path)
+        if header['game'] not in GAMES:
+            raise ValueError(f'二进制彩票池的玩法{header["game"]}不在{SPEC_FILE}中')
+        game = GAMES[header['game']]
+        batches = _binary_batches(records, game, header)
+    else:
+        header = None
+        game = GAMES[game_name]
+        batches = _text_batches(path, game)
+    draw_front, draw_back = parse_draw(result, game)
+    table = tier_table(game)
+    names = tier_names(game)
+
+    counts = np.zeros(len(names) + 1, dtype=np.int64)
+    line_no = 0
+    for front, back, lines in batches:
+        tiers = settle_batch(front, back, draw_front, draw_back, table)
+        counts += np.bincount(tiers, minlength=len(counts))
+        if winners is not None:
+            hits = np.flatnonzero(tiers)
+            if header is not None:
+                hit_lines = _decode_batch(lines[hits], game, header)
+            else:
+                hit_lines = [lines[i] for i in hits.tolist()]
+            for i, line in zip(hits.tolist(), hit_lines):
+                winners.write(f'{line_no + i + 1}\t{names[tiers[i] - 1]}\t{line}\n')
+        line_no += len(tiers)
+    return counts[1:].tolist()
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py settle',
+                                     description='统计【彩票池】中各奖级的中奖注数，输出中奖彩票')
+    parser.add_argument(dest='pool', help='【彩票池】文件，文本格式或二进制格式')
+    parser.add_argument('-r', dest='result', required=True, help="开奖号码，例如 '09 17 21 25 26 30|13'")
+    parser.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES),
+                        help='彩票玩法，二进制格式的彩票池使用文件头中的玩法')
+    parser.add_argument('--winners', dest='winners', default=None,
+                        help='输出中奖彩票的文件名，每行为行号、奖级和彩票')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.winners:
+            with open(args.winners, 'wt') as winners:
+                counts = settle_pool(args.pool, args.result, args.game, winners)
+        else:
+            counts = settle_pool(args.pool, args.result, args.game)
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    game_name = open_binary_pool(args.pool)[0]['game'] if is_binary_pool(args.pool) else args.game
+    print(f'开奖号码：{args.result}')
+    for name, count in zip(tier_names(GAMES[game_name]), counts):
+        print(f'{name}：{count}注')
+    print(f'中奖合计：{sum(counts)}注')
+    return 0
@@ -0,0 +1,186 @@
+"""
+NumPy批量SHA-256计算
+
+把成千上万个 origin_hash_sum + str(nonce) 消息的SHA-256放在NumPy的uint32数组中同时计算，
+每个nonce占用数组的一列（lane），按difficulty换算出的target向量化筛选，只把满足要求的nonce交给
+nonce_filter的堆结构。origin_hash_sum的完整分组只压缩一次，每个nonce只需要压缩剩下的1~2个分组。
+
+本引擎需要安装NumPy，且只支持sha256。实测在CPython上比prefix引擎慢（单核约80万次/秒，prefix约
+100万次/秒以上）：hashlib的SHA-256本身是C实现，而NumPy的每一轮运算都要遍历整个数组，内存带宽抵消了
+向量化的收益。它的价值在于提供一个与hashlib相互独立的SHA-256实现，用于交叉验证。
+tests/test_sha256_numpy.py与hashlib.sha256逐个比对数百万个nonce的哈希值；单独运行本文件比较各引擎的速度：
+
+D:\\>python sha256_numpy.py
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+import numpy as np
+
+from nonce_engines import difficulty_target, measure_hash_rate
+
+"""每次同时计算的nonce个数"""
+LANES = 1 << 15
+
+K = np.array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+], dtype=np.uint32)
+
+H0 = np.array([
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+], dtype=np.uint32)
+
+
+def _rotr(x, n):
+    return (x >> np.uint32(n)) | (x << np.uint32(32 - n))
+
+
+def _compress(state, words):
+    """SHA-256压缩函数，state为8个uint32（标量或数组），words为16个形状相同的uint32数组"""
+    w = list(words)
+    a, b, c, d, e, f, g, h = state
+    with np.errstate(over='ignore'):
+        for t in range(64):
+            if t >= 16:
+                w15, w2 = w[t - 15], w[t - 2]
+                s0 = _rotr(w15, 7) ^ _rotr(w15, 18) ^ (w15 >> np.uint32(3))
+                s1 = _rotr(w2, 17) ^ _rotr(w2, 19) ^ (w2 >> np.uint32(10))
+                w.append(w[t - 16] + s0 + w[t - 7] + s1)
+            S1 = _rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)
+            ch = g ^ (e & (f ^ g))
+            """w[t]在所有lane中相同时是标量，K[t] + w[t]不占用数组运算"""
+            temp1 = h + S1 + ch + (K[t] + w[t])
+            S0 = _rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)
+            maj = (a & b) | (c & (a | b))
+            temp2 = S0 + maj
+            h, g, f, e = g, f, e, d + temp1
+            d, c, b, a = c, b, a, temp1 + temp2
+        return [x + y for x, y in zip(state, (a, b, c, d, e, f, g, h))]
+
+
+def _block_words(data):
+    """把长度为64的整数倍的字节串拆成每组16个大端uint32"""
+    words = np.frombuffer(data, dtype='>u4').astype(np.uint32)
+    return words.reshape(-1, 16)
+
+
+def prefix_midstate(prefix):
+    """压缩prefix中所有完整的64字节分组，返回(中间状态, 剩余的字节)"""
+    full = len(prefix) - len(prefix) % 64
+    state = list(H0)
+    for block in _block_words(prefix[:full]):
+        state = _compress(state, block)
+    return state, prefix[full:]
+
+
+def _nonce_digits(nonces, width):
+    """把位数都为width的nonce数组转换为ASCII数字，返回形状为(len(nonces), width)的uint8数组"""
+    digits = np.empty((len(nonces), width), dtype=np.uint8)
+    rest = nonces.copy()
+    for i in range(width - 1, -1, -1):
+        digits[:, i] = rest % 10 + 48
+        rest //= 10
+    return digits
+
+
+def sha256_nonce_words(prefix, nonces, midstate=None):
+    """计算所有 prefix + str(nonce) 的SHA-256，nonces的十进制位数必须相同
+
+    返回形状为(8, len(nonces))的uint32数组，每列为一个哈希值的8个大端字。
+    """
+    nonces = np.asarray(nonces, dtype=np.uint64)
+    width = len(str(int(nonces[0])))
+    state, rest = midstate or prefix_midstate(prefix)
+    length = len(prefix) + width
+    """剩余字节 + nonce + 0x80 + 0填充 + 64位消息长度"""
+    tail_size = (len(rest) + width + 1 + 8 + 63) // 64 * 64
+    tail = np.zeros((len(nonces), tail_size), dtype=np.uint8)
+    tail[:, :len(rest)] = np.frombuffer(rest, dtype=np.uint8)
+    tail[:, len(rest):len(rest) + width] = _nonce_digits(nonces, width)
+    tail[:, len(rest) + width] = 0x80
+    tail[:, -8:] = np.frombuffer((length * 8).to_bytes(8, 'big'), dtype=np.uint8)
+
+    words = np.ascontiguousarray(tail.view('>u4').astype(np.uint32).T)
+    """填充和消息长度等在所有lane中相同的字用标量代替，减少数组运算"""
+    words = [row[0] if (row == row[0]).all() else row for row in words]
+    for block in range(tail_size // 64):
+        state = _compress(state, words[block * 16:block * 16 + 16])
+    return np.array([np.broadcast_to(x, len(nonces)) for x in state], dtype=np.uint32)
+
+
+def _split_by_width(start, stop):
+    """把[start, stop)按十进制位数切分，同一段内的nonce位数相同"""
+    while start < stop:
+        bound = 10 ** len(str(start))
+        yield start, min(stop, bound)
+        start = min(stop, bound)
+
+
+def _below_target(words, target_words):
+    """向量化地判断每列哈希值是否小于target，逐字比较大端uint32"""
+    below = np.zeros(words.shape[1], dtype=bool)
+    equal = np.ones(words.shape[1], dtype=bool)
+    for w, t in zip(words, target_words):
+        below |= equal & (w < t)
+        equal &= w == t
+        if not equal.any():
+            break
+    return below
+
+
+def scan_numpy(origin_hash_sum, start, stop, difficulty, HASH=hashlib.sha256):
+    """NumPy批量计算SHA-256的nonce搜索引擎，接口和结果与nonce_engines中的其它引擎相同"""
+    if HASH().name != 'sha256':
+        raise ValueError(f'numpy引擎只支持sha256，不支持{HASH().name}')
+    target = difficulty_target(difficulty, 32)
+    if target <= 0:
+        return []
+    all_below = target >= 1 << 256
+    target_words = np.frombuffer(min(target, (1 << 256) - 1).to_bytes(32, 'big'), dtype='>u4')
+
+    prefix = origin_hash_sum.encode()
+    midstate = prefix_midstate(prefix)
+    found = []
+    for part_start, part_stop in _split_by_width(start, stop):
+        for lane_start in range(part_start, part_stop, LANES):
+            nonces = np.arange(lane_start, min(lane_start + LANES, part_stop), dtype=np.uint64)
+            words = sha256_nonce_words(prefix, nonces, midstate)
+            """先只比较第一个字，绝大多数nonce在这一步就被排除"""
+            candidates = np.flatnonzero(words[0] <= target_words[0])
+            if not all_below:
+                candidates = candidates[_below_target(words[:, candidates], target_words)]
+            for i in candidates:
+                hash_sum = ''.join(f'{int(w):08x}' for w in words[:, i])
+                found.append((hash_sum, int(nonces[i])))
+    return found
+
+
+def cross_check(origin_hash_sum, start, count):
+    """逐个比对[start, start + count)内所有nonce的NumPy哈希值与hashlib.sha256的结果，返回不一致的nonce列表"""
+    prefix = origin_hash_sum.encode()
+    midstate = prefix_midstate(prefix)
+    mismatches = []
+    for part_start, part_stop in _split_by_width(start, start + count):
+        for lane_start in range(part_start, part_stop, LANES):
+            nonces = range(lane_start, min(lane_start + LANES, part_stop))
+            words = sha256_nonce_words(prefix, np.array(nonces, dtype=np.uint64), midstate)
+            digests = words.astype('>u4').T.tobytes()
+            for i, nonce in enumerate(nonces):
+                if digests[i * 32:i * 32 + 32] != hashlib.sha256(prefix + str(nonce).encode()).digest():
+                    mismatches.append(nonce)
+    return mismatches
+
+
+if __name__ == '__main__':
+    for name in ('simple', 'prefix', 'numpy'):
+        print(f'sha256     {name:<8} {measure_hash_rate(name):>14,.0f} 次/秒')
@@ -0,0 +1,151 @@
+"""
+开奖过程的遥测数据
+
+计数器（已检查的nonce数、满足要求的nonce数）、直方图（每个区间的计算时间）和各阶段
+（计算哈希值fingerprint、搜索search、计算开奖号码mapping）的耗时。搜索循环每完成一个区间调用一次sample，
+只做几次加法；每隔interval秒才生成一次快照并写入文件，格式为JSON lines（每个快照追加一行）
+或Prometheus文本格式（每次覆盖为最新的数值）。
+
+使用示例，不逐个输出nonce值，每5秒把遥测数据写入metrics.prom：
+
+D:\\>python lottery_model.py lottery_model.data -d 0003 -q --metrics metrics.prom --metrics-format prometheus
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+import bisect
+import json
+import os
+import time
+
+"""区间计算时间直方图的上界（秒）"""
+CHUNK_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+FORMATS = ('jsonl', 'prometheus')
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Telemetry(object):
+    """path为输出文件名，None时只在内存中保存，可以随时调用snapshot"""
+
+    def __init__(self, path=None, format='jsonl', interval=5.0):
+        if format not in FORMATS:
+            raise ValueError(f'遥测数据格式应为{FORMATS}之一: {format!r}')
+        self.path = path
+        self.format = format
+        self.interval = interval
+        self.begin = time.perf_counter()
+        self.scanned = 0
+        self.hits = 0
+        self.chunk_seconds = Histogram(CHUNK_SECONDS_BUCKETS)
+        self.stages = {}
+        self.hash_rate = 0.0
+        self._last_sample = self.begin
+        self._window_start = self.begin
+        self._window_scanned = 0
+        if path and format == 'jsonl':
+            open(path, 'wt').close()
+
+    @contextmanager
+    def stage(self, name):
+        """记录with语句块的耗时，作为阶段name的耗时"""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - begin
+            self.flush()
+
+    def sample(self, scanned, hits, flush=True):
+        """搜索循环每完成一个区间调用一次，scanned为该区间的nonce个数，hits为其中满足要求的个数
+
+        flush为False时只更新内存中的数据，不写入文件。
+        """
+        now = time.perf_counter()
+        self.chunk_seconds.observe(now - self._last_sample)
+        self._last_sample = now
+        self.scanned += scanned
+        self.hits += hits
+        self._window_scanned += scanned
+        if now - self._window_start >= self.interval:
+            self.hash_rate = self._window_scanned / (now - self._window_start)
+            self._window_start = now
+            self._window_scanned = 0
+            if flush:
+                self.flush()
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.begin
+        search = self.stages.get('search') or elapsed
+        return {
+            'time': time.time(),
+            'elapsed': elapsed,
+            'nonces_scanned': self.scanned,
+            'hits': self.hits,
+            'hash_rate': self.hash_rate or (self.scanned / search if search else 0.0),
+            'hit_rate': self.hits / self.scanned if self.scanned else 0.0,
+            'stage_seconds': dict(self.stages),
+            'chunk_seconds': {'buckets': list(self.chunk_seconds.buckets), 'counts': self.chunk_seconds.counts,
+                              'sum': self.chunk_seconds.sum, 'count': self.chunk_seconds.count},
+        }
+
+    def flush(self):
+        """把当前快照写入文件"""
+        if not self.path:
+            return
+        snapshot = self.snapshot()
+        if self.format == 'jsonl':
+            with open(self.path, 'at') as f:
+                f.write(json.dumps(snapshot) + '\n')
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wt') as f:
+            f.write(prometheus_text(snapshot))
+        os.replace(tmp, self.path)
+
+
+def prometheus_text(snapshot):
+    """把快照转换为Prometheus文本格式"""
+    lines = [
+        '# HELP lottery_nonces_scanned_total 已检查的nonce个数',
+        '# TYPE lottery_nonces_scanned_total counter',
+        f'lottery_nonces_scanned_total {snapshot["nonces_scanned"]}',
+        '# HELP lottery_hits_total 满足难度要求的nonce个数',
+        '# TYPE lottery_hits_total counter',
+        f'lottery_hits_total {snapshot["hits"]}',
+        '# HELP lottery_hash_rate 最近的哈希速度（次/秒）',
+        '# TYPE lottery_hash_rate gauge',
+        f'lottery_hash_rate {snapshot["hash_rate"]}',
+        '# HELP lottery_hit_rate 满足难度要求的nonce值所占比例',
+        '# TYPE lottery_hit_rate gauge',
+        f'lottery_hit_rate {snapshot["hit_rate"]}',
+        '# HELP lottery_stage_seconds 各阶段的耗时（秒）',
+        '# TYPE lottery_stage_seconds gauge',
+    ]
+    for stage, seconds in snapshot['stage_seconds'].items():
+        lines.append(f'lottery_stage_seconds{{stage="{stage}"}} {seconds}')
+    histogram = snapshot['chunk_seconds']
+    lines += ['# HELP lottery_chunk_seconds 每个区间的计算时间（秒）',
+              '# TYPE lottery_chunk_seconds histogram']
+    total = 0
+    for bound, count in zip(list(histogram['buckets']) + ['+Inf'], histogram['counts']):
+        total += count
+        lines.append(f'lottery_chunk_seconds_bucket{{le="{bound}"}} {total}')
+    lines += [f'lottery_chunk_seconds_sum {histogram["sum"]}',
+              f'lottery_chunk_seconds_count {histogram["count"]}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,19 @@
+"""
+测试配置
+
+v0.3.1的模块按文件名互相导入，需要从v0.3.1目录运行；这里把该目录加入sys.path，
+使 python -m pytest 在任何目录下都能找到这些模块。
+
+D:\\>python -m pytest -q v0.3.1/tests
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+"""v0.3.1目录，测试中的子进程也在这里运行"""
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, PACKAGE_DIR)
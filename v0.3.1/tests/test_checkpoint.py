@@ -0,0 +1,49 @@
+"""
+checkpoint的回归测试：从断点继续的结果与不中断的计算相同，搜索完成后删除断点文件，
+开奖参数不同的断点文件抛出CheckpointMismatch
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+
+import pytest
+
+from checkpoint import CheckpointMismatch, save_checkpoint
+from lottery_model import nonce_filter
+from nonce_engines import scan_nonces
+
+ORIGIN_HASH_SUM = '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'
+DIFFICULTY = '003'
+CHUNK_SIZE = 256
+
+
+def test_resume_matches_uninterrupted(tmp_path):
+    expected = nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, 5, hashlib.sha3_256, chunk_size=CHUNK_SIZE)
+    path = str(tmp_path / 'draw.checkpoint')
+    """模拟检查完前4个区间后中断"""
+    next_nonce = 4 * CHUNK_SIZE
+    found = scan_nonces('prefix', ORIGIN_HASH_SUM, 0, next_nonce, DIFFICULTY, hashlib.sha3_256)
+    save_checkpoint(path, ORIGIN_HASH_SUM, DIFFICULTY, 'sha3_256', next_nonce, found)
+    result = nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, 5, hashlib.sha3_256, chunk_size=CHUNK_SIZE,
+                          checkpoint=path, resume=True, checkpoint_interval=0)
+    assert result == expected
+    assert not os.path.exists(path)
+
+
+def test_checkpoint_removed_after_search(tmp_path):
+    path = str(tmp_path / 'draw.checkpoint')
+    nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, 5, hashlib.sha3_256, chunk_size=CHUNK_SIZE,
+                 checkpoint=path, checkpoint_interval=0)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('difficulty, hash_name', [('0003', 'sha3_256'), (DIFFICULTY, 'sha256')])
+def test_mismatched_checkpoint(tmp_path, difficulty, hash_name):
+    path = str(tmp_path / 'draw.checkpoint')
+    save_checkpoint(path, ORIGIN_HASH_SUM, difficulty, hash_name, 0, [])
+    with pytest.raises(CheckpointMismatch):
+        nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, 5, hashlib.sha3_256, chunk_size=CHUNK_SIZE,
+                     checkpoint=path, resume=True)
@@ -0,0 +1,64 @@
+"""
+combinatorics的回归测试：组合的序号与itertools.combinations的枚举顺序完全一致，
+这一顺序决定了每一期已公布的开奖号码
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import itertools
+
+import pytest
+
+from combinatorics import binomial, rank_combination, rank_combinations, unrank_combination, unrank_combinations
+from games import GAMES
+
+SMALL = [(n, k) for n in range(0, 11) for k in range(0, n + 1)]
+
+"""两种已发布玩法的各个区"""
+ZONES = sorted({(len(balls), selected) for game in GAMES.values()
+                for balls, selected in ((game.front_balls, game.front_selected),
+                                        (game.back_balls, game.back_selected))})
+
+
+@pytest.mark.parametrize('n, k', SMALL)
+def test_scalar_matches_itertools(n, k):
+    combinations = list(itertools.combinations(range(n), k))
+    assert binomial(n, k) == len(combinations)
+    for index, combination in enumerate(combinations):
+        assert unrank_combination(index, n, k) == combination
+        assert rank_combination(combination, n) == index
+
+
+@pytest.mark.parametrize('n, k', [(n, k) for n, k in SMALL if k > 0])
+def test_batch_matches_itertools(n, k):
+    np = pytest.importorskip('numpy')
+    combinations = np.array(list(itertools.combinations(range(n), k)), dtype=np.int64).reshape(-1, k)
+    indexes = np.arange(len(combinations))
+    assert (unrank_combinations(indexes, n, k) == combinations).all()
+    assert (rank_combinations(combinations, n) == indexes).all()
+
+
+@pytest.mark.parametrize('n, k', ZONES)
+def test_shipped_zones(n, k):
+    """逐个比对全部组合，单个计算的版本每隔若干个抽查一次"""
+    np = pytest.importorskip('numpy')
+    combinations = np.array(list(itertools.combinations(range(n), k)), dtype=np.int64)
+    indexes = np.arange(len(combinations))
+    assert binomial(n, k) == len(combinations)
+    assert (unrank_combinations(indexes, n, k) == combinations).all()
+    assert (rank_combinations(combinations, n) == indexes).all()
+    for index in list(range(0, len(combinations), 997)) + [len(combinations) - 1]:
+        assert unrank_combination(index, n, k) == tuple(combinations[index])
+        assert rank_combination(tuple(combinations[index]), n) == index
+
+
+@pytest.mark.parametrize('index', [-1, 'end'])
+def test_unrank_out_of_range(index):
+    n, k = 10, 3
+    index = binomial(n, k) if index == 'end' else index
+    with pytest.raises(ValueError):
+        unrank_combination(index, n, k)
+    pytest.importorskip('numpy')
+    with pytest.raises(ValueError):
+        unrank_combinations([index], n, k)
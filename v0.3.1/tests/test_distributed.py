@@ -0,0 +1,91 @@
+"""
+distributed的回归测试：在本机上运行协调者和工作者，结果与串行的nonce_filter完全相同；
+伪造或漏报结果的工作者被发现，其区间由其他工作者重新计算
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import socket
+import threading
+
+import pytest
+
+from distributed import Coordinator, _receive, _send, run_worker
+from lottery_model import nonce_filter
+from nonce_engines import scan_nonces
+
+ORIGIN_HASH_SUM = '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'
+DIFFICULTY = '003'
+CHUNK_SIZE = 256
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_workers(address, count, target=run_worker):
+    threads = [threading.Thread(target=target, args=(address,), daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def first_found(chunks, n):
+    found = []
+    for _, _, chunk_found in chunks:
+        found.extend(chunk_found)
+        if len(found) >= n:
+            break
+    chunks.close()
+    return found[:n]
+
+
+def cheating_worker(address, tamper):
+    """按协议领取区间，但返回经过tamper修改的结果"""
+    with socket.create_connection(address) as sock, sock.makefile('rwb') as f:
+        _send(f, {'type': 'hello'})
+        try:
+            while True:
+                task = _receive(f)
+                if task.get('type') != 'task':
+                    return
+                found = scan_nonces('prefix', task['origin_hash_sum'], task['start'], task['stop'],
+                                    task['difficulty'], getattr(hashlib, task['hash']))
+                _send(f, {'type': 'result', 'start': task['start'], 'stop': task['stop'], 'found': tamper(found)})
+        except (ConnectionError, OSError):
+            return
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+@pytest.mark.parametrize('n', [1, 5])
+def test_distributed_matches_serial(workers, n):
+    expected = nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, n, hashlib.sha3_256, chunk_size=CHUNK_SIZE)
+    address = ('127.0.0.1', free_port())
+    """协调者结束后才连接的工作者会重试连接，缩短重试时间"""
+    start_workers(address, workers, lambda address: run_worker(address, retry=2.0))
+    result = nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, n, hashlib.sha3_256, chunk_size=CHUNK_SIZE, listen=address)
+    assert result == expected
+
+
+@pytest.mark.parametrize('tamper', [
+    pytest.param(lambda found: found[1:], id='omitted'),
+    pytest.param(lambda found: [['0' * 64, nonce] for _, nonce in found], id='forged'),
+])
+def test_bad_worker_is_caught(tamper):
+    expected = first_found(((start, start + CHUNK_SIZE, scan_nonces('prefix', ORIGIN_HASH_SUM, start,
+                                                                    start + CHUNK_SIZE, DIFFICULTY,
+                                                                    hashlib.sha3_256))
+                            for start in range(0, 1 << 20, CHUNK_SIZE)), 5)
+    coordinator = Coordinator(ORIGIN_HASH_SUM, DIFFICULTY, hashlib.sha3_256, ('127.0.0.1', 0), CHUNK_SIZE,
+                              audit=1.0)
+    """作弊的工作者单独计算，直到第一个有结果的区间被发现，然后由诚实的工作者重新计算"""
+    cheater = start_workers(coordinator.address, 1, lambda address: cheating_worker(address, tamper))
+    chunks = coordinator.chunks()
+    cheater[0].join(10)
+    assert not cheater[0].is_alive()
+    start_workers(coordinator.address, 2)
+    assert [tuple(item) for item in first_found(chunks, 5)] == expected
@@ -0,0 +1,73 @@
+"""
+draw_service的回归测试：补发历史事件期间开奖结束时，观察者仍能收到结果事件；进度事件都是合法的JSON
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+from draw_service import Draw, DrawService, search
+
+
+class SlowWriter(object):
+    """第一次drain时开奖结束，模拟慢速的观察者"""
+
+    def __init__(self, on_drain):
+        self.data = b''
+        self.on_drain = on_drain
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        on_drain, self.on_drain = self.on_drain, None
+        if on_drain:
+            on_drain()
+        await asyncio.sleep(0)
+
+
+def events(data):
+    return [json.loads(line[len('data: '):]) for line in data.decode().splitlines() if line.startswith('data: ')]
+
+
+def test_stream_finishes_during_drain():
+    async def run():
+        draw = Draw(1, {})
+        draw.publish({'type': 'hash', 'hash_sum': '00'})
+        writer = SlowWriter(lambda: draw.publish({'type': 'result', 'result': '01|02'}))
+        await asyncio.wait_for(DrawService()._stream(draw, writer), 5)
+        return writer.data
+
+    assert [event['type'] for event in events(asyncio.run(run()))] == ['hash', 'result']
+
+
+def test_stream_replays_finished_draw():
+    async def run():
+        draw = Draw(1, {})
+        draw.publish({'type': 'hash', 'hash_sum': '00'})
+        draw.publish({'type': 'cancelled', 'scanned': 0})
+        writer = SlowWriter(None)
+        await asyncio.wait_for(DrawService()._stream(draw, writer), 5)
+        return writer.data
+
+    assert [event['type'] for event in events(asyncio.run(run()))] == ['hash', 'cancelled']
+
+
+def test_progress_without_qualifying_probability():
+    """difficulty为空时没有nonce满足要求，预计剩余时间为None而不是Infinity"""
+    draw = Draw(1, {'hash': 'sha3_256', 'n': 1, 'difficulty': '', 'workers': 1, 'engine': 'prefix',
+                    'game': 'double_chromosphere'})
+    emitted = []
+
+    def emit(event):
+        emitted.append(event)
+        if len(emitted) >= 1:
+            draw.stop.set()
+
+    search(draw, '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff', emit)
+    progress = [event for event in emitted if event['type'] == 'progress']
+    assert progress and all(event['eta'] is None for event in progress)
+    for event in emitted:
+        json.loads(json.dumps(event, allow_nan=False))
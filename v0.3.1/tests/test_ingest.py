@@ -0,0 +1,92 @@
+"""
+ingest的回归测试：分批加入、截止生成的彩票池与build-pool一次生成的完全相同，
+哈希值与hash_file_data对输出文件的计算结果相同，被改动的有序段在截止时被发现
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import random
+
+import pytest
+
+from games import GAMES, format_ticket
+from ingest import PoolIngest
+from pool_builder import build_pool
+from pool_file import hash_pool
+
+
+def random_tickets(count, seed, game=GAMES['double_chromosphere']):
+    """随机的、号码未排序的彩票，部分不足两位，检验整理为标准格式"""
+    rng = random.Random(seed)
+    tickets = []
+    for _ in range(count):
+        front = rng.sample(range(1, len(game.front_balls) + 1), game.front_selected)
+        back = rng.sample(range(1, len(game.back_balls) + 1), game.back_selected)
+        tickets.append(' '.join(str(x) for x in front) + '|' + ' '.join(str(x) for x in back))
+    return tickets
+
+
+def file_hash(path, HASH):
+    with open(path, 'rt') as f:
+        return hash_pool(f, HASH)
+
+
+@pytest.mark.parametrize('batch_sizes', [[1], [5], [3, 4], [7, 1, 2, 9, 3], [2] * 8 + [5]])
+@pytest.mark.parametrize('hash_name', ['sha256', 'sha3_256'])
+def test_close_matches_build_pool(tmp_path, batch_sizes, hash_name):
+    HASH = getattr(hashlib, hash_name)
+    batches = [random_tickets(size, seed) for seed, size in enumerate(batch_sizes)]
+    ingest = PoolIngest(str(tmp_path / 'sales.d'), HASH=HASH)
+    for batch in batches:
+        ingest.add(batch)
+    count, hash_sum = ingest.close(str(tmp_path / 'ingest.data'))
+
+    shard = tmp_path / 'all.log'
+    shard.write_text('\n'.join(line for batch in batches for line in batch))
+    expected = build_pool([str(shard)], str(tmp_path / 'build.data'), HASH=HASH)
+    assert (count, hash_sum) == expected
+    assert (tmp_path / 'ingest.data').read_bytes() == (tmp_path / 'build.data').read_bytes()
+    assert file_hash(tmp_path / 'ingest.data', HASH) == hash_sum
+
+
+def test_status_digests(tmp_path):
+    """各段的摘要按彩票池规则计算，只有一个段时就是彩票池的哈希值"""
+    ingest = PoolIngest(str(tmp_path / 'sales.d'))
+    ingest.add(random_tickets(4, 0))
+    ingest.add(random_tickets(4, 1))
+    batches, count, digests = ingest.status()
+    assert (batches, count, len(digests)) == (2, 8, 1)
+    assert ingest.close(str(tmp_path / 'pool.data'))[1] == digests[0]
+
+
+@pytest.mark.parametrize('batch_sizes', [[6], [3, 4, 5]])
+def test_tampered_run_is_caught(tmp_path, batch_sizes):
+    ingest = PoolIngest(str(tmp_path / 'sales.d'))
+    for seed, size in enumerate(batch_sizes):
+        ingest.add(random_tickets(size, seed))
+    run = os.path.join(ingest.directory, ingest.manifest['runs'][0]['path'])
+    lines = open(run, 'rt').read().split('\n')
+    lines[0] = format_ticket((1, 2, 3, 4, 5, 6), (7,), None, ingest.game)
+    with open(run, 'wt', newline='\n') as f:
+        f.write('\n'.join(lines))
+    with pytest.raises(ValueError):
+        ingest.close(str(tmp_path / 'pool.data'))
+
+
+def test_close_refused(tmp_path):
+    directory = str(tmp_path / 'sales.d')
+    with pytest.raises(FileNotFoundError):
+        PoolIngest(directory, create=False)
+    ingest = PoolIngest(directory)
+    with pytest.raises(ValueError):
+        ingest.close(str(tmp_path / 'empty.data'))
+    ingest.add(random_tickets(3, 0))
+    ingest.close(str(tmp_path / 'pool.data'))
+    ingest = PoolIngest(directory, create=False)
+    with pytest.raises(ValueError):
+        ingest.close(str(tmp_path / 'again.data'))
+    with pytest.raises(ValueError):
+        ingest.add(random_tickets(1, 1))
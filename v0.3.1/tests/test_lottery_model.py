@@ -0,0 +1,82 @@
+"""
+lottery_model的回归测试
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import PACKAGE_DIR
+from games import GAMES, map_draw
+from lottery_model import iter_nonce_chunks, map_luck_number, nonce_filter, rank_luck_number
+
+ORIGIN_HASH_SUM = '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'
+
+"""较低的难度，每个参数组合都能很快算完"""
+DIFFICULTY = '04'
+
+"""仓库根目录下的单文件版本lottery_model.py，与v0.3.1的同名模块分开在子进程中导入"""
+ROOT_DIR = os.path.dirname(PACKAGE_DIR)
+
+PARALLEL_CASES = [(n, chunk_size, workers) for n in (1, 7, 40) for chunk_size in (1, 64, 1000) for workers in (2, 3)]
+
+
+@pytest.mark.parametrize('name', sorted(GAMES))
+def test_map_luck_number_matches_map_draw(name):
+    """map_luck_number对前区的计算与games.map_draw相同，rank_luck_number是它的逆运算"""
+    game = GAMES[name]
+    for i in range(200):
+        hash_sum = hashlib.sha3_256(str(i).encode()).hexdigest()
+        front = map_draw(hash_sum, game).split('|')[0]
+        assert map_luck_number(hash_sum, list(game.front_balls), game.front_selected) == front
+        rank = rank_luck_number(front, list(game.front_balls))
+        assert map_luck_number(f'{rank:x}', list(game.front_balls), game.front_selected) == front
+
+
+@pytest.mark.parametrize('n, chunk_size, workers', PARALLEL_CASES)
+def test_parallel_matches_serial(n, chunk_size, workers):
+    HASH = hashlib.sha3_256
+    expected = nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, n, HASH, chunk_size=chunk_size)
+    assert nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, n, HASH, workers, chunk_size=chunk_size) == expected
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_chunks_in_nonce_order(workers):
+    """各区间首尾相接，结果与逐个检查全部nonce值相同"""
+    chunks = iter_nonce_chunks(ORIGIN_HASH_SUM, DIFFICULTY, hashlib.sha256, workers, chunk_size=100)
+    found = []
+    for i, (start, stop, chunk_found) in zip(range(20), chunks):
+        assert (start, stop) == (i * 100, i * 100 + 100)
+        found.extend(chunk_found)
+    chunks.close()
+    expected = []
+    for nonce in range(2000):
+        hash_sum = hashlib.sha256((ORIGIN_HASH_SUM + str(nonce)).encode()).hexdigest()
+        if hash_sum < DIFFICULTY:
+            expected.append((hash_sum, nonce))
+    assert [tuple(item) for item in found] == expected
+
+
+def test_root_parallel_matches_serial():
+    """根目录lottery_model.py的nonce_filter(workers, chunk_size)与单进程的结果相同"""
+    cases = PARALLEL_CASES + [(n, 1, 1) for n in (1, 7, 40)]
+    script = f"""if True:
+        import hashlib, json
+        from lottery_model import nonce_filter
+        print(json.dumps([[n, chunk_size, workers,
+                           nonce_filter({ORIGIN_HASH_SUM!r}, {DIFFICULTY!r}, n, hashlib.sha256, workers, chunk_size)]
+                          for n, chunk_size, workers in {cases!r}]))
+    """
+    process = subprocess.run([sys.executable, '-c', script], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    results = json.loads(process.stdout.strip().splitlines()[-1])
+    serial = {n: result for n, _, workers, result in results if workers == 1}
+    assert len(serial) == 3
+    for n, chunk_size, workers, result in results:
+        assert result == serial[n], (n, chunk_size, workers)
@@ -0,0 +1,62 @@
+"""
+nonce_engines的回归测试：各引擎的结果完全相同，difficulty_target与字符串比较一致
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+import pytest
+
+from nonce_engines import difficulty_target, scan_numpy, scan_prefix, scan_simple
+
+ORIGIN_HASH_SUM = '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'
+
+"""覆盖nonce位数变化的区间，以及都不满足、都满足和只有一部分满足的难度值"""
+RANGES = [(0, 3000), (9_900, 10_100), (999_950, 1_000_050)]
+DIFFICULTIES = ['', '0', '03', '0F', 'f', 'g', 'f' * 64, 'f' * 65]
+
+
+def assert_target(difficulty, digest_size=32):
+    """target两侧的哈希值按字符串比较的结果必须正好相反"""
+    target = difficulty_target(difficulty, digest_size)
+    limit = 1 << (8 * digest_size)
+    assert 0 <= target <= limit
+    width = digest_size * 2
+    if target > 0:
+        assert f'{target - 1:0{width}x}' < difficulty
+    if target < limit:
+        assert not f'{target:0{width}x}' < difficulty
+
+
+@pytest.mark.parametrize('difficulty', DIFFICULTIES + ['0000000F', '00003', '000Z', '0' * 64, 'a' * 63 + 'b'])
+def test_difficulty_target(difficulty):
+    assert_target(difficulty)
+    assert_target(difficulty, 20)
+
+
+def test_difficulty_target_edges():
+    assert difficulty_target('') == 0
+    assert difficulty_target('f') == 15 << 252
+    assert difficulty_target('f' * 64) == (1 << 256) - 1
+    """比全长还长的difficulty，全为f的哈希值也满足要求"""
+    assert difficulty_target('f' * 65) == 1 << 256
+    assert difficulty_target('0000000F') == 10 << 224
+
+
+@pytest.mark.parametrize('hash_name', ['sha256', 'sha3_256'])
+@pytest.mark.parametrize('difficulty', DIFFICULTIES)
+def test_prefix_matches_simple(hash_name, difficulty):
+    HASH = getattr(hashlib, hash_name)
+    for start, stop in RANGES:
+        expected = scan_simple(ORIGIN_HASH_SUM, start, stop, difficulty, HASH)
+        assert scan_prefix(ORIGIN_HASH_SUM, start, stop, difficulty, HASH) == expected
+
+
+@pytest.mark.parametrize('difficulty', DIFFICULTIES)
+def test_numpy_matches_simple(difficulty):
+    pytest.importorskip('numpy')
+    for start, stop in RANGES:
+        expected = scan_simple(ORIGIN_HASH_SUM, start, stop, difficulty)
+        assert scan_numpy(ORIGIN_HASH_SUM, start, stop, difficulty) == expected
@@ -0,0 +1,79 @@
+"""
+pool_binary的回归测试：文本与二进制格式互相转换无损，转换回的文本与原文件的数据指纹相同
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import random
+
+import pytest
+
+from games import GAMES, format_ticket
+from pool_binary import binary_to_text, iter_binary_lines, open_binary_pool, text_to_binary
+from pool_file import hash_pool, iter_pool_lines
+
+
+def standard_tickets(count, game_name, ids=None, seed=0):
+    """标准格式的彩票，ids为None时没有票号，否则为产生票号的函数"""
+    game = GAMES[game_name]
+    rng = random.Random(seed)
+    tickets = []
+    for i in range(count):
+        front = sorted(rng.sample(range(1, len(game.front_balls) + 1), game.front_selected))
+        back = sorted(rng.sample(range(1, len(game.back_balls) + 1), game.back_selected))
+        tickets.append(format_ticket(front, back, ids(i) if ids else None, game))
+    return tickets
+
+
+def round_trip(tmp_path, text, game_name, HASH):
+    source = tmp_path / 'pool.data'
+    source.write_bytes(text.encode())
+    header = text_to_binary(str(source), str(tmp_path / 'pool.bin'), game_name, HASH)
+    back_hash = binary_to_text(str(tmp_path / 'pool.bin'), str(tmp_path / 'back.data'))
+    with open(source, 'rt') as f:
+        expected = hash_pool(f, HASH)
+    with open(tmp_path / 'back.data', 'rt') as f:
+        assert hash_pool(f, HASH) == expected
+    assert header['hash_sum'] == back_hash == expected
+    return header
+
+
+@pytest.mark.parametrize('game_name', sorted(GAMES))
+@pytest.mark.parametrize('ids', [
+    pytest.param(None, id='no-ids'),
+    pytest.param(lambda i: str(i + 1), id='plain-ids'),
+    pytest.param(lambda i: f'{i:08d}', id='zero-padded-ids'),
+    pytest.param(lambda i: str(10 ** 18 + i), id='19-digit-ids'),
+])
+@pytest.mark.parametrize('hash_name', ['sha256', 'sha3_256'])
+def test_round_trip(tmp_path, game_name, ids, hash_name):
+    HASH = getattr(hashlib, hash_name)
+    tickets = standard_tickets(500, game_name, ids)
+    header = round_trip(tmp_path, '\r'.join(tickets), game_name, HASH)
+    assert header['count'] == len(tickets)
+    _, records = open_binary_pool(str(tmp_path / 'pool.bin'))
+    assert len(records) == len(tickets)
+    assert list(iter_binary_lines(str(tmp_path / 'pool.bin'))) == tickets
+    with open(tmp_path / 'pool.data', 'rt') as f:
+        assert list(iter_pool_lines(f)) == tickets
+
+
+def test_surrounding_whitespace(tmp_path):
+    """首尾的空白字符不属于彩票池，转换回的文本不含这些字符，但数据指纹相同"""
+    tickets = standard_tickets(20, 'double_chromosphere')
+    round_trip(tmp_path, '\r\n \r' + '\r'.join(tickets) + '\r\r\n', 'double_chromosphere', hashlib.sha256)
+    assert (tmp_path / 'back.data').read_bytes() == '\r'.join(tickets).encode()
+
+
+@pytest.mark.parametrize('line', ['1 02 03 04 05 06|07', '02 01 03 04 05 06|07', '01 02 03 04 05 06|07 0012'])
+def test_lossy_conversion_refused(tmp_path, line):
+    """不是标准格式或票号不能无损还原时拒绝转换，不留下不完整的二进制文件"""
+    tickets = standard_tickets(3, 'double_chromosphere', lambda i: str(i + 1) if '0012' in line else None)
+    source = tmp_path / 'pool.data'
+    source.write_text('\r'.join(tickets + [line]))
+    with pytest.raises(ValueError):
+        text_to_binary(str(source), str(tmp_path / 'pool.bin'))
+    assert not os.path.exists(tmp_path / 'pool.bin')
@@ -0,0 +1,65 @@
+"""
+pool_file的回归测试：逐块读取的结果在任何块边界上都与HASH(str.strip(f.read()).encode())完全一致
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import random
+
+import pytest
+
+from pool_file import hash_pool, iter_pool_lines
+
+"""按二进制写入的文件内容，读取时经过文本方式的换行符转换"""
+CONTENTS = [
+    b'',
+    b' ',
+    b' \t\r\n \r \n\t ',
+    b'a',
+    b'  a  ',
+    b'a\r\nb',
+    b'a\r\n\r\nb\r\n',
+    b'\r\n\r\nab\r\n\r\n',
+    b'a  \t  \r\n  b',
+    b'a \r \n b \r\n',
+    b'01 02 03 04 05 06|07\r02 03 04 05 06 07|08',
+    b'\r01 02 03 04 05 06|07\r\r02 03 04 05 06 07|08\r',
+    b'x' + b'\r\n' * 7 + b'y',
+    '中文 号码\r\n彩票'.encode(),
+]
+
+CHUNK_SIZES = [1, 2, 3, 5, 8, 64]
+
+
+def fuzz_contents(count=200, seed=0):
+    """由空白字符、各种换行符和少量其他字符随机组成的内容"""
+    rng = random.Random(seed)
+    pieces = [b' ', b'\t', b'\r', b'\n', b'\r\n', b'a', b'01', b'|']
+    return [b''.join(rng.choice(pieces) for _ in range(rng.randrange(0, 40))) for _ in range(count)]
+
+
+def check(path, chunk_size, HASH=hashlib.sha256):
+    with open(path, 'rt', encoding='utf-8') as f:
+        text = f.read().strip()
+    with open(path, 'rt', encoding='utf-8') as f:
+        assert hash_pool(f, HASH, chunk_size) == HASH(text.encode()).hexdigest()
+    with open(path, 'rt', encoding='utf-8') as f:
+        assert list(iter_pool_lines(f, chunk_size)) == text.split('\n')
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('content', CONTENTS)
+def test_chunk_boundaries(tmp_path, content, chunk_size):
+    path = tmp_path / 'pool.data'
+    path.write_bytes(content)
+    check(path, chunk_size)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_fuzz(tmp_path, chunk_size):
+    path = tmp_path / 'pool.data'
+    for content in fuzz_contents(seed=chunk_size):
+        path.write_bytes(content)
+        check(path, chunk_size, hashlib.sha3_256)
@@ -0,0 +1,53 @@
+"""
+pool_stats的回归测试：组合空间太大时分桶计数，结果与计数数组完全相同，且与逐注统计一致
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+import random
+
+import pytest
+
+from games import GAMES, format_ticket
+from pool_binary import text_to_binary
+from pool_stats import analyze_pool
+
+
+def write_pool(path, game_name, count=3000, seed=0):
+    """随机彩票池，从较少的组合中抽取以产生重复组合，部分彩票带重复的票号"""
+    game = GAMES[game_name]
+    rng = random.Random(seed)
+    choices = []
+    for _ in range(count // 3):
+        front = sorted(rng.sample(range(1, len(game.front_balls) + 1), game.front_selected))
+        back = sorted(rng.sample(range(1, len(game.back_balls) + 1), game.back_selected))
+        choices.append((front, back))
+    tickets = [format_ticket(*rng.choice(choices), str(rng.randrange(count * 4)), game) for _ in range(count)]
+    path.write_text('\r'.join(tickets))
+    return tickets
+
+
+@pytest.mark.parametrize('binary', [False, True])
+@pytest.mark.parametrize('game_name', sorted(GAMES))
+def test_bucketed_matches_dense(tmp_path, game_name, binary):
+    tickets = write_pool(tmp_path / 'pool.data', game_name)
+    path = tmp_path / 'pool.data'
+    if binary:
+        text_to_binary(str(path), str(tmp_path / 'pool.bin'), game_name)
+        path = tmp_path / 'pool.bin'
+    dense = analyze_pool(str(path), game_name, top=5, buckets=7, temp_dir=str(tmp_path))
+    bucketed = analyze_pool(str(path), game_name, top=5, buckets=7, temp_dir=str(tmp_path), max_dense=0)
+    assert bucketed == dense
+
+    combos = Counter(line.rsplit(' ', 1)[0] for line in tickets)
+    assert dense['lines'] == len(tickets)
+    assert dense['liability']['covered'] == len(combos)
+    assert dense['liability']['max_jackpot_winners'] == max(combos.values())
+    assert dense['duplicate_combinations'] == {
+        'combinations': sum(1 for c in combos.values() if c > 1),
+        'extra_tickets': sum(c - 1 for c in combos.values() if c > 1)}
+    assert dense['liability']['multiplicity'] == {str(k): v for k, v in sorted(Counter(combos.values()).items())}
+    assert [item['count'] for item in dense['liability']['top']] == sorted(combos.values(), reverse=True)[:5]
+    assert all(combos[item['ticket']] == item['count'] for item in dense['liability']['top'])
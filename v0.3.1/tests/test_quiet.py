@@ -0,0 +1,57 @@
+"""
+quiet模式的回归测试：搜索循环中没有任何I/O，结果和分段搜索记录与普通模式完全相同
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import re
+
+import lottery_model
+from lottery_model import nonce_filter
+from telemetry import Telemetry
+
+ORIGIN_HASH_SUM = '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'
+DIFFICULTY = '003'
+CHUNK_SIZE = 256
+
+
+def test_quiet_search_has_no_io(tmp_path, monkeypatch, capsys):
+    expected_path = tmp_path / 'expected.transcript'
+    expected = nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, 5, hashlib.sha3_256, chunk_size=CHUNK_SIZE,
+                            transcript=str(expected_path))
+    capsys.readouterr()
+
+    calls = []
+    iter_nonce_chunks, write_segment = lottery_model.iter_nonce_chunks, lottery_model.write_segment
+
+    def chunks(*args, **kwargs):
+        """每产出一个区间记录一次，区间之间发生的写入都会出现在calls中"""
+        for chunk in iter_nonce_chunks(*args, **kwargs):
+            calls.append('chunk')
+            yield chunk
+
+    def record_segment(*args):
+        calls.append('segment')
+        write_segment(*args)
+
+    def no_checkpoint(*args):
+        raise AssertionError('quiet模式下不应在搜索循环中保存断点文件')
+
+    monkeypatch.setattr(lottery_model, 'iter_nonce_chunks', chunks)
+    monkeypatch.setattr(lottery_model, 'write_segment', record_segment)
+    monkeypatch.setattr(lottery_model, 'save_checkpoint', no_checkpoint)
+    monkeypatch.setattr(Telemetry, 'flush', lambda self: calls.append('flush'))
+
+    path = tmp_path / 'quiet.transcript'
+    result = nonce_filter(ORIGIN_HASH_SUM, DIFFICULTY, 5, hashlib.sha3_256, chunk_size=CHUNK_SIZE,
+                          transcript=str(path), checkpoint=str(tmp_path / 'quiet.checkpoint'),
+                          checkpoint_interval=0, telemetry=Telemetry(interval=0), quiet=True)
+    assert result == expected
+    assert path.read_bytes() == expected_path.read_bytes()
+    chunk_count = calls.count('chunk')
+    assert calls[:chunk_count] == ['chunk'] * chunk_count
+    assert 'segment' in calls and 'flush' in calls
+    """找到的nonce值不逐个输出"""
+    assert not re.search(r'^[0-9a-f]{64} \d+$', capsys.readouterr().out, re.MULTILINE)
@@ -0,0 +1,41 @@
+"""
+sha256_numpy的回归测试：数百万个nonce的哈希值与hashlib.sha256逐位相同
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from nonce_engines import check_engine
+from sha256_numpy import cross_check, scan_numpy
+
+ORIGIN_HASH_SUM = '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'
+
+
+@pytest.mark.parametrize('start, count', [
+    (0, 2_000_000),
+    (10 ** 9 - 50_000, 100_000),
+    (2 ** 63 - 50_000, 50_000),
+])
+def test_cross_check(start, count):
+    assert cross_check(ORIGIN_HASH_SUM, start, count) == []
+
+
+@pytest.mark.parametrize('size', range(33))
+def test_cross_check_padding(size):
+    """不同长度的前缀覆盖1个和2个尾部分组的所有填充情况"""
+    assert cross_check(ORIGIN_HASH_SUM[:size] * 2, 999_990, 20) == []
+
+
+def test_only_sha256():
+    with pytest.raises(ValueError):
+        scan_numpy(ORIGIN_HASH_SUM, 0, 10, '0', hashlib.sha3_256)
+    with pytest.raises(ValueError):
+        check_engine('numpy', 'sha3_256')
+    check_engine('numpy', 'sha256')
+    check_engine('prefix', 'sha3_256')
@@ -0,0 +1,94 @@
+"""
+verify.py的回归测试：公布的开奖结果能通过验证，验证过程中不导入重模块，启动时间与空的Python解释器相差不多
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+from conftest import PACKAGE_DIR
+from games import GAMES
+import verify
+
+"""lottery_model.data在sha3_256、难度值'0003'下公布的开奖结果"""
+POOL_FILE = os.path.join(PACKAGE_DIR, 'lottery_model.data')
+POOL_HASH = '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'
+NONCE = 15928
+RESULT = '03 09 15 19 23 28|07'
+DIFFICULTY = '0003'
+
+
+def run(*args):
+    return subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=PACKAGE_DIR,
+                          capture_output=True, text=True)
+
+
+def imported_heavy_modules(importtime):
+    """从 -X importtime 的输出中找出HEAVY_MODULES中被导入的模块"""
+    names = {line.rsplit('|', 1)[-1].strip() for line in importtime.splitlines() if line.startswith('import time:')}
+    return [m for m in verify.HEAVY_MODULES if m in names]
+
+
+def test_pool_hash():
+    assert verify.pool_hash(POOL_FILE, hashlib.sha3_256) == POOL_HASH
+    assert verify.pool_hash(POOL_HASH, hashlib.sha3_256) == POOL_HASH
+
+
+def test_published_draw_verifies():
+    checks = verify.verify_claim(POOL_HASH, NONCE, DIFFICULTY, RESULT, GAMES['double_chromosphere'],
+                                 hashlib.sha3_256)
+    assert [(name, ok) for name, ok, _ in checks] == [('qualifying', True), ('mapping', True)]
+    assert verify.find_winner(POOL_HASH, DIFFICULTY, 3, hashlib.sha3_256)[1] == NONCE
+
+
+def test_wrong_claims_fail():
+    game = GAMES['double_chromosphere']
+    checks = verify.verify_claim(POOL_HASH, NONCE, DIFFICULTY, '03 09 15 19 23 28|08', game, hashlib.sha3_256)
+    assert [ok for _, ok, _ in checks] == [True, False]
+    checks = verify.verify_claim(POOL_HASH, NONCE - 1, DIFFICULTY, RESULT, game, hashlib.sha3_256)
+    assert [ok for _, ok, _ in checks] == [False, False]
+
+
+def test_cli_does_not_import_heavy_modules():
+    for script in ('verify.py', 'lottery_model.py'):
+        args = [script] + (['verify'] if script == 'lottery_model.py' else [])
+        process = run(*args, POOL_HASH, str(NONCE), RESULT, '-d', DIFFICULTY)
+        assert process.returncode == 0, process.stdout
+        assert '[失败]' not in process.stdout
+        assert imported_heavy_modules(process.stderr) == []
+
+
+"""验证之后检查sys.modules，两个入口都运行完整的验证，包括-n重新搜索"""
+HEAVY_AFTER_VERIFY = """if True:
+    import contextlib, io, json, runpy, sys
+    sys.argv = {argv!r}
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        try:
+            runpy.run_path(sys.argv[0], run_name='__main__')
+        except SystemExit as e:
+            code = e.code
+    print(json.dumps([code, [m for m in {heavy!r} if m in sys.modules], out.getvalue()]))
+"""
+
+
+def test_heavy_modules_absent_after_verify():
+    claim = [POOL_HASH, str(NONCE), RESULT, '-d', DIFFICULTY, '-n', '3']
+    for argv in (['verify.py'] + claim, ['lottery_model.py', 'verify'] + claim):
+        code = HEAVY_AFTER_VERIFY.format(argv=argv, heavy=verify.HEAVY_MODULES)
+        process = subprocess.run([sys.executable, '-c', code], cwd=PACKAGE_DIR, capture_output=True, text=True,
+                                 check=True)
+        returncode, heavy, output = json.loads(process.stdout.splitlines()[-1])
+        assert returncode == 0, output
+        assert heavy == [], argv
+
+
+def test_startup_relative_to_bare_interpreter():
+    """只做宽松的相对比较：导入重模块会使启动时间成倍增加，机器负载则同样影响两者"""
+    extra, baseline, heavy = verify.check_startup()
+    assert heavy == []
+    assert extra < 4 * baseline
@@ -0,0 +1,50 @@
+"""
+verify_batch的回归测试：没有分段搜索记录时，跳过了更小的满足要求的nonce值的声明不能通过复核
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+from games import GAMES
+from lottery_model import draw_numbers
+from nonce_engines import scan_nonces
+from verify_batch import verify_draw
+
+ORIGIN_HASH_SUM = '7ee4d882d67a137ec571cb52862a334f01087c626703bcc5a2dc371a83841aff'
+DIFFICULTY = '003'
+
+
+def claim(nonces):
+    """按nonces中哈希值最小的nonce值构造一期开奖的清单"""
+    HASH = hashlib.sha3_256
+    winner = min((HASH((ORIGIN_HASH_SUM + str(x)).encode()).hexdigest(), x) for x in nonces)[1]
+    return {'id': 'test', 'hash_sum': ORIGIN_HASH_SUM, 'hash': 'sha3_256', 'game': 'double_chromosphere',
+            'difficulty': DIFFICULTY, 'n': len(nonces), 'nonce': winner, 'nonces': nonces,
+            'result': draw_numbers(winner, ORIGIN_HASH_SUM, GAMES['double_chromosphere'], HASH)}
+
+
+def qualifying(count):
+    return [x for _, x in scan_nonces('prefix', ORIGIN_HASH_SUM, 0, 1 << 14, DIFFICULTY, hashlib.sha3_256)][:count]
+
+
+def test_honest_claim_is_complete():
+    report = verify_draw(claim(qualifying(5)))
+    assert report['ok'], report['errors']
+    assert report['completeness'] == 'full'
+
+
+def test_skipped_nonce_is_caught():
+    nonces = qualifying(6)
+    report = verify_draw(claim(nonces[:2] + nonces[3:]))
+    assert not report['ok']
+    assert not report['checks']['nonces_complete']
+
+
+def test_sampled_and_unchecked():
+    draw = claim(qualifying(5))
+    assert verify_draw(draw, sample=0)['completeness'] == 'sampled'
+    del draw['nonces']
+    report = verify_draw(draw)
+    assert report['ok'] and report['completeness'] == 'unchecked'
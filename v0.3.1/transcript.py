@@ -0,0 +1,156 @@
+"""
+分段搜索记录（transcript）
+
+nonce_filter可以把检查过的nonce值按固定长度分段，逐段记录段的范围、段内满足难度要求的nonce值
+和这些结果的摘要。普通PC难以重新计算整个开奖过程，但可以任选其中若干段进行验证，
+多台机器各自验证一部分，合起来就是对整个开奖计算的验证。
+
+记录文件每行一个JSON对象，第一行为开奖参数，其后每行一个数据段：
+
+{"origin_hash_sum": "7ee4...1aff", "difficulty": "0003", "hash": "sha3_256", "segment_size": 65536}
+{"start": 0, "stop": 65536, "nonces": [10319, 15928, 31021], "digest": "5b1f..."}
+
+使用示例，用4个进程验证第0、5段和第10至20段：
+
+D:\\>python lottery_model.py verify-segments lottery_model.data.transcript -s 0,5,10-20 -w 4
+
+在8台机器上分工验证全部数据段，每台机器分别使用 --shard 0/8 至 --shard 7/8。
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import random
+
+from nonce_engines import ENGINES, check_engine, scan_nonces
+
+
+def segment_digest(start, stop, found, HASH=hashlib.sha256):
+    """数据段结果的摘要，覆盖段的范围和段内每个满足要求的(hash_sum, nonce)"""
+    s = f'{start}-{stop}:' + ';'.join(f'{hash_sum},{nonce}' for hash_sum, nonce in found)
+    return HASH(s.encode()).hexdigest()
+
+
+def open_transcript(path, origin_hash_sum, difficulty, HASH, segment_size, resume_from=0):
+    """打开记录文件准备写入数据段
+
+    resume_from大于0时表示从断点继续计算，保留文件中resume_from之前的数据段，
+    丢弃之后的数据段（它们可能在保存断点之后才写入），避免重复记录。
+    """
+    header = {'origin_hash_sum': origin_hash_sum, 'difficulty': difficulty,
+              'hash': HASH().name, 'segment_size': segment_size}
+    kept = []
+    if resume_from and os.path.exists(path):
+        old_header, segments = read_transcript(path)
+        if old_header != header:
+            raise ValueError(f'记录文件{path}的开奖参数{old_header}与本次计算不一致')
+        kept = [segment for segment in segments if segment['stop'] <= resume_from]
+
+    f = open(path, 'wt')
+    for entry in [header] + kept:
+        f.write(json.dumps(entry) + '\n')
+    f.flush()
+    return f
+
+
+def write_segment(f, start, stop, found, HASH=hashlib.sha256):
+    """把一个数据段的检查结果写入记录文件"""
+    entry = {'start': start, 'stop': stop,
+             'nonces': [nonce for _, nonce in found],
+             'digest': segment_digest(start, stop, found, HASH)}
+    f.write(json.dumps(entry) + '\n')
+    f.flush()
+
+
+def read_transcript(path):
+    """读取记录文件，返回(开奖参数, 数据段列表)"""
+    with open(path, 'rt') as f:
+        header = json.loads(f.readline())
+        segments = [json.loads(line) for line in f if line.strip()]
+    return header, segments
+
+
+def verify_segment(origin_hash_sum, difficulty, hash_name, segment, engine='prefix'):
+    """重新计算一个数据段，返回(是否一致, 说明)"""
+    HASH = getattr(hashlib, hash_name)
+    start, stop = segment['start'], segment['stop']
+    found = scan_nonces(engine, origin_hash_sum, start, stop, difficulty, HASH)
+    nonces = [nonce for _, nonce in found]
+    if nonces != segment['nonces']:
+        return False, f'nonce值不一致，记录为{segment["nonces"]}，重新计算为{nonces}'
+    if segment_digest(start, stop, found, HASH) != segment['digest']:
+        return False, '摘要不一致'
+    return True, ''
+
+
+def parse_segments(text, total):
+    """解析 '0,5,10-20' 形式的数据段序号"""
+    selected = set()
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            selected.update(range(int(first), int(last) + 1))
+        elif part:
+            selected.add(int(part))
+    return sorted(i for i in selected if i < total)
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py verify-segments',
+                                     description='并行验证分段搜索记录中的任意数据段')
+    parser.add_argument(dest='transcript', help='nonce_filter输出的分段搜索记录文件')
+    parser.add_argument('-s', dest='segments', default=None,
+                        help="要验证的数据段序号，例如 '0,5,10-20'，默认验证全部数据段")
+    parser.add_argument('--shard', dest='shard', default=None,
+                        help="多台机器分工验证，'i/m'表示验证序号除以m余i的数据段")
+    parser.add_argument('--sample', dest='sample', type=int, default=None,
+                        help='从选中的数据段中随机抽取若干段验证')
+    parser.add_argument('-w', dest='workers', type=int, default=os.cpu_count(),
+                        help='并行验证的进程数，默认使用全部CPU核心')
+    parser.add_argument('-e', dest='engine', default='prefix', choices=sorted(ENGINES),
+                        help='nonce搜索引擎')
+    args = parser.parse_args(argv)
+
+    header, segments = read_transcript(args.transcript)
+    try:
+        check_engine(args.engine, header['hash'])
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    indexes = list(range(len(segments)))
+    if args.segments:
+        indexes = parse_segments(args.segments, len(segments))
+    if args.shard:
+        shard, shards = map(int, args.shard.split('/'))
+        indexes = [i for i in indexes if i % shards == shard]
+    if args.sample is not None and args.sample < len(indexes):
+        indexes = sorted(random.sample(indexes, args.sample))
+
+    print(f'彩票池哈希值：{header["origin_hash_sum"]}  难度值：{header["difficulty"]!r}  算法：{header["hash"]}')
+    print(f'共{len(segments)}个数据段，验证其中{len(indexes)}个...')
+    failed = 0
+    """各数据段必须从nonce = 0开始首尾相接，否则中间可能有未记录的nonce值"""
+    for i, segment in enumerate(segments):
+        expected_start = segments[i - 1]['stop'] if i else 0
+        if segment['start'] != expected_start:
+            failed += 1
+            print(f'[失败] 第{i}段从{segment["start"]}开始，应从{expected_start}开始')
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(verify_segment, header['origin_hash_sum'], header['difficulty'],
+                                   header['hash'], segments[i], args.engine) for i in indexes]
+        for i, future in zip(indexes, futures):
+            ok, message = future.result()
+            segment = segments[i]
+            if not ok:
+                failed += 1
+                print(f'[失败] 第{i}段 [{segment["start"]}, {segment["stop"]}) {message}')
+    if failed:
+        print(f'{failed}个数据段验证失败')
+        return 1
+    print(f'{len(indexes)}个数据段全部验证通过')
+    return 0
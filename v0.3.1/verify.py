@@ -0,0 +1,163 @@
+"""
+轻量级开奖验证
+
+公众验证者往往在脚本中反复运行验证，每次都要导入lottery_model及其依赖的多进程、SQLite、网络等模块。
+本文件只依赖标准库中很轻的模块和games、combinatorics，不导入NumPy；
+python lottery_model.py verify 在导入这些模块之前就分派到本文件，启动同样快。
+（v0.2、v0.3只为一个组合数导入的scipy.special.comb(exact=True)已换成结果相同的math.comb。）
+给出彩票池的哈希值（或彩票池文件）、nonce值、难度值、哈希算法和公布的开奖号码，检查：
+
+- 满足要求：HASH(origin_hash_sum + str(nonce)) < difficulty；
+- 号码映射：HASH(str(nonce) + origin_hash_sum)按玩法的derive规则映射得到的号码与公布的号码相同；
+- 可选（-n）：从nonce = 0开始重新搜索最先找到的n个满足要求的nonce值，公布的nonce是其中哈希值最小的，
+  此时才按 -e 加载nonce_engines中的搜索引擎，numpy引擎才会导入NumPy。
+
+验证通过返回0，否则返回1。python verify.py --startup-check 测量本文件的冷启动时间，
+超过STARTUP_BUDGET或导入了HEAVY_MODULES中的模块时返回1。tests/test_verify.py检查验证过程中没有导入HEAVY_MODULES，
+启动时间只与空的Python解释器做宽松的相对比较，不受测试机器负载的影响。
+
+使用示例：
+
+D:\\>python verify.py lottery_model.data 10319 "07 08 13 22 25 32|01" -d 0003
+D:\\>python verify.py 7ee4...1aff 10319 "07 08 13 22 25 32|01" -d 0003 -n 10
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+from games import GAMES, map_draw, normalize_ticket
+
+HASHES = ('sha256', 'sha3_256')
+
+"""验证时不应导入的模块"""
+HEAVY_MODULES = ('numpy', 'scipy', 'sqlite3', 'multiprocessing', 'concurrent.futures', 'socket', 'asyncio')
+
+"""冷启动时间比空的Python解释器多出的秒数上限"""
+STARTUP_BUDGET = 0.05
+
+"""重新搜索时每次检查的nonce个数，与lottery_model.CHUNK_SIZE相同"""
+CHUNK_SIZE = 1 << 16
+
+
+def pool_hash(pool, HASH=hashlib.sha3_256):
+    """pool为彩票池文件名或十六进制的哈希值，返回彩票池的哈希值"""
+    if os.path.exists(pool):
+        from pool_file import hash_pool
+
+        with open(pool, 'rt') as f:
+            return hash_pool(f, HASH)
+    if len(pool) != HASH().digest_size * 2 or any(c not in '0123456789abcdef' for c in pool):
+        raise ValueError(f'{pool!r}既不是存在的文件，也不是{HASH().name}的哈希值')
+    return pool
+
+
+def verify_claim(origin_hash_sum, nonce, difficulty, result, game, HASH=hashlib.sha3_256):
+    """检查nonce满足难度要求、开奖号码正确，返回[(检查项, 是否通过, 说明)]"""
+    hash_sum = HASH((origin_hash_sum + str(nonce)).encode()).hexdigest()
+    checks = [('qualifying', hash_sum < difficulty, f'hash(origin_hash_sum + {str(nonce)!r}) = {hash_sum}')]
+    expected = map_draw(HASH((str(nonce) + origin_hash_sum).encode()).hexdigest(), game)
+    try:
+        claimed = normalize_ticket(result, game)
+    except ValueError as e:
+        checks.append(('mapping', False, str(e)))
+    else:
+        checks.append(('mapping', claimed == expected, f'{game.name}的开奖号码应为{expected}'))
+    return checks
+
+
+def find_winner(origin_hash_sum, difficulty, n, HASH=hashlib.sha3_256, engine='prefix'):
+    """与nonce_filter相同，返回从0开始最先找到的n个满足要求的nonce值中哈希值最小的(hash_sum, nonce)"""
+    from nonce_engines import scan_nonces
+
+    found = []
+    start = 0
+    while len(found) < n:
+        found.extend(scan_nonces(engine, origin_hash_sum, start, start + CHUNK_SIZE, difficulty, HASH))
+        start += CHUNK_SIZE
+    return min(found[:n])
+
+
+def check_startup(budget=STARTUP_BUDGET, runs=5):
+    """分别启动空的Python解释器和只导入本文件的解释器各runs次，返回(多出的秒数, 空解释器的秒数, 导入的重模块)"""
+    import json
+    import subprocess
+
+    def median_seconds(code):
+        seconds = []
+        for _ in range(runs):
+            begin = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    check=True, capture_output=True, text=True).stdout
+            seconds.append(time.perf_counter() - begin)
+        return sorted(seconds)[runs // 2], output
+
+    baseline, _ = median_seconds('pass')
+    code = ('import sys, json, verify; '
+            f'print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))')
+    seconds, output = median_seconds(code)
+    return seconds - baseline, baseline, json.loads(output)
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='verify.py', description='不导入重模块，快速验证公布的开奖结果')
+    parser.add_argument(dest='pool', nargs='?', help='【彩票池】文件或其哈希值')
+    parser.add_argument(dest='nonce', nargs='?', type=int, help='公布的nonce值')
+    parser.add_argument(dest='result', nargs='?', help="公布的开奖号码，例如 '07 08 13 22 25 32|01'")
+    parser.add_argument('-d', dest='difficulty', default='00003', help='难度值，与main相同默认为00003')
+    parser.add_argument('-g', dest='game', default='double_chromosphere', choices=sorted(GAMES), help='彩票玩法')
+    parser.add_argument('--hash', dest='hash', default='sha3_256', choices=HASHES,
+                        help='哈希算法，与main相同默认为sha3_256')
+    parser.add_argument('-n', dest='size', type=int, default=None,
+                        help='重新搜索，检查nonce是最先找到的n个满足要求的值中哈希值最小的')
+    parser.add_argument('-e', dest='engine', default='prefix', choices=('numpy', 'prefix', 'simple'),
+                        help='重新搜索使用的引擎，只在指定 -n 时加载')
+    parser.add_argument('--startup-check', dest='startup_check', action='store_true',
+                        help=f'测量冷启动时间，超过{STARTUP_BUDGET}秒或导入了重模块时返回1')
+    args = parser.parse_args(argv)
+
+    if args.startup_check:
+        seconds, _, heavy = check_startup()
+        print(f'冷启动比空的Python解释器多{seconds * 1000:.1f}毫秒，上限为{STARTUP_BUDGET * 1000:.0f}毫秒')
+        if heavy:
+            print(f'[失败] 导入了重模块：{heavy}')
+        if seconds > STARTUP_BUDGET:
+            print('[失败] 冷启动时间超出上限')
+        return 1 if heavy or seconds > STARTUP_BUDGET else 0
+    if args.pool is None or args.nonce is None or args.result is None:
+        parser.error('需要【彩票池】、nonce值和开奖号码')
+
+    if args.size:
+        from nonce_engines import check_engine
+
+        try:
+            check_engine(args.engine, args.hash)
+        except ValueError as e:
+            parser.error(str(e))
+
+    HASH = getattr(hashlib, args.hash)
+    try:
+        origin_hash_sum = pool_hash(args.pool, HASH)
+        checks = verify_claim(origin_hash_sum, args.nonce, args.difficulty, args.result, GAMES[args.game], HASH)
+        if args.size:
+            hash_sum, nonce = find_winner(origin_hash_sum, args.difficulty, args.size, HASH, args.engine)
+    except ValueError as e:
+        print(f'[错误 1] {e}')
+        return 1
+    if args.size:
+        checks.append(('winner', nonce == args.nonce,
+                       f'最先找到的{args.size}个满足要求的nonce值中，哈希值最小的是{nonce}: {hash_sum}'))
+
+    print(f'彩票池哈希值：{origin_hash_sum}  难度值：{args.difficulty!r}  算法：{args.hash}')
+    for name, ok, detail in checks:
+        print(f'[{"通过" if ok else "失败"}] {name}  {detail}')
+    return 0 if all(ok for _, ok, _ in checks) else 1
+
+
+if __name__ == '__main__':
+    quit(cli(sys.argv[1:]))
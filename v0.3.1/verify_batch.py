@@ -0,0 +1,225 @@
+"""
+批量复核历史开奖
+
+审计时需要复核大量历史开奖，逐期运行main意味着逐期重新搜索nonce值。本模块不重新搜索，
+只核对每期公布的数据：彩票池的哈希值、所声称的nonce值满足难度要求、开奖号码由该nonce值算出，
+以及所声称的前n个满足要求的nonce值中确实是该nonce值的哈希值最小。
+提供了分段搜索记录（transcript）时，还核对记录从nonce = 0开始首尾相接、与所声称的nonce值一致，
+并重新计算全部或随机抽取的数据段，确认没有遗漏更小的满足要求的nonce值。没有分段搜索记录时，
+把[0, max(nonces)]按SEGMENT_SIZE切分成数据段，同样重新计算全部或随机抽取的数据段。
+报告中的completeness说明遗漏检查的范围：full为全部重新计算，sampled为抽查，unchecked为没有nonces无法检查。
+各期开奖在进程池中并行复核。
+
+清单文件每行一个JSON对象，表示一期开奖，相对路径相对于清单文件所在目录：
+
+{"id": "2019120", "pool": "2019120.data", "hash_sum": "7ee4...1aff", "hash": "sha3_256",
+ "game": "double_chromosphere", "difficulty": "0000000F", "n": 1, "nonce": 156229769,
+ "result": "09 17 21 25 26 30|13", "nonces": [156229769], "transcript": "2019120.transcript"}
+
+其中pool、nonces和transcript可以省略，省略时不做相应的核对。
+
+使用示例，每期随机抽取20个数据段，复核报告写入report.json：
+
+D:\\>python lottery_model.py verify-batch draws.jsonl --sample 20 -o report.json
+"""
+
+# !/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import random
+
+from games import GAMES
+from lottery_model import draw_numbers
+from nonce_engines import ENGINES, scan_nonces
+from pool_file import hash_pool
+from transcript import read_transcript, verify_segment
+
+"""没有分段搜索记录时，重新计算的每个数据段的nonce个数"""
+SEGMENT_SIZE = 1 << 16
+
+
+def read_manifest(path):
+    """读取清单文件，返回各期开奖的列表，相对路径换算为相对于清单文件所在目录"""
+    base = os.path.dirname(os.path.abspath(path))
+    draws = []
+    with open(path, 'rt') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            draw = json.loads(line)
+            for key in ('pool', 'transcript'):
+                if draw.get(key):
+                    draw[key] = os.path.join(base, draw[key])
+            draws.append(draw)
+    return draws
+
+
+def _check(report, name, ok, message=''):
+    report['checks'][name] = bool(ok)
+    if not ok:
+        report['errors'].append(f'{name}: {message}')
+
+
+def verify_draw(draw, sample=None, engine='prefix', seed=None):
+    """复核一期开奖，返回可以直接输出为JSON的复核报告
+
+    sample为每期重新计算的数据段个数，None表示重新计算全部相关的数据段。
+    """
+    report = {'id': draw.get('id'), 'ok': False, 'checks': {}, 'errors': [], 'completeness': 'unchecked',
+              'segments_total': 0, 'segments_checked': 0}
+    try:
+        _verify_draw(draw, report, sample, engine, seed)
+    except FileNotFoundError as e:
+        report['errors'].append(f'文件或路径不存在: {e.filename}')
+    except (KeyError, ValueError) as e:
+        report['errors'].append(f'清单格式不正确: {e!r}')
+    report['ok'] = not report['errors']
+    return report
+
+
+def _verify_draw(draw, report, sample, engine, seed):
+    HASH = getattr(hashlib, draw.get('hash', 'sha3_256'))
+    game = GAMES[draw.get('game', 'double_chromosphere')]
+    origin_hash_sum, difficulty, nonce = draw['hash_sum'], draw['difficulty'], draw['nonce']
+
+    def qualifying_hash(x):
+        hash_sum = HASH((origin_hash_sum + str(x)).encode()).hexdigest()
+        return hash_sum if hash_sum < difficulty else None
+
+    if draw.get('pool'):
+        with open(draw['pool'], 'rt') as f:
+            hash_sum = hash_pool(f, HASH)
+        _check(report, 'pool_hash', hash_sum == origin_hash_sum, f'彩票池的哈希值为{hash_sum}')
+
+    _check(report, 'nonce_qualifies', qualifying_hash(nonce) is not None, f'nonce = {nonce}不满足难度要求')
+    result = draw_numbers(nonce, origin_hash_sum, game, HASH)
+    _check(report, 'result', result == draw['result'], f'由nonce值算出的开奖号码为{result}')
+
+    nonces = draw.get('nonces')
+    if draw.get('transcript'):
+        nonces = _verify_transcript(draw, report, nonces, sample, engine, seed)
+    elif nonces:
+        _verify_ranges(draw, report, nonces, HASH, sample, engine, seed)
+    if nonces is None:
+        return
+
+    n = draw.get('n', len(nonces))
+    hashes = [qualifying_hash(x) for x in nonces]
+    _check(report, 'nonces_qualify', None not in hashes,
+           f'{[x for x, h in zip(nonces, hashes) if h is None]}不满足难度要求')
+    _check(report, 'nonces_ordered', nonces == sorted(set(nonces)), 'nonce值没有严格升序排列')
+    _check(report, 'nonces_count', len(nonces) == n, f'应有{n}个nonce值，实际为{len(nonces)}个')
+    if None not in hashes and nonces:
+        winner = min(zip(hashes, nonces))[1]
+        _check(report, 'nonce_is_min', winner == nonce, f'哈希值最小的是nonce = {winner}')
+
+
+def _verify_transcript(draw, report, nonces, sample, engine, seed):
+    """核对分段搜索记录并重新计算数据段，返回记录中的前n个nonce值"""
+    header, segments = read_transcript(draw['transcript'])
+    expected = {'origin_hash_sum': draw['hash_sum'], 'difficulty': draw['difficulty'],
+                'hash': draw.get('hash', 'sha3_256')}
+    _check(report, 'transcript_header', all(header.get(k) == v for k, v in expected.items()),
+           f'记录的开奖参数{header}与清单不一致')
+    _check(report, 'transcript_contiguous',
+           all(s['start'] == (segments[i - 1]['stop'] if i else 0) for i, s in enumerate(segments)),
+           '各数据段没有从nonce = 0开始首尾相接')
+
+    """只有找到前n个nonce值之前的数据段会影响开奖结果"""
+    n = draw.get('n', len(nonces) if nonces is not None else 1)
+    recorded = []
+    relevant = []
+    for i, segment in enumerate(segments):
+        if len(recorded) >= n:
+            break
+        relevant.append(i)
+        recorded.extend(segment['nonces'])
+    recorded = recorded[:n]
+    if nonces is not None:
+        _check(report, 'transcript_nonces', recorded == nonces, f'记录中的前{n}个nonce值为{recorded}')
+
+    complete = sample is None or sample >= len(relevant)
+    if not complete:
+        relevant = sorted(random.Random(seed).sample(relevant, sample))
+    failed = []
+    for i in relevant:
+        ok, message = verify_segment(header['origin_hash_sum'], header['difficulty'], header['hash'],
+                                     segments[i], engine)
+        if not ok:
+            failed.append(f'第{i}段 {message}')
+    report['segments_total'] = len(segments)
+    report['segments_checked'] = len(relevant)
+    report['completeness'] = 'full' if complete else 'sampled'
+    _check(report, 'segments', not failed, '; '.join(failed))
+    return recorded
+
+
+def _verify_ranges(draw, report, nonces, HASH, sample, engine, seed):
+    """没有分段搜索记录时，直接重新计算[0, max(nonces)]中全部或随机抽取的数据段，
+    确认所声称的nonce值之前没有遗漏满足要求的nonce值"""
+    end = max(nonces) + 1
+    starts = list(range(0, end, SEGMENT_SIZE))
+    checked = starts
+    complete = sample is None or sample >= len(starts)
+    if not complete:
+        checked = sorted(random.Random(seed).sample(starts, sample))
+    claimed = set(nonces)
+    failed = []
+    for start in checked:
+        stop = min(start + SEGMENT_SIZE, end)
+        found = [x for _, x in scan_nonces(engine, draw['hash_sum'], start, stop, draw['difficulty'], HASH)]
+        missing = [x for x in found if x not in claimed]
+        if missing:
+            failed.append(f'[{start}, {stop})中遗漏了满足要求的nonce值{missing[:10]}')
+    report['segments_total'] = len(starts)
+    report['segments_checked'] = len(checked)
+    report['completeness'] = 'full' if complete else 'sampled'
+    _check(report, 'nonces_complete', not failed, '; '.join(failed))
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(prog='lottery_model.py verify-batch',
+                                     description='根据清单并行复核多期历史开奖，不重新搜索nonce值')
+    parser.add_argument(dest='manifest', help='清单文件，每行一个JSON对象表示一期开奖')
+    parser.add_argument('--sample', dest='sample', type=int, default=None,
+                        help='每期随机抽取若干数据段重新计算，默认重新计算全部相关的数据段')
+    parser.add_argument('--seed', dest='seed', type=int, default=None, help='随机抽取数据段的种子，便于重现')
+    parser.add_argument('-w', dest='workers', type=int, default=os.cpu_count(),
+                        help='并行复核的进程数，默认使用全部CPU核心')
+    parser.add_argument('-e', dest='engine', default='prefix', choices=sorted(ENGINES),
+                        help='重新计算数据段使用的nonce搜索引擎')
+    parser.add_argument('-o', dest='output', default=None, help='JSON格式的复核报告文件名')
+    args = parser.parse_args(argv)
+
+    try:
+        draws = read_manifest(args.manifest)
+    except FileNotFoundError as e:
+        print(f'[错误 2] 文件或路径不存在: {e.filename}')
+        return 2
+    except ValueError as e:
+        print(f'[错误 1] 清单格式不正确: {e}')
+        return 1
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(verify_draw, draw, args.sample, args.engine, args.seed) for draw in draws]
+        reports = []
+        for future in futures:
+            report = future.result()
+            reports.append(report)
+            status = '通过' if report['ok'] else '失败'
+            print(f'[{status}] {report["id"]}  数据段{report["segments_checked"]}/{report["segments_total"]}  '
+                  f'遗漏检查: {report["completeness"]}')
+            for error in report['errors']:
+                print(f'    {error}')
+
+    failed = sum(1 for report in reports if not report['ok'])
+    if args.output:
+        with open(args.output, 'wt') as f:
+            json.dump({'ok': not failed, 'draws': reports}, f, ensure_ascii=False, indent=1)
+    print(f'共{len(reports)}期开奖，{len(reports) - failed}期通过，{failed}期失败')
+    return 1 if failed else 0
@@ -45,11 +45,10 @@ hash('a1bb968b4a47cbcd5fa8691085dd3eb6ebc75f4b23a0f457472561f9d5853538'+'2275718
 # -*- coding: utf-8 -*-
 
 from datetime import datetime
-from scipy.special import comb
+from math import comb
 import argparse
 import sys
 import hashlib
-import itertools
 import heapq
 
 
@@ -91,18 +90,35 @@ def nonce_filter(origin_hash_sum, difficulty, nonce_pool_size, HASH=hashlib.sha2
     return nonce_pool[0]
 
 
+def unrank_combination(index, n, k):
+    """按itertools.combinations的枚举顺序，直接计算从range(n)中选k个元素的第index个组合"""
+    positions = []
+    x = 0
+    for i in range(k):
+        """以x开头的组合共有C(n - x - 1, k - i - 1)个，序号不在其中时跳过这些组合"""
+        while comb(n - x - 1, k - i - 1) <= index:
+            index -= comb(n - x - 1, k - i - 1)
+            x += 1
+        positions.append(x)
+        x += 1
+    return tuple(positions)
+
+
+def rank_combination(positions, n):
+    """unrank_combination的逆运算，返回升序排列的元素下标positions在所有组合中的序号"""
+    k = len(positions)
+    return comb(n, k) - 1 - sum(comb(n - 1 - p, k - i) for i, p in enumerate(positions))
+
+
 def map_luck_number(hash_sum, balls, total_selected):
     """把传入的hash_sum映射到开奖号码"""
 
-    comb_count = comb(len(balls), total_selected, exact=True)
+    comb_count = comb(len(balls), total_selected)
     selected_balls = int(hash_sum, 16) % comb_count
 
-    luck_number = "null"
-    for n, comb_balls in zip(range(comb_count), itertools.combinations(balls, total_selected)):
-        if n == selected_balls:
-            """此时对应的comb_balls组合，即是开奖号码"""
-            luck_number = ' '.join(comb_balls)
-            break
+    """直接计算序号为selected_balls的组合，即是开奖号码"""
+    comb_balls = unrank_combination(selected_balls, len(balls), total_selected)
+    luck_number = ' '.join(balls[i] for i in comb_balls)
     return luck_number
 
 